@@ -0,0 +1,128 @@
+"""HTTP caching for the editor's slow-changing responses.
+
+/api/schema (100+ KB of merged JSON), /api/templates and the index page
+change only when files on disk change, yet every request used to rebuild,
+serialize and send them uncompressed. ResponseCache keeps each one's body,
+built once per change of a caller-supplied stamp, together with a gzipped
+copy and a strong ETag. Responses carry ``Cache-Control: no-cache`` so
+browsers revalidate; If-None-Match answers 304 without a body.
+
+CachedStaticFiles marks content-hashed asset URLs (``?v=<hash>``, written
+into the index page by the editor) immutable for a year when the hash is that
+of the file being served, and lets every other static file, including a stale
+or hand-written ``?v=``, revalidate against StaticFiles' own ETag.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from urllib.parse import parse_qs
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.responses import Response
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+# Content hashes of static files by path, with the (mtime, size) they were computed for.
+_VERSIONS = {}
+_VERSIONS_LOCK = threading.Lock()
+
+
+def asset_version(path):
+    """Short content hash of the file at path (the ``?v=`` of its URL), or None if it cannot be read."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _VERSIONS_LOCK:
+        entry = _VERSIONS.get(path)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+    try:
+        with open(path, "rb") as f:
+            version = hashlib.sha256(f.read()).hexdigest()[:12]
+    except OSError:
+        return None
+    with _VERSIONS_LOCK:
+        _VERSIONS[path] = (stamp, version)
+    return version
+
+
+def etag_matches(if_none_match, etag):
+    """True when an If-None-Match header value names etag (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+
+class _Entry:
+    __slots__ = ("stamp", "body", "gzipped", "etag")
+
+    def __init__(self, stamp, body):
+        self.stamp = stamp
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6, mtime=0)
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+
+class ResponseCache:
+    """Serialized response bodies by name, rebuilt when their stamp changes."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.not_modified = 0
+
+    def respond(self, request, name, stamp, build, media_type):
+        """Response for the current body of ``name``; ``build()`` returns its bytes when stamp has changed.
+
+        ``stamp`` is compared by identity first, so a shared object (the
+        merged schema) can stand for its own version.
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None or (entry.stamp is not stamp and entry.stamp != stamp):
+            entry = _Entry(stamp, build())
+            with self._lock:
+                self._entries[name] = entry
+                self.builds += 1
+        compressed = "gzip" in request.headers.get("accept-encoding", "")
+        # Each encoding is a different representation, so each gets its own strong ETag.
+        etag = f'"{entry.etag}-gzip"' if compressed else f'"{entry.etag}"'
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        if compressed:
+            headers["Content-Encoding"] = "gzip"
+            return Response(entry.gzipped, media_type=media_type, headers=headers)
+        return Response(entry.body, media_type=media_type, headers=headers)
+
+    def stats(self):
+        return {"entries": len(self._entries), "builds": self.builds, "not_modified": self.not_modified}
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that caches ``?v=<hash>`` URLs forever while the hash is current, and revalidates the rest."""
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            current = await anyio.to_thread.run_sync(self._current, path, scope)
+            response.headers["Cache-Control"] = IMMUTABLE if current else REVALIDATE
+        return response
+
+    def _current(self, path, scope):
+        """True when the URL's ?v= is the content hash of the file it serves."""
+        versions = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("v")
+        if not versions:
+            return False
+        full_path, _ = self.lookup_path(path)
+        return bool(full_path) and versions[-1] == asset_version(full_path)
@@ -3,8 +3,10 @@ Clusterfile Editor v2.0 - FastAPI Backend
 
 A schema-driven, offline-first web editor for OpenShift cluster configuration files.
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response
 from pathlib import Path
@@ -12,17 +14,32 @@ from pydantic import BaseModel
 from typing import List, Optional
 import json
 import os
+import re
 
-from app.template_processor import render_template, list_templates, get_template_content
+from app.http_cache import CachedStaticFiles, ResponseCache, asset_version
+from app.render_pool import RETRY_AFTER_SECONDS, ClientDisconnected, RenderPool, RenderPoolFull
+from app.template_processor import (
+    RENDER_CACHE, render_template, list_templates, get_template_content, templates_signature,
+)
+from lib.schema import load_schema  # lib/ is put on sys.path by template_processor
 
 # Read version from APP_VERSION file
 VERSION_FILE = Path(__file__).resolve().parent.parent / "APP_VERSION"
 VERSION = VERSION_FILE.read_text().strip() if VERSION_FILE.exists() else "2.0.0"
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Stop the render workers on shutdown."""
+    yield
+    RENDER_POOL.shutdown()
+
+
 app = FastAPI(
     title="Clusterfile Editor",
     version=VERSION,
-    description="Schema-driven, offline-first web editor for OpenShift cluster configuration files"
+    description="Schema-driven, offline-first web editor for OpenShift cluster configuration files",
+    lifespan=lifespan,
 )
 
 
@@ -31,6 +48,7 @@ class RenderRequest(BaseModel):
     yaml_text: str
     template_name: str
     params: Optional[List[str]] = []
+    profile: bool = False
 
 
 # Content Security Policy for offline-first security
@@ -68,6 +86,9 @@ app.add_middleware(
     allow_headers=["Content-Type"],
 )
 
+# Compress responses that are not already compressed (render output, samples, static files)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Directory configuration
 BASE_DIR = Path(__file__).resolve().parent.parent
 REPO_ROOT = Path("/app")
@@ -78,6 +99,12 @@ TEMPLATES_DIR = Path(os.environ.get("TEMPLATES_DIR", str(REPO_ROOT / "templates"
 SCHEMA_DIR = Path(os.environ.get("SCHEMA_DIR", str(REPO_ROOT / "schema")))
 PLUGINS_DIR = Path(os.environ.get("PLUGINS_DIR", str(REPO_ROOT / "plugins")))
 
+# Schema, template list and index page: built once per change, served with ETags and gzip
+RESPONSE_CACHE = ResponseCache()
+
+# Renders run here, never on the event loop (sized by CLUSTERFILE_EDITOR_RENDER_WORKERS/_QUEUE)
+RENDER_POOL = RenderPool()
+
 
 @app.get("/healthz")
 async def healthz():
@@ -85,29 +112,27 @@ async def healthz():
     return {"status": "ok", "version": VERSION}
 
 
+@app.get("/api/stats")
+async def stats():
+    """Render cache and render pool counters."""
+    return {"render_cache": RENDER_CACHE.stats(), "render_pool": RENDER_POOL.stats(),
+            "responses": RESPONSE_CACHE.stats()}
+
+
+def _json_bytes(content):
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
 @app.get("/api/schema")
-async def get_schema():
+async def get_schema(request: Request):
     """Return the clusterfile JSON schema with auto-discovered plugin schemas."""
     schema_path = SCHEMA_DIR / "clusterfile.schema.json"
     if not schema_path.exists():
         raise HTTPException(status_code=404, detail="Schema not found")
-    with open(schema_path, "r") as f:
-        schema = json.load(f)
-    schema.setdefault("$defs", {})
-    plugins = schema.setdefault("properties", {}).setdefault("plugins", {}).setdefault("properties", {})
-    for group in sorted(PLUGINS_DIR.iterdir()):
-        if not group.is_dir():
-            continue
-        props = plugins.setdefault(group.name, {}).setdefault("properties", {})
-        prefix = group.name[:-1] if group.name.endswith("s") else group.name
-        for plugin in sorted(group.iterdir()):
-            sf = plugin / "schema.json"
-            if sf.is_file():
-                def_key = prefix + "".join(part.capitalize() for part in plugin.name.split("-"))
-                with open(sf) as fh:
-                    schema["$defs"][def_key] = json.load(fh)
-                props[plugin.name] = {"$ref": f"#/$defs/{def_key}"}
-    return JSONResponse(content=schema)
+    # Merged with the plugin schemas once per change of any input, shared with process.py's disk cache;
+    # the same object comes back until then, so it stamps its own serialized body.
+    schema = load_schema(schema_path, str(PLUGINS_DIR))
+    return RESPONSE_CACHE.respond(request, "schema", schema, lambda: _json_bytes(schema), "application/json")
 
 
 @app.get("/api/samples")
@@ -137,10 +162,11 @@ async def get_sample(filename: str):
 
 
 @app.get("/api/templates")
-async def get_templates():
+async def get_templates(request: Request):
     """List all available Jinja2 templates."""
-    templates = list_templates(TEMPLATES_DIR)
-    return {"templates": templates}
+    return RESPONSE_CACHE.respond(request, "templates", templates_signature(TEMPLATES_DIR),
+                                  lambda: _json_bytes({"templates": list_templates(TEMPLATES_DIR)}),
+                                  "application/json")
 
 
 @app.get("/api/templates/{template_name}")
@@ -153,30 +179,75 @@ async def get_template(template_name: str):
 
 
 @app.post("/api/render")
-async def render(request: RenderRequest):
-    """Render a Jinja2 template with YAML data and optional parameter overrides."""
-    result = render_template(
-        yaml_text=request.yaml_text,
-        template_name=request.template_name,
-        params=request.params or [],
-        templates_dir=TEMPLATES_DIR
-    )
+async def render(request: RenderRequest, http_request: Request):
+    """Render a Jinja2 template with YAML data and optional parameter overrides.
+
+    The render runs on RENDER_POOL. When the pool is saturated the request is
+    refused with 503 and Retry-After; a client that disconnects while its
+    render is queued gets it cancelled.
+    """
+    try:
+        result = await RENDER_POOL.run(
+            render_template,
+            yaml_text=request.yaml_text,
+            template_name=request.template_name,
+            params=request.params or [],
+            templates_dir=TEMPLATES_DIR,
+            profile=request.profile,
+            is_disconnected=http_request.is_disconnected,
+        )
+    except RenderPoolFull:
+        raise HTTPException(status_code=503, detail="Renderer busy, try again shortly",
+                            headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    except ClientDisconnected:
+        return Response(status_code=499)
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["error"])
     return result
 
 
 # Mount static files
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+app.mount("/static", CachedStaticFiles(directory=str(STATIC_DIR)), name="static")
+
+# Asset URLs in index.html; each gets ?v=<content hash> so browsers may cache it forever.
+_STATIC_URL = re.compile(r'/static/([^"\'?#\s]+)(?:\?v=[^"\'\s]*)?')
+# Assets referenced by index.html, by its (mtime, size).
+_INDEX_ASSETS = {}
+
+
+def _file_stamp(path):
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _index_stamp(index_path):
+    """Changes whenever index.html or any asset it references changes."""
+    stamp = _file_stamp(index_path)
+    assets = _INDEX_ASSETS.get(stamp)
+    if assets is None:
+        assets = sorted(set(_STATIC_URL.findall(index_path.read_text())))
+        _INDEX_ASSETS.clear()
+        _INDEX_ASSETS[stamp] = assets
+    return (VERSION, stamp) + tuple(_file_stamp(STATIC_DIR / asset) for asset in assets)
+
+
+def _render_index(index_path):
+    def hashed(match):
+        digest = asset_version(str(STATIC_DIR / match.group(1)))
+        if digest is None:
+            return match.group(0)
+        return f"/static/{match.group(1)}?v={digest}"
+    return _STATIC_URL.sub(hashed, index_path.read_text()).encode("utf-8")
 
 
 @app.get("/", response_class=HTMLResponse)
-async def root():
-    """Serve the main application with cache-busted asset URLs."""
+async def root(request: Request):
+    """Serve the main application with content-hashed asset URLs."""
     index_path = STATIC_DIR / "index.html"
     if index_path.exists():
-        import re
-        html = index_path.read_text()
-        html = re.sub(r'\?v=[^"\']+', f'?v={VERSION}', html)
-        return HTMLResponse(content=html)
+        return RESPONSE_CACHE.respond(request, "index", _index_stamp(index_path),
+                                      lambda: _render_index(index_path), "text/html; charset=utf-8")
     return HTMLResponse(content=f"<h1>Clusterfile Editor v{VERSION}</h1><p>Frontend not found</p>")
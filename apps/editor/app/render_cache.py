@@ -0,0 +1,144 @@
+"""Content-addressed cache of /api/render results.
+
+The editor re-renders as the user types, and many requests repeat a recent
+one: undo/redo, switching tabs back and forth, several users opening the
+same sample. RenderCache maps a digest of the normalized inputs (the
+parsed clusterfile after parameter overrides, the template name, the
+digest of the template and every include it pulls in, the lint level) to
+the finished result. A hit skips validation, rendering, formatting and
+yamllint. Identical requests that arrive while one is rendering wait for
+it and share its result instead of rendering again.
+
+Entries are LRU-evicted beyond ``max_entries`` or ``max_bytes`` of output
+and expire after ``ttl`` seconds. CLUSTERFILE_EDITOR_RENDER_CACHE_MB
+(default 64, 0 disables) and CLUSTERFILE_EDITOR_RENDER_CACHE_TTL (seconds,
+default 600) configure the editor's cache; CLUSTERFILE_NO_CACHE disables it.
+
+With a ``shared`` store (app/shared_cache) a local miss is looked up there
+before rendering, and every render is written there, so the other editor
+workers on the host reuse it.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from lib.cache import cache_disabled
+
+
+def _env_number(name, default):
+    try:
+        return max(0.0, float(os.environ[name]))
+    except (KeyError, ValueError):
+        return default
+
+
+def _result_size(result):
+    return len(result.get("output") or "") + sum(len(w) for w in result.get("warnings") or ()) + 256
+
+
+def _copy(result):
+    copy = dict(result)
+    if "warnings" in copy:
+        copy["warnings"] = list(copy["warnings"])
+    return copy
+
+
+class RenderCache:
+    """LRU of render results with size, memory and age limits, and in-flight request coalescing."""
+
+    def __init__(self, max_entries=256, max_bytes=None, ttl=None, clock=time.monotonic, shared=None):
+        self.max_entries = max_entries
+        if max_bytes is None:
+            max_bytes = int(_env_number('CLUSTERFILE_EDITOR_RENDER_CACHE_MB', 64) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.ttl = _env_number('CLUSTERFILE_EDITOR_RENDER_CACHE_TTL', 600) if ttl is None else ttl
+        self._clock = clock
+        self.shared = shared
+        self._entries = OrderedDict()  # key -> (stored at, size, result)
+        self._inflight = {}            # key -> [event, result]
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0 and not cache_disabled()
+
+    def get_or_render(self, key, render):
+        """Return the cached result for key, else render() it once for every concurrent caller."""
+        if not self.enabled:
+            return render()
+        with self._lock:
+            result = self._lookup(key)
+            if result is not None:
+                self.hits += 1
+                return _copy(result)
+            waiting = self._inflight.get(key)
+            if waiting is None:
+                waiting = self._inflight[key] = [threading.Event(), None]
+                leader = True
+                self.misses += 1
+            else:
+                leader = False
+                self.coalesced += 1
+        if not leader:
+            waiting[0].wait()
+            # The leader failed with an exception: render on our own.
+            return _copy(waiting[1]) if waiting[1] is not None else render()
+        try:
+            result = self.shared.get('render', key, self.ttl) if self.shared is not None else None
+            if result is None:
+                result = render()
+                if self.shared is not None:
+                    self.shared.put('render', key, result)
+            waiting[1] = result
+            with self._lock:
+                self._store(key, result)
+            return _copy(result)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            waiting[0].set()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl and self._clock() - entry[0] > self.ttl:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def _store(self, key, result):
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key, evicted=False)
+        self._entries[key] = (self._clock(), size, result)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key, evicted=True):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+        if evicted:
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        stats = {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses,
+                 "evictions": self.evictions, "coalesced": self.coalesced}
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
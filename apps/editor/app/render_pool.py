@@ -0,0 +1,126 @@
+"""Bounded worker pool that keeps /api/render off the asyncio event loop.
+
+Parsing, rendering, formatting and linting a large clusterfile can take
+seconds; run on the event loop it stalls /healthz, static files and every
+other user. RenderPool runs each render on a thread pool instead, sharing
+the process-wide fragment, lint and passwd caches. Renders are
+context-var safe, so concurrent renders keep their warnings apart.
+
+At most ``workers`` renders run and ``queue_depth`` more wait; beyond that
+``run()`` raises RenderPoolFull and the endpoint answers 503 with
+Retry-After. A queued render whose client disconnects is cancelled before
+it starts. A render that is already running cannot be interrupted, so it
+finishes and its result is dropped.
+
+CLUSTERFILE_EDITOR_RENDER_WORKERS (default: CPUs, at most 4) and
+CLUSTERFILE_EDITOR_RENDER_QUEUE (default 16) size the pool.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Seconds between checks for a disconnected client while a render is pending.
+DISCONNECT_POLL_INTERVAL = 0.25
+
+# Retry-After sent with a 503 when the pool is full.
+RETRY_AFTER_SECONDS = 1
+
+
+class RenderPoolFull(Exception):
+    """Every worker is busy and the queue is full."""
+
+
+class ClientDisconnected(Exception):
+    """The client went away while its render was pending; the result was discarded."""
+
+
+def _env_int(name, default):
+    try:
+        return max(0, int(os.environ[name]))
+    except (KeyError, ValueError):
+        return default
+
+
+def default_render_workers():
+    """CLUSTERFILE_EDITOR_RENDER_WORKERS, else the number of CPUs, capped at 4."""
+    return max(1, _env_int('CLUSTERFILE_EDITOR_RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+
+
+def default_render_queue():
+    """CLUSTERFILE_EDITOR_RENDER_QUEUE: renders that may wait for a worker (default 16)."""
+    return _env_int('CLUSTERFILE_EDITOR_RENDER_QUEUE', 16)
+
+
+class RenderPool:
+    """Thread pool with admission control, for blocking render calls from async endpoints."""
+
+    def __init__(self, workers=None, queue_depth=None):
+        self.workers = workers or default_render_workers()
+        self.queue_depth = default_render_queue() if queue_depth is None else queue_depth
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='render')
+            return self._executor
+
+    def _admit(self):
+        with self._lock:
+            if self.pending >= self.workers + self.queue_depth:
+                self.rejected += 1
+                raise RenderPoolFull()
+            self.pending += 1
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, fn, *args, is_disconnected=None, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and return its result.
+
+        ``is_disconnected`` is an async callable (Request.is_disconnected);
+        when it reports True the render is cancelled if still queued and
+        ClientDisconnected is raised.
+        """
+        self._admit()
+        try:
+            future = self.executor.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        waiter = asyncio.wrap_future(future)
+        try:
+            while True:
+                done, _ = await asyncio.wait({waiter}, timeout=DISCONNECT_POLL_INTERVAL)
+                if done:
+                    return waiter.result()
+                if is_disconnected is not None and await is_disconnected():
+                    self._cancel(future)
+                    raise ClientDisconnected()
+        except asyncio.CancelledError:
+            self._cancel(future)
+            raise
+
+    def _cancel(self, future):
+        if future.cancel():
+            with self._lock:
+                self.cancelled += 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {"workers": self.workers, "queue": self.queue_depth, "pending": self.pending,
+                "rejected": self.rejected, "cancelled": self.cancelled}
@@ -0,0 +1,137 @@
+"""Optional cache shared by every editor worker on a host, in one SQLite file.
+
+Under several uvicorn workers each in-process cache is a separate, cold
+copy. SharedCache lets workers reuse each other's render results and
+template metadata through a local SQLite database in WAL mode: readers
+never block, writers queue briefly, and no external service is needed.
+(The merged schema and compiled validator are already shared through
+lib/schema's disk cache, and compiled include templates through the
+bytecode cache.)
+
+Set CLUSTERFILE_EDITOR_SHARED_CACHE to a file path, or to 1 for
+<cache dir>/editor-shared.sqlite, to enable it; CLUSTERFILE_NO_CACHE turns
+it off. Entries are namespaced by a digest of the renderer code, so a new
+release never serves an old one's results. The file is trimmed to
+CLUSTERFILE_CACHE_MAX_MB (default 64), least recently used first. Values
+are JSON, never pickles. Any database error just counts as a miss.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from lib.cache import cache_disabled, default_cache_dir, default_cache_max_bytes
+
+# Check the total size every this many writes.
+TRIM_EVERY = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    ns TEXT NOT NULL,
+    key BLOB NOT NULL,
+    value TEXT NOT NULL,
+    stored REAL NOT NULL,
+    used REAL NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (ns, key)
+)
+"""
+
+
+class SharedCache:
+    """JSON values by (namespace, key) in a SQLite file that several processes open at once."""
+
+    def __init__(self, path, version='', max_bytes=None):
+        self.path = path
+        self.version = version
+        self.max_bytes = default_cache_max_bytes() if max_bytes is None else max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._connect()
+
+    def _connect(self):
+        # One connection per thread and process: sqlite3 connections must not cross either.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(_SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _ns(self, namespace):
+        return f"{namespace}:{self.version}"
+
+    def get(self, namespace, key, max_age=None):
+        """The value stored under key, or None when absent, older than max_age seconds, or unreadable."""
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT value, stored FROM entries WHERE ns = ? AND key = ?',
+                               (self._ns(namespace), key)).fetchone()
+            now = time.time()
+            if row is not None and max_age and now - row[1] > max_age:
+                row = None
+            if row is not None:
+                conn.execute('UPDATE entries SET used = ? WHERE ns = ? AND key = ?', (now, self._ns(namespace), key))
+                value = json.loads(row[0])
+        except (sqlite3.Error, ValueError):
+            with self._lock:
+                self.errors += 1
+            return None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return value
+
+    def put(self, namespace, key, value):
+        try:
+            text = json.dumps(value, default=str)
+            now = time.time()
+            conn = self._connect()
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                         (self._ns(namespace), key, text, now, now, len(text)))
+            with self._lock:
+                self._writes += 1
+                trim = self._writes % TRIM_EVERY == 0
+            if trim:
+                self.trim()
+        except (sqlite3.Error, TypeError, ValueError):
+            with self._lock:
+                self.errors += 1
+
+    def trim(self):
+        """Delete least recently used entries, and every other version's, until the file fits max_bytes."""
+        conn = self._connect()
+        conn.execute("DELETE FROM entries WHERE ns NOT LIKE ?", (f"%:{self.version}",))
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        conn.execute("""DELETE FROM entries WHERE rowid IN (
+                            SELECT rowid FROM (SELECT rowid, size, SUM(size) OVER (ORDER BY used) AS running FROM entries)
+                            WHERE running - size < ?)""", (excess,))
+
+    def stats(self):
+        return {"path": self.path, "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+def open_shared_cache(version=''):
+    """The SharedCache named by CLUSTERFILE_EDITOR_SHARED_CACHE, or None when unset, disabled or unusable."""
+    setting = os.environ.get('CLUSTERFILE_EDITOR_SHARED_CACHE', '')
+    if setting.lower() in ('', '0', 'false', 'no') or cache_disabled():
+        return None
+    path = default_cache_dir('editor-shared.sqlite') if setting.lower() in ('1', 'true', 'yes') else setting
+    try:
+        return SharedCache(path, version)
+    except (OSError, sqlite3.Error):
+        return None
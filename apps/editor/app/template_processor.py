@@ -1,11 +1,12 @@
 """Template processor for Jinja2 rendering with YAML output."""
 import yaml
 from jinja2 import Environment, FileSystemLoader
+import datetime
+import hashlib
 import os
-import yamllint.config
-import yamllint.linter
-import jsonpath_ng
 import re
+import threading
+from collections import OrderedDict
 from pathlib import Path
 import sys
 
@@ -13,8 +14,17 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..'))  #
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))              # container: /app/
 from lib.render import (
     IndentDumper, LoggingUndefined, base64encode, as_list, passwd_hash, set_by_path,
-    resolve_path, validate_data_for_template, YAMLLINT_CONFIG, format_yaml_output,
+    resolve_path, validate_data_for_template, format_yaml_output,
+    collect_missing, load_yaml, apply_overrides, FactsTemplate,
 )
+from lib.cache import open_bytecode_cache
+from lib.incremental import DependencyGraph, renderer_digest
+from lib.lint import default_lint_level, lint_yaml
+from lib.fragments import FragmentCacheExtension
+from lib.parallel import ParallelLoopExtension
+from lib.profiler import TemplateProfiler
+from app.render_cache import RenderCache
+from app.shared_cache import open_shared_cache
 
 # Backwards-compatible alias retained for the editor test module.
 _set_by_path = set_by_path
@@ -29,28 +39,20 @@ def load_file(path: str) -> str:
 
 def apply_params(data: dict, params: list) -> dict:
     """Apply JSONPath parameter overrides to data."""
-    for override in params:
-        if "=" not in override:
-            continue
-        path_expr, val = override.split("=", 1)
-        val = val.encode("utf-8").decode("unicode_escape")
-        try:
-            expr = jsonpath_ng.parse(path_expr)
-            matches = expr.find(data)
-            if matches:
-                for m in matches:
-                    m.full_path.update(data, val)
-                continue
-        except Exception:
-            pass
-        set_by_path(data, path_expr, val)
-    return data
+    return apply_overrides(data, params)
 
 
-def process_template(config_data: dict, template_content: str, template_dir: str) -> tuple:
-    """Process a Jinja2 template with the given configuration data.
-    Returns (output, missing_vars) tuple.
-    """
+# Optional store shared by the editor workers on this host (CLUSTERFILE_EDITOR_SHARED_CACHE),
+# versioned by the renderer's code so a new release starts clean.
+SHARED_CACHE = open_shared_cache(renderer_digest([
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('template_processor.py', 'render_cache.py')]))
+# With the shared cache, compiled includes are shared on disk as well.
+_BYTECODE_CACHE = open_bytecode_cache() if SHARED_CACHE is not None else None
+
+
+def build_environment(template_dir: str) -> Environment:
+    """Build the Jinja2 Environment used to render templates from template_dir."""
     includes_dir = os.path.join(template_dir, 'includes')
     plugins_tpl  = os.path.join(template_dir, 'plugins')
     plugins_root = os.path.join(os.path.dirname(template_dir), 'plugins')
@@ -62,24 +64,172 @@ def process_template(config_data: dict, template_content: str, template_dir: str
     if os.path.exists(plugins_root):
         loader_paths.append(plugins_root)
 
-    env = Environment(loader=FileSystemLoader(loader_paths), undefined=LoggingUndefined)
+    env = Environment(loader=FileSystemLoader(loader_paths), undefined=LoggingUndefined,
+                      bytecode_cache=_BYTECODE_CACHE,
+                      extensions=[FragmentCacheExtension, ParallelLoopExtension])
+    env.template_class = FactsTemplate
     env.globals["load_file"] = load_file
     env.filters["base64encode"] = base64encode
     env.filters["as_list"] = as_list
     env.filters["passwd_hash"] = passwd_hash
     env.filters["merge"] = lambda a, b: {**a, **b}
+    return env
+
+
+# One Environment per template directory for the life of the process. Jinja2's
+# auto_reload re-checks each include's mtime when it is used, so edits under
+# the templates and plugins directories are picked up without a restart.
+_ENVIRONMENTS = {}
+# Include closures of the templates in each Environment, for render cache keys.
+_GRAPHS = {}
+# Compiled top-level templates by (template dir, name, sha256 of the source), LRU-bounded.
+_COMPILED = OrderedDict()
+_COMPILED_MAX = 128
+_CACHE_LOCK = threading.Lock()
+
+
+def get_environment(template_dir: str) -> Environment:
+    """Return the cached Environment for template_dir, building it on first use."""
+    with _CACHE_LOCK:
+        env = _ENVIRONMENTS.get(template_dir)
+        if env is None:
+            env = _ENVIRONMENTS[template_dir] = build_environment(template_dir)
+        return env
+
+
+def get_dependency_graph(template_dir: str) -> DependencyGraph:
+    """Return the DependencyGraph over the cached Environment for template_dir."""
+    env = get_environment(template_dir)
+    with _CACHE_LOCK:
+        graph = _GRAPHS.get(template_dir)
+        if graph is None or graph.env is not env:
+            graph = _GRAPHS[template_dir] = DependencyGraph(env)
+        return graph
+
+
+def compile_template(template_content: str, template_dir: str, template_name: str = None):
+    """Return the compiled template for this source, compiling it only the first time it is seen."""
+    key = (template_dir, template_name, hashlib.sha256(template_content.encode('utf-8')).digest())
+    with _CACHE_LOCK:
+        template = _COMPILED.get(key)
+        if template is not None:
+            _COMPILED.move_to_end(key)
+            return template
+    template = get_environment(template_dir).from_string(template_content)
+    with _CACHE_LOCK:
+        _COMPILED[key] = template
+        while len(_COMPILED) > _COMPILED_MAX:
+            _COMPILED.popitem(last=False)
+    return template
+
+
+def clear_template_cache():
+    """Forget cached Environments and compiled templates (tests, benchmarks)."""
+    with _CACHE_LOCK:
+        _ENVIRONMENTS.clear()
+        _GRAPHS.clear()
+        _COMPILED.clear()
+
+
+def process_template(config_data: dict, template_content: str, template_dir: str,
+                     template_name: str = None) -> tuple:
+    """Process a Jinja2 template with the given configuration data.
+    Returns (output, missing_vars) tuple.
+    """
+    template = compile_template(template_content, template_dir, template_name)
+    with collect_missing() as missing:
+        output = template.render(config_data)
+    return output, missing
+
+
+# Results of recent renders, keyed by render_key().
+RENDER_CACHE = RenderCache(shared=SHARED_CACHE)
+
+
+# Scalars whose repr() is exact and tells the types apart: 1, 1.0, True, '1' and b'1' all differ.
+_REPR_TYPES = (type(None), bool, int, float, str, bytes)
+
 
-    LoggingUndefined._missing = {}
-    template = env.from_string(template_content)
-    output = template.render(config_data)
-    return output, dict(LoggingUndefined._missing)
+def _encode(value, out, active):
+    """Append a type-preserving encoding of value to out.
 
+    Containers keep their type and order (a dict renders in insertion
+    order), keys are encoded like values, and anything that is not plain
+    YAML data raises TypeError; a container that contains itself raises
+    ValueError.
+    """
+    kind = type(value)
+    if kind in _REPR_TYPES:
+        out.append(repr(value))
+    elif kind in (datetime.date, datetime.datetime):
+        out.append(f"{kind.__name__}({value.isoformat()})")
+    elif kind in (dict, list, tuple, set, frozenset):
+        if id(value) in active:
+            raise ValueError("recursive data")
+        active.add(id(value))
+        out.append(f"{kind.__name__}(")
+        if kind is dict:
+            for key, item in value.items():
+                _encode(key, out, active)
+                out.append(":")
+                _encode(item, out, active)
+                out.append(",")
+        else:
+            items = value
+            if kind in (set, frozenset):
+                items = sorted(items, key=lambda item: _encoded(item, active))
+            for item in items:
+                _encode(item, out, active)
+                out.append(",")
+        out.append(")")
+        active.discard(id(value))
+    else:
+        raise TypeError(f"cannot key a render on {kind.__name__}")
+
+
+def _encoded(value, active):
+    out = []
+    _encode(value, out, active)
+    return ''.join(out)
+
+
+def render_key(data: dict, template_name: str, template_dir: str):
+    """Digest of everything a render result depends on, or None if data cannot be keyed exactly."""
+    try:
+        text = _encoded(data, set())
+    except (TypeError, ValueError, RecursionError):
+        return None
+    h = hashlib.sha256(text.encode('utf-8'))
+    closure = get_dependency_graph(template_dir).closure_digest(template_name)
+    h.update(f"\0{template_name}\0{closure}\0{default_lint_level()}".encode('utf-8'))
+    return h.digest()
+
+
+def render_template(yaml_text: str, template_name: str, params: list, templates_dir: Path,
+                    profile: bool = False, cache: bool = True) -> dict:
+    """Render a Jinja2 template with YAML data and optional parameter overrides.
+
+    With ``profile`` the render, format and lint stages run under a
+    TemplateProfiler and the result carries a ``profile`` entry with the
+    top-N ``table`` and the ``collapsed`` stacks. Other results are served
+    from RENDER_CACHE when the same data, template and includes were
+    rendered recently; ``cache=False`` (and profiling) always renders.
+    """
+    if profile:
+        profiler = TemplateProfiler(root_name=os.path.basename(template_name))
+        with profiler:
+            result = render_template(yaml_text, template_name, params, templates_dir, cache=False)
+        sources = {}
+        try:
+            sources[profiler.root_name] = (templates_dir / os.path.basename(template_name)).read_text()
+        except OSError:
+            pass
+        result["profile"] = {"table": profiler.table(sources=sources), "collapsed": profiler.collapsed()}
+        return result
 
-def render_template(yaml_text: str, template_name: str, params: list, templates_dir: Path) -> dict:
-    """Render a Jinja2 template with YAML data and optional parameter overrides."""
     # Parse YAML input
     try:
-        data = yaml.safe_load(yaml_text) or {}
+        data = load_yaml(yaml_text) or {}
     except yaml.YAMLError as e:
         return {"success": False, "error": f"Invalid YAML: {e}", "output": ""}
 
@@ -107,6 +257,14 @@ def render_template(yaml_text: str, template_name: str, params: list, templates_
     except Exception as e:
         return {"success": False, "error": f"Failed to read template: {e}", "output": ""}
 
+    key = render_key(data, template_name, str(templates_dir)) if cache else None
+    if key is None:
+        return _render_data(data, template_name, template_content, templates_dir)
+    return RENDER_CACHE.get_or_render(key, lambda: _render_data(data, template_name, template_content, templates_dir))
+
+
+def _render_data(data: dict, template_name: str, template_content: str, templates_dir: Path) -> dict:
+    """Validate, render, format and lint parsed data: the cacheable part of render_template."""
     # Pre-render validation (warnings only, never blocks rendering)
     meta = parse_template_metadata(template_content)
     val_warnings, val_errors = validate_data_for_template(data, meta)
@@ -115,7 +273,7 @@ def render_template(yaml_text: str, template_name: str, params: list, templates_
 
     # Render template (LoggingUndefined prevents crashes on missing data)
     try:
-        processed, missing_vars = process_template(data, template_content, str(templates_dir))
+        processed, missing_vars = process_template(data, template_content, str(templates_dir), template_name)
         if missing_vars:
             subs = [f"{k}={v!r}" for k, v in sorted(missing_vars.items())]
             all_warnings.append(f"Substituted defaults: {', '.join(subs)}")
@@ -127,10 +285,8 @@ def render_template(yaml_text: str, template_name: str, params: list, templates_
         try:
             output_yaml = format_yaml_output(processed, meta)
 
-            # Run yamllint
-            config = yamllint.config.YamlLintConfig(YAMLLINT_CONFIG)
-            problems = list(yamllint.linter.run(output_yaml, config))
-            all_warnings += [str(p) for p in problems]
+            # Run yamllint (level from CLUSTERFILE_LINT, results cached by output hash)
+            all_warnings += lint_yaml(output_yaml, default_lint_level())
 
             return {
                 "success": True,
@@ -178,7 +334,7 @@ def parse_template_metadata(content: str) -> dict:
 
     meta_text = match.group(1)
     try:
-        parsed = yaml.safe_load(meta_text)
+        parsed = load_yaml(meta_text)
         if isinstance(parsed, dict):
             meta.update(parsed)
     except Exception:
@@ -187,11 +343,44 @@ def parse_template_metadata(content: str) -> dict:
     return meta
 
 
+# Template metadata per templates directory: (signature of the files, metadata list).
+_TEMPLATE_LISTS = {}
+
+
+def templates_signature(templates_dir: Path) -> bytes:
+    h = hashlib.sha256(str(templates_dir).encode('utf-8'))
+    for f in sorted(templates_dir.glob("*.tpl")) + sorted(templates_dir.glob("*.tmpl")):
+        try:
+            st = f.stat()
+        except OSError:
+            continue
+        h.update(f"\0{f.name}\0{st.st_mtime_ns}\0{st.st_size}".encode('utf-8'))
+    return h.digest()
+
+
 def list_templates(templates_dir: Path) -> list:
-    """List all available templates with metadata."""
-    templates = []
+    """List all available templates with metadata.
+
+    Parsed once per change of any template file (name, mtime, size), and
+    shared with the other editor workers through SHARED_CACHE when enabled.
+    """
     if not templates_dir.exists():
-        return templates
+        return []
+    signature = templates_signature(templates_dir)
+    cached = _TEMPLATE_LISTS.get(str(templates_dir))
+    if cached is not None and cached[0] == signature:
+        return list(cached[1])
+    templates = SHARED_CACHE.get('templates', signature) if SHARED_CACHE is not None else None
+    if templates is None:
+        templates = _read_templates(templates_dir)
+        if SHARED_CACHE is not None:
+            SHARED_CACHE.put('templates', signature, templates)
+    _TEMPLATE_LISTS[str(templates_dir)] = (signature, templates)
+    return list(templates)
+
+
+def _read_templates(templates_dir: Path) -> list:
+    templates = []
 
     for f in sorted(templates_dir.glob("*.tpl")):
         try:
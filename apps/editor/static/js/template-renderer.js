@@ -93,6 +93,62 @@
     }).join('\n');
   });
 
+  const FACT_ROLES = ['control', 'master', 'worker', 'bootstrap'];
+
+  /**
+   * Interface named by host.network.primary.ports[0], or undefined
+   * @param {Object} host - A host entry from the clusterfile
+   * @returns {Object|undefined} The boot interface
+   */
+  function findBootNic(host) {
+    const network = host && typeof host === 'object' ? host.network : null;
+    const primary = network && typeof network === 'object' ? network.primary : null;
+    const ports = primary && typeof primary === 'object' ? primary.ports : null;
+    if (!Array.isArray(ports) || !ports.length || !Array.isArray(network.interfaces)) return undefined;
+    return network.interfaces.find(nic => nic && typeof nic === 'object' && nic.name === ports[0]);
+  }
+
+  /**
+   * Values derived once per clusterfile, as lib/render.ClusterFacts provides
+   * them to server-side renders as `facts`
+   * @param {Object} data - The clusterfile data
+   * @returns {Object} The facts object
+   */
+  function deriveFacts(data) {
+    const hosts = data.hosts && typeof data.hosts === 'object' && !Array.isArray(data.hosts) ? data.hosts : {};
+    const network = data.network;
+    const hostsByRole = {};
+    FACT_ROLES.forEach(role => { hostsByRole[role] = []; });
+    const all = Object.values(hosts);
+    all.forEach(host => {
+      const role = host && typeof host === 'object' ? host.role : null;
+      (hostsByRole[role] = hostsByRole[role] || []).push(host);
+    });
+    const controlHosts = all.filter(host => host && typeof host === 'object' &&
+                                            (host.role === 'control' || host.role === 'master'));
+    const roleCounts = {};
+    Object.keys(hostsByRole).forEach(role => { roleCounts[role] = hostsByRole[role].length; });
+    const primary = network && typeof network === 'object' ? network.primary : null;
+    const subnet = primary && typeof primary === 'object' ? primary.subnet : null;
+    let primaryPrefix = 24;
+    if (typeof subnet === 'string') {
+      const prefix = parseInt(subnet.split('/').pop(), 10);
+      primaryPrefix = isNaN(prefix) ? 24 : prefix;
+    }
+    return {
+      hosts: hosts,
+      network: network,
+      hostsByRole: hostsByRole,
+      roleCounts: roleCounts,
+      controlHosts: controlHosts,
+      workerHosts: hostsByRole.worker,
+      controlCount: controlHosts.length,
+      workerCount: hostsByRole.worker.length,
+      primaryPrefix: primaryPrefix,
+      bootNic: findBootNic
+    };
+  }
+
   /**
    * Apply JSONPath-style parameter overrides to data object
    * @param {Object} data - The data object to modify
@@ -158,6 +214,7 @@
     try {
       // Apply parameter overrides
       const contextData = applyParams(data || {}, params || []);
+      contextData.facts = deriveFacts(contextData);
 
       // Render template
       const output = env.renderString(template, contextData);
@@ -189,6 +246,14 @@
     // This is a simple heuristic - may need refinement
     processed = processed.replace(/\{\{([^}]*?)\s+~\s+([^}]*?)\}\}/g, '{{ $1 + $2 }}');
 
+    // Server-side extension tags (lib/fragments, lib/parallel): {% cache %} is
+    // a plain block here and {% parallel %} a plain for loop. Whitespace
+    // control markers are kept so the output lines up with the server's.
+    processed = processed.replace(/\{%(-?)\s*cache\b[^%]*?(-?)%\}/g, '{%$1 if true $2%}');
+    processed = processed.replace(/\{%(-?)\s*endcache\s*(-?)%\}/g, '{%$1 endif $2%}');
+    processed = processed.replace(/\{%(-?)\s*parallel\b([^%]*?)(-?)%\}/g, '{%$1 for$2$3%}');
+    processed = processed.replace(/\{%(-?)\s*endparallel\s*(-?)%\}/g, '{%$1 endfor $2%}');
+
     // Handle loop.index0 vs loop.index0 (same in both)
     // Handle loop.first, loop.last (same in both)
 
@@ -202,6 +267,7 @@
       return render(processed, data, params);
     },
     applyParams: applyParams,
+    deriveFacts: deriveFacts,
     env: env
   };
 
@@ -227,3 +227,148 @@ class TestStaticFiles:
     def test_static_js_accessible(self):
         response = client.get("/static/js/app.js")
         assert response.status_code == 200
+
+
+class TestRenderPool:
+    """Tests for renders running on the bounded RENDER_POOL."""
+
+    @pytest.fixture
+    def blocked(self, monkeypatch):
+        """Make render_template block until released; yields the (started, release) events."""
+        import threading
+        import app.main as main
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow_render(**kwargs):
+            started.set()
+            release.wait(10)
+            return {"success": True, "output": "ok", "warnings": [], "error": ""}
+
+        monkeypatch.setattr(main, "render_template", slow_render)
+        yield started, release
+        release.set()
+
+    def _post(self, c, results):
+        results.append(c.post("/api/render", json={"yaml_text": "{}", "template_name": "x.yaml.tpl"}))
+
+    def test_healthz_answers_during_render(self, blocked):
+        import threading
+        started, release = blocked
+        results = []
+        with TestClient(app) as c:
+            worker = threading.Thread(target=self._post, args=(c, results))
+            worker.start()
+            assert started.wait(5)
+            assert c.get("/healthz").status_code == 200
+            assert not results  # answered while the render was still running
+            release.set()
+            worker.join(5)
+        assert results[0].json()["output"] == "ok"
+
+    def test_full_pool_returns_503(self, blocked, monkeypatch):
+        import threading
+        import app.main as main
+        from app.render_pool import RenderPool
+        monkeypatch.setattr(main, "RENDER_POOL", RenderPool(workers=1, queue_depth=0))
+        started, release = blocked
+        results = []
+        with TestClient(app) as c:
+            worker = threading.Thread(target=self._post, args=(c, results))
+            worker.start()
+            assert started.wait(5)
+            response = c.post("/api/render", json={"yaml_text": "{}", "template_name": "x.yaml.tpl"})
+            assert response.status_code == 503
+            assert response.headers["retry-after"] == "1"
+            release.set()
+            worker.join(5)
+        assert results[0].status_code == 200
+        assert main.RENDER_POOL.stats()["rejected"] == 1
+
+    def test_queued_render_cancelled_on_disconnect(self):
+        import asyncio
+        import threading
+        from app.render_pool import ClientDisconnected, RenderPool
+        pool = RenderPool(workers=1, queue_depth=1)
+        release = threading.Event()
+        ran = []
+
+        async def gone():
+            return True
+
+        async def scenario():
+            busy = asyncio.ensure_future(pool.run(release.wait, 10))
+            await asyncio.sleep(0.05)
+            with pytest.raises(ClientDisconnected):
+                await pool.run(ran.append, 1, is_disconnected=gone)
+            release.set()
+            await busy
+
+        asyncio.run(scenario())
+        pool.shutdown()
+        assert ran == []
+        assert pool.stats()["cancelled"] == 1 and pool.pending == 0
+
+
+class TestRenderCache:
+    """Tests for the render result cache behind /api/render."""
+
+    def test_repeat_render_is_a_cache_hit(self):
+        from app.template_processor import RENDER_CACHE
+        RENDER_CACHE.clear()
+        body = {"yaml_text": "cluster:\n  name: cached\nnetwork:\n  domain: example.com\n",
+                "template_name": "install-config.yaml.tpl"}
+        before = client.get("/api/stats").json()["render_cache"]
+        first = client.post("/api/render", json=body)
+        # A comment-only edit parses to the same data
+        second = client.post("/api/render", json={**body, "yaml_text": "# edited\n" + body["yaml_text"]})
+        after = client.get("/api/stats").json()["render_cache"]
+        assert first.status_code == second.status_code == 200
+        assert first.json() == second.json()
+        assert after["misses"] - before["misses"] == 1
+        assert after["hits"] - before["hits"] == 1
+
+
+class TestHttpCaching:
+    """Tests for ETags, compression and cache headers."""
+
+    @pytest.mark.parametrize("url", ["/api/schema", "/api/templates", "/"])
+    def test_etag_revalidation_and_gzip(self, url):
+        response = client.get(url, headers={"accept-encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["cache-control"] == "no-cache"
+        etag = response.headers["etag"]
+        plain = client.get(url, headers={"accept-encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.headers["etag"] != etag and plain.content == response.content
+        revalidated = client.get(url, headers={"accept-encoding": "gzip", "if-none-match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+
+    def test_template_list_etag_follows_files(self, tmp_path, monkeypatch):
+        import app.main as main
+        monkeypatch.setattr(main, "TEMPLATES_DIR", tmp_path)
+        template = tmp_path / "one.yaml.tpl"
+        template.write_text("{#- @meta\nname: one\n-#}\n")
+        first = client.get("/api/templates")
+        assert [t["name"] for t in first.json()["templates"]] == ["one"]
+        template.write_text("{#- @meta\nname: renamed\n-#}\n")
+        os.utime(template, (1, 1))
+        second = client.get("/api/templates", headers={"if-none-match": first.headers["etag"]})
+        assert second.status_code == 200
+        assert [t["name"] for t in second.json()["templates"]] == ["renamed"]
+
+    def test_index_links_content_hashed_assets(self):
+        import hashlib
+        import re
+        html = client.get("/").text
+        urls = re.findall(r'/static/vendor/[^"\']+', html)
+        assert urls and all("?v=" in url for url in urls)
+        path, version = urls[0].split("?v=")
+        asset = TEST_DIR.parent / path.lstrip("/")
+        assert version == hashlib.sha256(asset.read_bytes()).hexdigest()[:12]
+        assert client.get(urls[0]).headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert client.get(path).headers["cache-control"] == "no-cache"
+        assert client.get(f"{path}?v=0123456789ab").headers["cache-control"] == "no-cache"  # stale or made up
+        assert client.get(f"{path}?v=").headers["cache-control"] == "no-cache"
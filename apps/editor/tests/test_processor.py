@@ -1,4 +1,5 @@
 """Tests for the template processor module."""
+import datetime
 import pytest
 from pathlib import Path
 import os
@@ -240,6 +241,17 @@ hosts:
         assert "kind: List" not in result["output"]
         assert result["output"].count("---") >= 3
 
+    def test_profile_attributes_time_to_template_lines(self):
+        yaml_text = "cluster:\n  name: test\nnetwork:\n  domain: example.com\nhosts: {}\n"
+        plain = render_template(yaml_text=yaml_text, template_name="creds.yaml.tpl", params=[],
+                                templates_dir=TEMPLATES_DIR)
+        result = render_template(yaml_text=yaml_text, template_name="creds.yaml.tpl", params=[],
+                                 templates_dir=TEMPLATES_DIR, profile=True)
+        assert result["output"] == plain["output"]
+        assert "creds.yaml.tpl:" in result["profile"]["table"]
+        assert any(line.startswith("creds.yaml.tpl;") for line in result["profile"]["collapsed"].splitlines())
+        assert "profile" not in plain
+
 
 class TestParseTemplateMetadata:
     """Tests for template metadata parsing."""
@@ -248,3 +260,132 @@ class TestParseTemplateMetadata:
         content = (TEMPLATES_DIR / "install-config.yaml.tpl").read_text()
         meta = parse_template_metadata(content)
         assert meta["yamlWrapper"] == "raw"
+
+
+class TestTemplateCache:
+    """Tests for the cached Environment and compiled templates."""
+
+    def test_same_source_compiled_once(self):
+        from app.template_processor import compile_template, get_environment
+        source = "{{ cluster.name }}"
+        first = compile_template(source, str(TEMPLATES_DIR), "a.tpl")
+        assert compile_template(source, str(TEMPLATES_DIR), "a.tpl") is first
+        assert compile_template(source + " ", str(TEMPLATES_DIR), "a.tpl") is not first
+        assert first.environment is get_environment(str(TEMPLATES_DIR))
+
+    def test_edited_include_is_picked_up(self, tmp_path):
+        from app.template_processor import process_template
+        (tmp_path / "includes").mkdir()
+        part = tmp_path / "includes" / "part.tpl"
+        part.write_text("one")
+        assert process_template({}, "{% include 'part.tpl' %}", str(tmp_path))[0] == "one"
+        part.write_text("two")
+        os.utime(part, (1, 1))
+        assert process_template({}, "{% include 'part.tpl' %}", str(tmp_path))[0] == "two"
+
+
+class TestRenderResultCache:
+    """Tests for RenderCache limits and request coalescing."""
+
+    def result(self, output):
+        return {"success": True, "output": output, "warnings": [], "error": ""}
+
+    def test_lru_size_and_ttl_eviction(self):
+        from app.render_cache import RenderCache
+        now = [0.0]
+        cache = RenderCache(max_entries=2, max_bytes=10_000, ttl=60, clock=lambda: now[0])
+        for key in "abc":
+            cache.get_or_render(key, lambda: self.result(key))
+        assert cache.stats()["entries"] == 2 and cache.evictions == 1
+        cache.get_or_render("x", lambda: self.result("x" * 20_000))  # larger than the cache: not stored
+        assert cache.stats()["entries"] == 2
+        now[0] = 61
+        rendered = []
+        cache.get_or_render("c", lambda: rendered.append(1) or self.result("c"))
+        assert rendered == [1]  # expired
+        assert cache.get_or_render("c", lambda: self.result("other"))["output"] == "c"
+
+    def test_identical_in_flight_requests_render_once(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from app.render_cache import RenderCache
+        cache = RenderCache(max_bytes=10_000)
+        release = threading.Event()
+        calls = []
+
+        def render():
+            calls.append(1)
+            release.wait(5)
+            return self.result("shared")
+
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(cache.get_or_render, "k", render) for _ in range(4)]
+            while cache.coalesced < 3:
+                threading.Event().wait(0.01)
+            release.set()
+            outputs = [f.result()["output"] for f in futures]
+        assert outputs == ["shared"] * 4 and calls == [1]
+
+    def test_edited_include_changes_the_key(self, tmp_path):
+        from app.template_processor import render_key
+        (tmp_path / "top.tpl").write_text("{% include 'part.tpl' %}")
+        part = tmp_path / "part.tpl"
+        part.write_text("one")
+        key = render_key({"a": 1}, "top.tpl", str(tmp_path))
+        assert render_key({"a": 1}, "top.tpl", str(tmp_path)) == key
+        assert render_key({"a": 2}, "top.tpl", str(tmp_path)) != key
+        part.write_text("two")
+        os.utime(part, (1, 1))
+        assert render_key({"a": 1}, "top.tpl", str(tmp_path)) != key
+
+    def test_key_keeps_types_apart(self, tmp_path):
+        from app.template_processor import render_key
+        (tmp_path / "top.tpl").write_text("{{ a }}")
+        variants = [{1: "x"}, {"1": "x"}, {"a": [1, 2]}, {"a": (1, 2)}, {"a": 1}, {"a": 1.0}, {"a": True},
+                    {"a": "1"}, {"a": "True"}, {"a": None}, {"a": "None"}, {"a": 1, "b": 2}, {"b": 2, "a": 1},
+                    {"a": datetime.date(2024, 1, 2)}, {"a": "2024-01-02"}]
+        keys = [render_key(data, "top.tpl", str(tmp_path)) for data in variants]
+        assert None not in keys and len(set(keys)) == len(keys)
+        assert render_key({"a": object()}, "top.tpl", str(tmp_path)) is None
+        loop = []
+        loop.append(loop)
+        assert render_key({"a": loop}, "top.tpl", str(tmp_path)) is None
+
+
+class TestSharedCache:
+    """Tests for the SQLite cache shared between editor workers."""
+
+    def test_versions_and_lru_trim(self, tmp_path):
+        from app.shared_cache import SharedCache
+        path = str(tmp_path / "shared.sqlite")
+        old = SharedCache(path, version="v1")
+        old.put("render", b"k", {"output": "old"})
+        cache = SharedCache(path, version="v2", max_bytes=100)
+        assert cache.get("render", b"k") is None  # another release's entry
+        for i in range(5):
+            cache.put("render", b"k%d" % i, {"output": "x" * 30})
+        cache.get("render", b"k0")  # most recently used now
+        cache.trim()
+        kept = [i for i in range(5) if cache.get("render", b"k%d" % i) is not None]
+        assert 0 in kept and len(kept) <= 3
+        assert old.get("render", b"k") is None
+
+    def test_render_reused_by_another_worker(self, tmp_path):
+        import json
+        import subprocess
+        import sys
+        script = (
+            "import json, sys\n"
+            "from pathlib import Path\n"
+            "from app.template_processor import RENDER_CACHE, render_template\n"
+            "r = render_template('cluster:\\n  name: shared\\n', 'install-config.yaml.tpl', [], Path(sys.argv[1]))\n"
+            "print(json.dumps([r['output'], RENDER_CACHE.stats()['shared']['hits']]))\n"
+        )
+        env = dict(os.environ, CLUSTERFILE_EDITOR_SHARED_CACHE=str(tmp_path / "shared.sqlite"),
+                   CLUSTERFILE_CACHE_DIR=str(tmp_path / "cache"))
+        runs = [json.loads(subprocess.run([sys.executable, "-c", script, str(TEMPLATES_DIR)], env=env,
+                                          cwd=str(TEST_DIR.parent), capture_output=True, text=True,
+                                          check=True).stdout)
+                for _ in range(2)]
+        assert runs[0][0] == runs[1][0]
+        assert [hits for _, hits in runs] == [0, 1]
@@ -0,0 +1,337 @@
+"""Caches shared by the CLI processor and the editor backend."""
+import hashlib
+import locale
+import mmap
+import os
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from jinja2.bccache import BytecodeCache, Bucket
+
+
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def cache_disabled():
+    """True when CLUSTERFILE_NO_CACHE is set to a truthy value."""
+    return os.environ.get('CLUSTERFILE_NO_CACHE', '').lower() not in ('', '0', 'false', 'no')
+
+
+# Caches whose ``_lock`` is replaced in forked children: a lock that another
+# thread (a prefetch or lint worker) held at fork time would stay held there.
+_FORK_LOCKED = weakref.WeakSet()
+
+
+def fork_safe_lock(owner):
+    """A new lock for owner._lock, swapped for a fresh one in every forked child process."""
+    _FORK_LOCKED.add(owner)
+    return threading.Lock()
+
+
+def _reset_locks_in_child():
+    for owner in list(_FORK_LOCKED):
+        owner._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_locks_in_child)
+
+
+def default_cache_dir(*parts):
+    """Resolve the cache directory.
+
+    CLUSTERFILE_CACHE_DIR wins, then $XDG_CACHE_HOME/clusterfile, then
+    ~/.cache/clusterfile. Extra path parts select a subdirectory.
+    """
+    root = os.environ.get('CLUSTERFILE_CACHE_DIR')
+    if not root:
+        xdg = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        root = os.path.join(xdg, 'clusterfile')
+    return os.path.join(root, *parts)
+
+
+def default_cache_max_bytes():
+    """Size cap from CLUSTERFILE_CACHE_MAX_MB, or DEFAULT_CACHE_MAX_BYTES."""
+    try:
+        return int(float(os.environ['CLUSTERFILE_CACHE_MAX_MB']) * 1024 * 1024)
+    except (KeyError, ValueError):
+        return DEFAULT_CACHE_MAX_BYTES
+
+
+def atomic_write(path, data):
+    """Write bytes to path via a temp file + rename so readers never see a partial file."""
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def evict_lru(directory, max_bytes, suffix):
+    """Delete the least recently used ``*suffix`` files until the total fits max_bytes.
+
+    Entries are touched on every hit, so mtime order is LRU order. Files that
+    disappear underneath us (another process evicting) are simply skipped.
+    """
+    entries = []
+    total = 0
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if not entry.name.endswith(suffix):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+    except FileNotFoundError:
+        return 0
+    evicted = 0
+    if total <= max_bytes:
+        return evicted
+    entries.sort()
+    for _mtime, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+            evicted += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return evicted
+
+
+class TemplateBytecodeCache(BytecodeCache):
+    """On-disk Jinja2 bytecode cache keyed by template content hash.
+
+    The key covers the template name, filename and full source, so editing a
+    template or any include it pulls in yields a new key and the stale entry
+    ages out. Writes are atomic so concurrent processes can share the
+    directory, and the directory is trimmed to ``max_bytes`` LRU-first.
+    """
+    suffix = '.jinjabc'
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or default_cache_dir('bytecode')
+        self.max_bytes = default_cache_max_bytes() if max_bytes is None else max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_bucket(self, environment, name, filename, source):
+        h = hashlib.sha256()
+        h.update(f"{name}\0{filename}\0".encode('utf-8'))
+        h.update(source.encode('utf-8'))
+        bucket = Bucket(environment, h.hexdigest(), self.get_source_checksum(source))
+        self.load_bytecode(bucket)
+        return bucket
+
+    def _path(self, bucket):
+        return os.path.join(self.directory, bucket.key + self.suffix)
+
+    def load_bytecode(self, bucket):
+        path = self._path(bucket)
+        try:
+            with open(path, 'rb') as f:
+                bucket.load_bytecode(f)
+        except (OSError, EOFError, ValueError):
+            bucket.reset()
+        if bucket.code is None:
+            self.misses += 1
+            return
+        self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def dump_bytecode(self, bucket):
+        try:
+            atomic_write(self._path(bucket), bucket.bytecode_to_string())
+            self.evictions += evict_lru(self.directory, self.max_bytes, self.suffix)
+        except OSError:
+            pass  # a read-only or full cache dir must never break rendering
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        return f"bytecode-cache hits={self.hits} misses={self.misses} evictions={self.evictions}"
+
+
+def open_bytecode_cache(directory=None):
+    """Return a TemplateBytecodeCache, or None when disabled or the dir is unusable."""
+    if cache_disabled():
+        return None
+    try:
+        return TemplateBytecodeCache(directory)
+    except OSError:
+        return None
+
+
+class FileCache:
+    """In-process cache of text files read by templates through load_file.
+
+    Entries are keyed by absolute path and validated against (mtime, size) on
+    every lookup, so a file edited between renders is re-read. Files of
+    ``mmap_threshold`` bytes or more are decoded straight from an mmap, so
+    no intermediate bytes copy is made. Thread-safe, so
+    prefetch() can warm it from a pool while rendering proceeds.
+    """
+
+    mmap_threshold = 256 * 1024
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = fork_safe_lock(self)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _read(path, size):
+        if size < FileCache.mmap_threshold:
+            with open(path, 'r') as f:
+                return f.read()
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            # decode straight from the mapped pages; m[:] would first copy them into a bytes object
+            text = str(m, locale.getpreferredencoding(False))
+        # match text-mode universal newlines used for small files (replace() copies only when there is a \r)
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+    def read(self, path):
+        """Return the file's content, or None if it cannot be read."""
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        try:
+            content = self._read(path, st.st_size)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._entries[path] = (stamp, content)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return content
+
+    def prefetch(self, paths, max_workers=8):
+        """Read paths concurrently so later read() calls hit the cache."""
+        paths = sorted({p for p in paths if p and isinstance(p, str)})
+        if not paths:
+            return
+        if len(paths) == 1:
+            self.read(paths[0])
+            return
+        with ThreadPoolExecutor(min(max_workers, len(paths))) as pool:
+            list(pool.map(self.read, paths))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return f"file-cache hits={self.hits} misses={self.misses} entries={len(self._entries)}"
+
+
+class PasswdHashCache:
+    """passwd_hash results keyed by (password digest, salt, rounds), LRU-bounded and thread-safe.
+
+    SHA-512 crypt is deliberately slow, so a batch, fleet worker or daemon
+    hashes each password once. Entries stored with ``persist=True`` are also
+    written under ``directory`` (mode 0600) when CLUSTERFILE_PASSWD_CACHE is
+    set, so later runs skip the hash too. The caller must only persist keys
+    that cannot be brute-forced offline.
+    """
+
+    suffix = '.passwd'
+
+    def __init__(self, directory=None, max_entries=1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = fork_safe_lock(self)
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key):
+        if cache_disabled() or os.environ.get('CLUSTERFILE_PASSWD_CACHE', '').lower() in ('', '0', 'false', 'no'):
+            return None
+        directory = self.directory or default_cache_dir('passwd')
+        return os.path.join(directory, hashlib.sha256(repr(key).encode('utf-8')).hexdigest() + self.suffix)
+
+    def get(self, key, persist=False):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+        path = self._disk_path(key) if persist else None
+        if path is not None:
+            try:
+                with open(path, 'r') as f:
+                    value = f.read() or None
+            except OSError:
+                value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value, persist=False):
+        self._remember(key, value)
+        path = self._disk_path(key) if persist else None
+        if path is not None:
+            try:
+                os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+                atomic_write(path, value.encode('utf-8'))
+            except OSError:
+                pass  # a read-only or full cache dir must never break rendering
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return f"passwd-cache hits={self.hits} misses={self.misses} entries={len(self._entries)}"
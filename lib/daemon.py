@@ -0,0 +1,192 @@
+"""Unix-socket render daemon: a warm process.py that serves CLI invocations.
+
+The client half only uses the standard library so process.py can forward a
+request before importing jinja2, yaml, yamllint or jsonschema. Each request
+is one JSON line ``{"argv": [...], "cwd": "..."}``; the reply is one JSON
+line ``{"exit": int, "stdout": str, "stderr": str}``.
+
+Requests carry argv (including -p secrets) and the working directory, so a
+client only connects to a socket owned by its own user, in a directory no
+other user can write to; anything else counts as no daemon.
+"""
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import time
+
+# Exit status of `python3 lib/daemon.py ...` when no daemon answered, so
+# wrappers like process.sh know to fall back to rendering themselves.
+EX_NO_DAEMON = 75
+
+# Seconds a client waits for the daemon to accept it, and (unless
+# CLUSTERFILE_DAEMON_TIMEOUT says otherwise) for its reply, before rendering
+# in-process instead; and seconds the daemon waits for a request line.
+CONNECT_TIMEOUT = 2
+REPLY_TIMEOUT = 300
+REQUEST_TIMEOUT = 5
+
+
+def daemon_disabled():
+    return os.environ.get('CLUSTERFILE_NO_DAEMON', '').lower() not in ('', '0', 'false', 'no')
+
+
+def socket_path():
+    """CLUSTERFILE_SOCKET, else $XDG_RUNTIME_DIR/clusterfile.sock, else /tmp/clusterfile-<uid>/daemon.sock."""
+    path = os.environ.get('CLUSTERFILE_SOCKET')
+    if path:
+        return path
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime and os.path.isdir(runtime):
+        return os.path.join(runtime, 'clusterfile.sock')
+    return os.path.join('/tmp', f'clusterfile-{os.getuid()}', 'daemon.sock')
+
+
+def private_directory(directory):
+    """True when directory is owned by this user (or root) and not writable by group or others."""
+    try:
+        st = os.stat(directory)
+    except OSError:
+        return False
+    return (stat.S_ISDIR(st.st_mode) and st.st_uid in (os.getuid(), 0)
+            and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+
+def trusted_socket(path):
+    """True when path is a socket owned by this user inside a private_directory()."""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return (stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid()
+            and private_directory(os.path.dirname(os.path.abspath(path))))
+
+
+def reply_timeout():
+    """CLUSTERFILE_DAEMON_TIMEOUT seconds, else REPLY_TIMEOUT."""
+    try:
+        return max(0.1, float(os.environ['CLUSTERFILE_DAEMON_TIMEOUT']))
+    except (KeyError, ValueError):
+        return REPLY_TIMEOUT
+
+
+def _recv_line(sock, timeout):
+    """One newline-terminated message; raises socket.timeout when it takes longer than timeout seconds in all."""
+    deadline = time.monotonic() + timeout
+    chunks = []
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout('timed out')
+        sock.settimeout(remaining)
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b'\n'):
+            break
+    return b''.join(chunks)
+
+
+def request(argv, cwd=None, path=None, timeout=None):
+    """Send one render request; returns (exit, stdout, stderr) or None if no trusted daemon answers.
+
+    ``timeout`` bounds the wait for the reply (default reply_timeout()); a
+    daemon that does not answer in time counts as no daemon.
+    """
+    path = path or socket_path()
+    if not trusted_socket(path):
+        return None
+    timeout = reply_timeout() if timeout is None else timeout
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(min(CONNECT_TIMEOUT, timeout))
+            sock.connect(path)
+            sock.settimeout(timeout)
+            payload = {'argv': list(argv), 'cwd': cwd or os.getcwd()}
+            sock.sendall(json.dumps(payload).encode('utf-8') + b'\n')
+            reply = json.loads(_recv_line(sock, timeout) or b'null')
+    except (socket.timeout, OSError, ValueError):
+        return None
+    if not isinstance(reply, dict):
+        return None
+    return reply.get('exit', 1), reply.get('stdout', ''), reply.get('stderr', '')
+
+
+def forward(argv):
+    """Serve argv through a running daemon and exit, or return so the caller renders in-process."""
+    if daemon_disabled():
+        return
+    reply = request(argv)
+    if reply is None:
+        return
+    code, out, err = reply
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    sys.stdout.flush()
+    sys.exit(code)
+
+
+def serve(handler, path=None):
+    """Accept requests on a Unix socket until interrupted.
+
+    ``handler(argv, cwd)`` returns (exit, stdout, stderr). Requests are handled
+    one at a time so the handler may chdir and redirect stdio freely; a client
+    that does not send its request line within REQUEST_TIMEOUT seconds, or
+    stops reading the reply, is dropped so it cannot stall the others.
+    """
+    path = path or socket_path()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not private_directory(directory):
+        raise RuntimeError(f"{directory} is writable by other users; choose a private --socket directory")
+    if os.path.lexists(path):
+        if request([], path=path, timeout=1) is not None:
+            raise RuntimeError(f"a daemon is already listening on {path}")
+        os.unlink(path)  # stale socket from a daemon that died
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)  # socket is private to this user
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    server.listen(16)
+    try:
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    except ValueError:
+        pass  # not the main thread (embedded/tests); the caller owns shutdown
+    print(f"process.py daemon listening on {path}", file=sys.stderr)
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    req = json.loads(_recv_line(conn, REQUEST_TIMEOUT))
+                    argv, cwd = req['argv'], req['cwd']
+                except (socket.timeout, OSError, ValueError, KeyError, TypeError):
+                    continue
+                if not argv:
+                    code, out, err = 0, '', ''  # liveness probe
+                else:
+                    code, out, err = handler(argv, cwd)
+                try:
+                    conn.settimeout(REQUEST_TIMEOUT)
+                    conn.sendall(json.dumps({'exit': code, 'stdout': out, 'stderr': err}).encode('utf-8') + b'\n')
+                except (socket.timeout, OSError):
+                    pass  # client went away or stopped reading
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+if __name__ == '__main__':
+    # Client-only entry point for wrappers: forward argv or exit EX_NO_DAEMON.
+    forward(sys.argv[1:])
+    sys.exit(EX_NO_DAEMON)
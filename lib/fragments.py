@@ -0,0 +1,135 @@
+"""Fragment cache: ``{% cache key, ... %}...{% endcache %}`` memoizes rendered template fragments.
+
+Per-host includes such as the nmstate and BMC fragments render the same
+output for the same host in every template of a batch (agent-config,
+acm-ztp, nodes-config, clusterfile2siteconfig...). FragmentCacheExtension
+adds a ``cache`` tag whose body is rendered once per distinct set of key
+values and then reused from FRAGMENT_CACHE, for as long as the process
+lives: one batch, a fleet worker, the render daemon or the editor backend.
+
+The keys must name everything the body reads (``host``, ``name``,
+``network``...); values are compared by ``repr``, so they must be plain
+clusterfile data. The entry key also covers the body source and the
+current source of every template it includes, so editing a template in a
+long-lived process is picked up. Undefined-variable warnings raised by the
+body are stored with the fragment and raised again on every hit.
+
+A fragment is rendered without the cache when a data trace is recording
+(so the trace sees every read), when it read files through load_file()
+(their content is not part of the key), when a key value is not plain data,
+or when CLUSTERFILE_NO_CACHE is set.
+"""
+import hashlib
+import weakref
+from collections import OrderedDict
+from datetime import date
+
+from jinja2 import Undefined, nodes
+from jinja2.ext import Extension
+
+from lib.cache import cache_disabled, fork_safe_lock
+from lib.incremental import DependencyGraph, merge_file_reads, record_file_reads, referenced_names
+from lib.render import collect_missing, record_missing
+from lib.trace import active_trace
+
+# Key values whose repr identifies them exactly; containers are trusted to hold plain data too.
+_PLAIN = (dict, list, str, int, float, bool, type(None), date, Undefined)
+
+
+class FragmentCache:
+    """Rendered fragments by key, LRU-bounded and thread-safe.
+
+    Each entry is (output, undefined-variable substitutions made while
+    rendering it).
+    """
+
+    def __init__(self, max_entries=8192):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = fork_safe_lock(self)
+        self._graphs = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def graph(self, env):
+        graph = self._graphs.get(env)
+        if graph is None:
+            graph = self._graphs[env] = DependencyGraph(env)
+        return graph
+
+    def key(self, env, body, includes, values):
+        """Entry key for a fragment, or None when a value is not plain data."""
+        if not all(isinstance(value, _PLAIN) for value in values):
+            return None
+        h = hashlib.sha256(body.encode('utf-8'))
+        graph = self.graph(env)
+        for pattern in includes:
+            for name in graph.expand(pattern):
+                h.update(b'\0' + graph.closure_digest(name).encode('utf-8'))
+        for value in values:
+            h.update(b'\0' + repr(value).encode('utf-8'))
+        return h.digest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, output, missing):
+        with self._lock:
+            self._entries[key] = (output, dict(missing))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return f"fragment-cache hits={self.hits} misses={self.misses} entries={len(self._entries)}"
+
+
+FRAGMENT_CACHE = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """The ``{% cache key, ... %}...{% endcache %}`` tag, backed by FRAGMENT_CACHE."""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        keys = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            keys.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        # The body's own source, as a stable digest of its AST, and the templates it pulls in.
+        source = hashlib.sha256(repr(body).encode('utf-8')).hexdigest()
+        includes = referenced_names(nodes.Template(body))
+        args = [nodes.Const(source), nodes.Const(includes), nodes.List(keys)]
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, source, includes, values, caller):
+        if active_trace() is not None or cache_disabled():
+            return caller()
+        key = FRAGMENT_CACHE.key(self.environment, source, includes, values)
+        if key is None:
+            return caller()
+        entry = FRAGMENT_CACHE.get(key)
+        if entry is not None:
+            output, missing = entry
+            record_missing(missing)
+            return output
+        with collect_missing() as missing, record_file_reads() as reads:
+            output = caller()
+        record_missing(missing)
+        merge_file_reads(reads)
+        if not reads:
+            FRAGMENT_CACHE.put(key, output, missing)
+        return output
@@ -0,0 +1,387 @@
+"""Incremental re-rendering: template dependency graphs and an on-disk output cache.
+
+A rendered output depends on three things: the template closure (the template
+plus everything it includes or imports, with dynamic includes such as
+``'platforms/' ~ platform ~ '/creds.yaml.tpl'`` widened to every template
+they could name), the parts of the clusterfile those templates read, and the
+files they pull in through load_file(). DependencyGraph works out the first
+two statically from the Jinja2 AST; load_file() reads are recorded while
+rendering and re-checked on lookup. OutputCache keys rendered outputs by all
+of it, so a batch or fleet render only rebuilds templates whose inputs changed.
+
+Data paths are tracked conservatively: ``cluster.network.primary`` or
+``hosts['node1']`` narrow the dependency, while anything else (a loop over
+``hosts.items()``, a computed key, a filter) depends on the whole value. A read
+of ``facts`` (ClusterFacts) depends on ``hosts`` and ``network``.
+"""
+import contextvars
+import fnmatch
+import hashlib
+import json
+import os
+import weakref
+
+import jinja2
+import yaml
+from jinja2 import TemplateNotFound, nodes
+
+from lib.cache import atomic_write, cache_disabled, default_cache_dir, default_cache_max_bytes, evict_lru
+
+# Bumped when the key derivation or the layout of cached entries changes.
+_CACHE_VERSION = '1'
+
+# dict attributes Jinja2 resolves before keys: ``cluster.items`` is the method, not a key.
+_DICT_METHODS = frozenset(dir(dict))
+
+_MISSING = object()
+
+# Context names the renderer derives from the data, and the data paths they are derived from.
+DERIVED_NAMES = {'facts': (('hosts',), ('network',))}
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Sources whose behaviour shapes rendered output; editing one invalidates every entry.
+_RENDERER_SOURCES = ('process.py', 'lib/render.py', 'lib/lint.py', 'lib/incremental.py', 'lib/fragments.py')
+
+
+def renderer_digest(extra_sources=()):
+    """Digest of the renderer's code and library versions, plus extra_sources (absolute or repo-relative paths)."""
+    h = hashlib.sha256(f"{_CACHE_VERSION}\0{jinja2.__version__}\0{yaml.__version__}\0".encode('utf-8'))
+    for name in _RENDERER_SOURCES + tuple(extra_sources):
+        try:
+            with open(os.path.join(_REPO_ROOT, name), 'rb') as fh:
+                h.update(fh.read())
+        except OSError:
+            h.update(b'\0missing\0' + name.encode('utf-8'))
+    return h.hexdigest()
+
+
+def _access_path(node):
+    """(path, leftover nodes) when node is a constant access chain rooted at a Name, else None.
+
+    ``cluster.network['primary']`` gives ('cluster', 'network', 'primary');
+    ``cluster.get('name', default)`` gives ('cluster', 'name') with ``default``
+    left over to be scanned separately.
+    """
+    if isinstance(node, nodes.Name):
+        return ((node.name,), []) if node.ctx == 'load' else None
+    if isinstance(node, nodes.Getattr) and node.attr not in _DICT_METHODS:
+        inner = _access_path(node.node)
+        return inner and (inner[0] + (node.attr,), inner[1])
+    if isinstance(node, nodes.Getitem) and isinstance(node.arg, nodes.Const) \
+            and isinstance(node.arg.value, (str, int)) and not isinstance(node.arg.value, bool):
+        inner = _access_path(node.node)
+        return inner and (inner[0] + (node.arg.value,), inner[1])
+    if isinstance(node, nodes.Call) and isinstance(node.node, nodes.Getattr) and node.node.attr == 'get' \
+            and node.args and isinstance(node.args[0], nodes.Const) and isinstance(node.args[0].value, str) \
+            and node.dyn_args is None and node.dyn_kwargs is None:
+        inner = _access_path(node.node.node)
+        return inner and (inner[0] + (node.args[0].value,), inner[1] + node.args[1:] + node.kwargs)
+    return None
+
+
+def data_paths(ast):
+    """Every data access path read by a template AST, as tuples of keys."""
+    paths = set()
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        access = _access_path(node)
+        if access is not None:
+            paths.update(DERIVED_NAMES.get(access[0][0], (access[0],)))
+            stack.extend(access[1])
+        else:
+            stack.extend(node.iter_child_nodes())
+    return paths
+
+
+def _name_pattern(expr):
+    """Glob patterns for a template-name expression; non-constant parts become ``*``."""
+    if isinstance(expr, nodes.Const):
+        return [expr.value] if isinstance(expr.value, str) else []
+    if isinstance(expr, (nodes.List, nodes.Tuple)):
+        return [p for item in expr.items for p in _name_pattern(item)]
+    if isinstance(expr, nodes.CondExpr):
+        return _name_pattern(expr.expr1) + (_name_pattern(expr.expr2) if expr.expr2 is not None else [])
+    if isinstance(expr, (nodes.Concat, nodes.Add)):
+        parts = expr.nodes if isinstance(expr, nodes.Concat) else [expr.left, expr.right]
+        patterns = ['']
+        for part in parts:
+            options = _name_pattern(part) if isinstance(part, (nodes.Const, nodes.Concat, nodes.Add)) else ['*']
+            patterns = [p + o for p in patterns for o in (options or ['*'])]
+        return [p.replace('**', '*') for p in patterns]
+    return ['*']
+
+
+def referenced_names(ast):
+    """Template names (or glob patterns, for dynamic names) included, imported or extended by ast."""
+    names = []
+    for node in ast.find_all((nodes.Include, nodes.Import, nodes.FromImport, nodes.Extends)):
+        names.extend(_name_pattern(node.template))
+    return names
+
+
+class DependencyGraph:
+    """Include/import closure and data paths of the templates in one Environment.
+
+    Parsed templates are memoized and re-read when the loader reports them
+    changed. Dynamic-include expansions are memoized for the graph's lifetime,
+    so a template added under platforms/ is seen by the next graph.
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self._templates = {}
+        self._patterns = {}
+
+    def _info(self, name):
+        entry = self._templates.get(name)
+        if entry is not None and entry[0]():
+            return entry[1]
+        try:
+            source, filename, uptodate = self.env.loader.get_source(self.env, name)
+        except TemplateNotFound:
+            info, uptodate = (None, None, (), frozenset()), None
+        else:
+            ast = self.env.parse(source, name, filename)
+            digest = hashlib.sha256(source.encode('utf-8')).hexdigest()
+            info = (filename, digest, tuple(referenced_names(ast)), frozenset(data_paths(ast)))
+        self._templates[name] = (uptodate or (lambda: False), info)
+        return info
+
+    def expand(self, pattern):
+        """Template names matching a glob pattern, across every loader search path."""
+        if '*' not in pattern:
+            return [pattern]
+        names = self._patterns.get(pattern)
+        if names is None:
+            names = sorted(n for n in self._candidates(pattern) if fnmatch.fnmatchcase(n, pattern))
+            self._patterns[pattern] = names
+        return names
+
+    def _candidates(self, pattern):
+        loader = self.env.loader
+        if not isinstance(loader, jinja2.FileSystemLoader):
+            return loader.list_templates()
+        prefix = pattern[:pattern.index('*')].rpartition('/')[0]
+        found = set()
+        for searchpath in loader.searchpath:
+            top = os.path.join(searchpath, prefix)
+            for dirpath, _, filenames in os.walk(top, followlinks=loader.followlinks):
+                for filename in filenames:
+                    rel = os.path.relpath(os.path.join(dirpath, filename), searchpath)
+                    found.add(rel.replace(os.path.sep, '/'))
+        return found
+
+    def closure(self, name):
+        """name plus every template reachable from it, in discovery order."""
+        ordered, seen, queue = [], set(), [name]
+        while queue:
+            current = queue.pop(0)
+            if current in seen:
+                continue
+            seen.add(current)
+            ordered.append(current)
+            for ref in self._info(current)[2]:
+                queue.extend(self.expand(ref))
+        return ordered
+
+    def closure_digest(self, name):
+        """sha256 over the name, resolved filename and source of every template in the closure.
+
+        A template that does not exist yet contributes its name, so creating
+        it later changes the digest.
+        """
+        h = hashlib.sha256()
+        for current in self.closure(name):
+            filename, digest = self._info(current)[:2]
+            h.update(f"{current}\0{filename}\0{digest}\0".encode('utf-8'))
+        return h.hexdigest()
+
+    def data_paths(self, name):
+        """Minimal set of data paths read anywhere in the closure: a path covered by a shorter one is dropped."""
+        paths = set()
+        for current in self.closure(name):
+            paths |= self._info(current)[3]
+        return _minimal_paths(paths)
+
+
+def _minimal_paths(paths):
+    result = []
+    for path in sorted(paths, key=lambda p: (len(p), [repr(k) for k in p])):
+        if not any(path[:len(kept)] == kept for kept in result):
+            result.append(path)
+    return sorted(result, key=lambda p: [repr(k) for k in p])
+
+
+class DataDigest:
+    """Digests of the values at data paths, memoized per path for one data object."""
+
+    def __init__(self, data):
+        self.data = data
+        self._values = {}
+
+    def _value(self, path):
+        digest = self._values.get(path)
+        if digest is None:
+            value = self.data
+            for key in path:
+                if isinstance(value, dict):
+                    value = value.get(key, _MISSING)
+                elif isinstance(value, list) and isinstance(key, int):
+                    value = value[key] if -len(value) <= key < len(value) else _MISSING
+                else:
+                    break  # a scalar: anything derived from it depends on all of it
+                if value is _MISSING:
+                    break
+            text = '<missing>' if value is _MISSING else repr(value)
+            digest = self._values[path] = hashlib.sha256(text.encode('utf-8')).digest()
+        return digest
+
+    def digest(self, paths):
+        h = hashlib.sha256()
+        for path in paths:
+            h.update(repr(path).encode('utf-8'))
+            h.update(self._value(path))
+        return h.hexdigest()
+
+
+# load_file() reads made during the current render: absolute path -> content digest (None if unreadable).
+_FILE_READS = contextvars.ContextVar('clusterfile_file_reads', default=None)
+
+
+def content_digest(content):
+    return None if content is None else hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def note_file_read(path, content):
+    """Record a load_file() read for the render in progress, if one is being recorded."""
+    reads = _FILE_READS.get()
+    if reads is not None:
+        reads[os.path.abspath(path)] = content_digest(content)
+
+
+def merge_file_reads(reads):
+    """Add reads collected by a nested record_file_reads() block to the enclosing one, if any."""
+    outer = _FILE_READS.get()
+    if outer is not None:
+        outer.update(reads)
+
+
+class record_file_reads:
+    """Context manager collecting load_file() reads into a dict while it is active."""
+
+    def __enter__(self):
+        self.reads = {}
+        self._token = _FILE_READS.set(self.reads)
+        return self.reads
+
+    def __exit__(self, *exc):
+        _FILE_READS.reset(self._token)
+
+
+class OutputCache:
+    """Rendered outputs on disk, keyed by template closure, relevant data and render options.
+
+    ``read_file`` returns a file's current content (or None) and is used to
+    check the load_file() reads recorded with each entry. Entries are JSON,
+    written atomically and trimmed LRU-first like the other caches.
+    """
+    suffix = '.output'
+
+    def __init__(self, directory=None, max_bytes=None, read_file=None):
+        self.directory = directory or default_cache_dir('outputs')
+        self.max_bytes = default_cache_max_bytes() if max_bytes is None else max_bytes
+        self.read_file = read_file or _read_text
+        os.makedirs(self.directory, exist_ok=True)
+        self._renderer = renderer_digest()
+        self._graphs = weakref.WeakKeyDictionary()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_graphs']  # per-process; rebuilt on first use
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._graphs = weakref.WeakKeyDictionary()
+
+    def graph(self, env):
+        graph = self._graphs.get(env)
+        if graph is None:
+            graph = self._graphs[env] = DependencyGraph(env)
+        return graph
+
+    def key(self, env, template_name, data, meta=None, **options):
+        """Cache key for rendering template_name from env against data.
+
+        ``data`` is a DataDigest (share one across the templates of a batch).
+        ``options`` are the render settings that change the output, such as the
+        lint level. The effect of -p overrides is covered by the data digest.
+        """
+        graph = self.graph(env)
+        paths = set(graph.data_paths(template_name))
+        paths.add(('cluster', 'platform'))  # platform compatibility warning
+        for required in (meta or {}).get('requires') or []:
+            paths.add(tuple(str(required).split('.')))
+        loader = env.loader
+        search = getattr(loader, 'searchpath', None) or [type(loader).__name__]
+        h = hashlib.sha256()
+        for part in (self._renderer, template_name, graph.closure_digest(template_name),
+                     data.digest(_minimal_paths(paths)), json.dumps(search), os.getcwd(),
+                     json.dumps(options, sort_keys=True, default=str)):
+            h.update(part.encode('utf-8') + b'\0')
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        """The cached (output, messages) for key, or None when missing or a file it read has changed."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fh:
+                entry = json.loads(fh.read())
+        except (OSError, ValueError):
+            return None
+        for file_path, digest in entry.get('files', {}).items():
+            if content_digest(self.read_file(file_path)) != digest:
+                return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry['output'], entry['messages']
+
+    def put(self, key, output, messages, files):
+        entry = {'output': output, 'messages': list(messages), 'files': files}
+        try:
+            atomic_write(self._path(key), json.dumps(entry).encode('utf-8'))
+            evict_lru(self.directory, self.max_bytes, self.suffix)
+        except OSError:
+            pass  # a read-only or full cache dir must never break rendering
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+
+def _read_text(path):
+    try:
+        with open(path, 'r') as fh:
+            return fh.read()
+    except (OSError, ValueError):
+        return None
+
+
+def open_output_cache(directory=None, read_file=None):
+    """Return an OutputCache, or None when caching is disabled or the dir is unusable."""
+    if cache_disabled():
+        return None
+    try:
+        return OutputCache(directory, read_file=read_file)
+    except OSError:
+        return None
@@ -0,0 +1,147 @@
+"""yamllint on rendered output, shared by the CLI processor and the editor backend.
+
+Three levels: ``off``; ``fast``, which checks syntax with libyaml and runs only
+yamllint's line rules (trailing spaces, empty lines, newlines), skipping the
+pure-Python token scan that dominates on large outputs; and ``full``, the
+complete YAMLLINT_CONFIG rule set. Output formatted by dump_yaml() already
+satisfies the token rules, so ``fast`` loses little on YAML templates.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import yaml
+import yamllint.config
+import yamllint.linter
+import yamllint.parser
+from yamllint.linter import LintProblem
+
+from lib.cache import fork_safe_lock
+from lib.render import YAMLLINT_CONFIG
+
+LINT_LEVELS = ('off', 'fast', 'full')
+
+try:
+    from yaml import CBaseLoader as _SyntaxLoader
+except ImportError:
+    _SyntaxLoader = yaml.BaseLoader
+
+
+def default_lint_level():
+    """CLUSTERFILE_LINT if it names a level, else ``full``."""
+    level = os.environ.get('CLUSTERFILE_LINT', '').lower()
+    return level if level in LINT_LEVELS else 'full'
+
+
+_CONFIG = None
+_CONFIG_LOCK = threading.Lock()
+
+
+def lint_config():
+    """The YAMLLINT_CONFIG rule set, built once per process."""
+    global _CONFIG
+    if _CONFIG is None:
+        with _CONFIG_LOCK:
+            if _CONFIG is None:
+                _CONFIG = yamllint.config.YamlLintConfig(YAMLLINT_CONFIG)
+    return _CONFIG
+
+
+def _syntax_problem(text):
+    try:
+        for _ in yaml.parse(text, Loader=_SyntaxLoader):
+            pass
+    except yaml.MarkedYAMLError as e:
+        mark = e.problem_mark
+        problem = LintProblem(mark.line + 1, mark.column + 1, f"syntax error: {e.problem} (syntax)")
+        problem.level = 'error'
+        return problem
+    return None
+
+
+def _fast_problems(text, conf):
+    syntax = _syntax_problem(text)
+    rules = [rule for rule in conf.enabled_rules(None) if rule.TYPE == 'line']
+    for line in yamllint.parser.line_generator(text):
+        for rule in rules:
+            rule_conf = conf.rules[rule.ID]
+            for problem in rule.check(rule_conf, line):
+                problem.rule = rule.ID
+                problem.level = rule_conf['level']
+                if syntax and (syntax.line, syntax.column) <= (problem.line, problem.column):
+                    yield syntax
+                    syntax = None
+                yield problem
+    if syntax:
+        yield syntax
+
+
+def lint_problems(text, level='full'):
+    """Lint text at ``level`` without the cache; returns problems as strings."""
+    if level == 'off':
+        return []
+    if level == 'fast':
+        return [str(p) for p in _fast_problems(text, lint_config())]
+    if level == 'full':
+        return [str(p) for p in yamllint.linter.run(text, lint_config())]
+    raise ValueError(f"unknown lint level {level!r} (expected one of {', '.join(LINT_LEVELS)})")
+
+
+class LintCache:
+    """Lint results keyed by (level, sha256 of the output), LRU-bounded and thread-safe.
+
+    Re-rendering an unchanged template (daemon, editor, fleet of similar
+    clusters) then skips yamllint entirely.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = fork_safe_lock(self)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text, level):
+        return level, hashlib.sha256(text.encode('utf-8')).digest()
+
+    def get(self, key):
+        with self._lock:
+            problems = self._entries.get(key)
+            if problems is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(problems)
+
+    def put(self, key, problems):
+        with self._lock:
+            self._entries[key] = tuple(problems)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return f"lint-cache hits={self.hits} misses={self.misses} entries={len(self._entries)}"
+
+
+LINT_CACHE = LintCache()
+
+
+def lint_yaml(text, level='full'):
+    """Lint text at ``level`` through LINT_CACHE; returns problems as strings."""
+    if level == 'off':
+        return []
+    key = LINT_CACHE.key(text, level)
+    problems = LINT_CACHE.get(key)
+    if problems is None:
+        problems = lint_problems(text, level)
+        LINT_CACHE.put(key, problems)
+    return problems
+
@@ -0,0 +1,124 @@
+"""Parallel host loops: ``{% parallel name, host in hosts.items() %}...{% endparallel %}``.
+
+The ``parallel`` tag is a for loop whose iterations are independent, such as
+the per-host resources in acm-ztp and acm-capi-m3. With more than one render
+job, a long loop is split into contiguous chunks and the body is rendered
+for each chunk in a forked worker process. Forking at the loop means every
+worker sees exactly the parent's state at that point (the context, outer
+variables, compiled templates), so nothing has to be pickled except the
+rendered text coming back. Chunks are joined in order, so the output is
+byte-identical to a serial render. Undefined-variable warnings and
+load_file() reads from the workers are merged into the parent's.
+
+The body must not rely on ``loop`` or change state outside itself (a
+namespace, a list it appends to), since each worker changes only its own
+copy. The loop runs serially when there is one job (the default), it has
+fewer than MIN_ITEMS_PER_JOB items per extra worker, fork is unavailable,
+the render is traced or profiled (a DataTrace, sys.settrace or
+sys.setprofile), or it is not running on the main thread of a non-daemonic
+process (fleet workers already run in parallel). It also runs serially while
+any other thread is alive: a forked child gets only the forking thread, so a
+lock another thread held at the fork would never be released there.
+"""
+import multiprocessing
+import os
+import sys
+import threading
+from contextvars import ContextVar
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from lib.incremental import merge_file_reads, record_file_reads
+from lib.render import collect_missing, record_missing
+from lib.trace import active_trace
+
+# A worker is only worth forking for at least this many loop items.
+MIN_ITEMS_PER_JOB = 50
+
+# Chunks per job, so a job that draws heavy hosts does not finish last by a wide margin.
+CHUNKS_PER_JOB = 2
+
+_JOBS = ContextVar('clusterfile_render_jobs', default=1)
+
+# The loop being rendered in parallel: (caller, unpack, chunks). Set in the
+# parent just before the pool forks, so the workers inherit it.
+_LOOP = None
+
+
+def default_render_jobs():
+    """CLUSTERFILE_RENDER_JOBS, else 1: parallel loops are opt-in."""
+    try:
+        return max(1, int(os.environ['CLUSTERFILE_RENDER_JOBS']))
+    except (KeyError, ValueError):
+        return 1
+
+
+def set_render_jobs(jobs):
+    """Render ``parallel`` loops with up to ``jobs`` processes in the current context (1: serial)."""
+    _JOBS.set(max(1, jobs or 1))
+
+
+def _other_threads_running():
+    """True while any thread besides the calling one is alive; a fork would copy their locks but not them."""
+    return threading.active_count() > 1
+
+
+def _usable_jobs(count):
+    jobs = min(_JOBS.get(), count // MIN_ITEMS_PER_JOB)
+    if jobs < 2:
+        return 1
+    if 'fork' not in multiprocessing.get_all_start_methods() or multiprocessing.current_process().daemon:
+        return 1
+    if threading.current_thread() is not threading.main_thread() or _other_threads_running():
+        return 1
+    if active_trace() is not None or sys.gettrace() is not None or sys.getprofile() is not None:
+        return 1
+    return jobs
+
+
+def _render_items(caller, unpack, items):
+    return ''.join(caller(*item) if unpack else caller(item) for item in items)
+
+
+def _render_chunk(index):
+    caller, unpack, chunks = _LOOP
+    with collect_missing() as missing, record_file_reads() as reads:
+        output = _render_items(caller, unpack, chunks[index])
+    return str(output), missing, reads
+
+
+class ParallelLoopExtension(Extension):
+    """The ``{% parallel target in iterable %}...{% endparallel %}`` tag."""
+
+    tags = {'parallel'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        target = parser.parse_assign_target(extra_end_rules=('name:in',))
+        parser.stream.expect('name:in')
+        iterable = parser.parse_tuple(with_condexpr=False)
+        body = parser.parse_statements(('name:endparallel',), drop_needle=True)
+        names = target.items if isinstance(target, nodes.Tuple) else [target]
+        params = [nodes.Name(name.name, 'param') for name in names]
+        call = self.call_method('_loop', [iterable, nodes.Const(isinstance(target, nodes.Tuple))])
+        return nodes.CallBlock(call, params, [], body).set_lineno(lineno)
+
+    def _loop(self, iterable, unpack, caller):
+        global _LOOP
+        items = list(iterable)
+        jobs = _usable_jobs(len(items))
+        if jobs == 1:
+            return _render_items(caller, unpack, items)
+        size = -(-len(items) // (jobs * CHUNKS_PER_JOB))
+        chunks = [items[start:start + size] for start in range(0, len(items), size)]
+        _LOOP = (caller, unpack, chunks)
+        try:
+            with multiprocessing.get_context('fork').Pool(jobs) as pool:
+                results = pool.map(_render_chunk, range(len(chunks)), chunksize=1)
+        finally:
+            _LOOP = None
+        for _, missing, reads in results:
+            record_missing(missing)
+            merge_file_reads(reads)
+        return ''.join(output for output, _, _ in results)
@@ -0,0 +1,261 @@
+"""Render profiler: wall time and call counts by template line, include, macro and filter.
+
+TemplateProfiler installs a trace function for the current thread. Frames of
+compiled templates are recognised by the ``name``/``debug_info`` globals
+Jinja2 puts in every generated module, and their line events are mapped back
+to template source lines the same way Jinja2 maps tracebacks. Python
+functions registered as filters or globals (``passwd_hash``, ``selectattr``,
+``load_file``...) and the pipeline STAGES (compile, format, lint) become
+their own frames. Every other Python call is charged to the innermost
+template line or stage that made it.
+
+The time between two trace events goes to the innermost frame, so each
+template line gets its self time and each stack (template, line, include,
+line, filter...) its share of the total. ``table()`` gives the top-N report;
+``collapsed()`` gives the stacks in the folded format flamegraph.pl and
+speedscope read, in microseconds.
+"""
+import inspect
+import sys
+import time
+from collections import defaultdict
+
+from jinja2 import Environment
+
+from lib.lint import lint_yaml
+from lib.render import format_yaml_output, format_yaml_stream, validate_data_for_template
+
+# Label for time spent outside any template frame or pipeline stage.
+OUTSIDE = '(other)'
+
+# Pipeline stages around the template code, shown as frames of their own.
+STAGES = (
+    (Environment.compile, 'compile'),
+    (validate_data_for_template, 'validate'),
+    (format_yaml_output, 'format'),
+    (format_yaml_stream, 'format'),
+    (lint_yaml, 'lint'),
+)
+
+
+def _line_map(debug_info):
+    pairs = [tuple(map(int, item.split('='))) for item in debug_info.split('&') if item]
+    return sorted(pairs, key=lambda pair: pair[1])
+
+
+class _Frame:
+    __slots__ = ('frame', 'label', 'template', 'line', 'lines')
+
+    def __init__(self, frame, label, template=None, lines=None):
+        self.frame = frame
+        self.label = label
+        self.template = template
+        self.lines = lines
+        self.line = None
+
+
+class TemplateProfiler:
+    """Profile every template render run inside ``with profiler:`` on this thread.
+
+    ``root_name`` names templates compiled from a string (``Environment.from_string``),
+    which carry no template name of their own.
+    """
+
+    def __init__(self, root_name='<template>'):
+        self.root_name = root_name
+        self.self_ns = defaultdict(int)     # (template, line) -> self time
+        self.line_hits = defaultdict(int)   # (template, line) -> times executed
+        self.calls = defaultdict(int)       # label -> calls (includes, macros, blocks, filters)
+        self.frame_self_ns = defaultdict(int)  # label -> self time, all lines of the frame together
+        self.stacks = defaultdict(int)      # collapsed stack -> time
+        self.total_ns = 0
+        self._stack = []
+        self._callables = {}                # code object -> filter/global/stage label
+        self._environments = {}             # id -> Environment seen while profiling
+        self._line_maps = {}
+        self._macros = {}
+        self._last = None
+        self._started = None
+        self._previous = None
+        for func, label in STAGES:
+            self.track(func, label)
+
+    def track(self, func, label):
+        """Show time spent in func (and what it calls) as a frame named label."""
+        self._callables[func.__code__] = label
+
+    # -- tracing -----------------------------------------------------------
+
+    def __enter__(self):
+        self._previous = sys.gettrace()
+        self._started = self._last = time.perf_counter_ns()
+        sys.settrace(self._global)
+        return self
+
+    def __exit__(self, *exc):
+        sys.settrace(self._previous)
+        self._charge(time.perf_counter_ns())
+        self.total_ns += time.perf_counter_ns() - self._started
+        self._stack.clear()
+
+    def _key(self):
+        parts = []
+        for entry in self._stack:
+            parts.append(entry.label)
+            if entry.line is not None:
+                parts.append(f"{entry.template}:{entry.line}")
+        return tuple(parts) or (OUTSIDE,)
+
+    def _charge(self, now):
+        elapsed = now - self._last
+        self._last = now
+        if elapsed <= 0:
+            return
+        self.stacks[self._key()] += elapsed
+        top = self._stack[-1] if self._stack else None
+        self.frame_self_ns[top.label if top else OUTSIDE] += elapsed
+        if top is not None and top.line is not None:
+            self.self_ns[(top.template, top.line)] += elapsed
+
+    def _learn(self, environment):
+        self._environments[id(environment)] = environment
+        for kind, mapping in (('filter', environment.filters), ('global', environment.globals)):
+            for name, func in mapping.items():
+                code = getattr(func, '__code__', None)
+                if code is not None and code not in self._callables:
+                    self._callables[code] = f"{kind} {name}"
+
+    def _template_line(self, entry, lineno):
+        line = 1
+        for template_line, code_line in reversed(entry.lines):
+            if code_line <= lineno:
+                line = template_line
+                break
+        return line
+
+    def _global(self, frame, event, arg):
+        if event != 'call':
+            return None
+        now = time.perf_counter_ns()
+        code = frame.f_code
+        f_globals = frame.f_globals
+        entry = None
+        if 'debug_info' in f_globals and 'environment' in f_globals and not code.co_name.startswith('<'):
+            environment = f_globals['environment']
+            if id(environment) not in self._environments:
+                self._learn(environment)
+            template = f_globals.get('name') or self.root_name
+            debug_info = f_globals['debug_info']
+            lines = self._line_maps.get(debug_info)
+            if lines is None:
+                lines = self._line_maps[debug_info] = _line_map(debug_info)
+            if code.co_name == 'root':
+                label = template
+            elif code.co_name.startswith('block_'):
+                label = f"block {code.co_name[6:]} ({template})"
+            else:
+                label = f"{self._macro_name(frame)} ({template})"
+            entry = _Frame(frame, label, template, lines)
+        elif code in self._callables:
+            entry = _Frame(frame, self._callables[code])
+        if entry is None:
+            return None
+        self._charge(now)
+        # a generator resuming reports 'call' too; a fresh one starts on its def line
+        fresh = not code.co_flags & inspect.CO_GENERATOR or frame.f_lineno == code.co_firstlineno
+        if fresh:
+            self.calls[entry.label] += 1
+        if entry.lines is not None:
+            entry.line = self._template_line(entry, frame.f_lineno)
+            if fresh:
+                self.line_hits[(entry.template, entry.line)] += 1
+        self._stack.append(entry)
+        self._last = time.perf_counter_ns()
+        return self._local
+
+    def _macro_name(self, frame):
+        code = frame.f_code
+        name = self._macros.get(code)
+        if name is None:
+            caller = frame.f_back
+            macro = caller.f_locals.get('self') if caller is not None and caller.f_code.co_name == '_invoke' else None
+            name = f"macro {macro.name}" if hasattr(macro, 'name') else code.co_name
+            self._macros[code] = name
+        return name
+
+    def _local(self, frame, event, arg):
+        now = time.perf_counter_ns()
+        if event == 'line':
+            top = self._stack[-1] if self._stack else None
+            if top is not None and top.frame is frame and top.lines is not None:
+                line = self._template_line(top, frame.f_lineno)
+                if line != top.line:
+                    self._charge(now)
+                    top.line = line
+                    self.line_hits[(top.template, line)] += 1
+                    self._last = time.perf_counter_ns()
+            return self._local
+        if event == 'return':
+            self._charge(now)
+            for index in range(len(self._stack) - 1, -1, -1):
+                if self._stack[index].frame is frame:
+                    del self._stack[index:]
+                    break
+            self._last = time.perf_counter_ns()
+        return self._local
+
+    # -- reports -----------------------------------------------------------
+
+    def collapsed(self):
+        """Stacks in folded format, one ``frame;frame;frame microseconds`` line each."""
+        lines = []
+        for stack, ns in sorted(self.stacks.items()):
+            micros = ns // 1000
+            if micros:
+                lines.append(f"{';'.join(part.replace(';', ',') for part in stack)} {micros}")
+        return '\n'.join(lines) + ('\n' if lines else '')
+
+    def _source_lines(self, template, sources):
+        if sources and template in sources:
+            return sources[template].splitlines()
+        for environment in self._environments.values():
+            try:
+                return environment.loader.get_source(environment, template)[0].splitlines()
+            except Exception:
+                continue
+        return []
+
+    def inclusive(self):
+        """Total time per frame label (template, include, macro, filter) including what it called."""
+        totals = defaultdict(int)
+        for stack, ns in self.stacks.items():
+            for part in set(stack):
+                totals[part] += ns
+        return totals
+
+    def table(self, top=20, sources=None):
+        """Human-readable report: the top template lines by self time, then frames by inclusive time.
+
+        Each line is quoted from ``sources`` (template name -> source text) or,
+        failing that, from the loader of the Environment that rendered it.
+        """
+        total = max(self.total_ns, 1)
+        out = [f"Render profile: {self.total_ns / 1e6:.1f} ms total",
+               "",
+               f"Top {top} template lines by self time",
+               f"{'self ms':>9} {'%':>6} {'hits':>7}  location"]
+        rows = [(ns, key) for key, ns in self.self_ns.items()]
+        for ns, (template, line) in sorted(rows, key=lambda row: -row[0])[:top]:
+            source_lines = self._source_lines(template, sources)
+            text = '  ' + source_lines[line - 1].strip()[:80] if 0 < line <= len(source_lines) else ''
+            out.append(f"{ns / 1e6:>9.2f} {100 * ns / total:>5.1f}% {self.line_hits.get((template, line), 0):>7}  "
+                       f"{template}:{line}{text}")
+        out += ["",
+                f"Top {top} templates, includes, macros and filters by total time",
+                f"{'total ms':>9} {'%':>6} {'self ms':>9} {'calls':>7}  frame"]
+        inclusive = self.inclusive()
+        for label in sorted(self.frame_self_ns, key=lambda label: -inclusive[label])[:top]:
+            out.append(f"{inclusive[label] / 1e6:>9.2f} {100 * inclusive[label] / total:>5.1f}% "
+                       f"{self.frame_self_ns[label] / 1e6:>9.2f} {self.calls.get(label, 0):>7}  {label}")
+        return '\n'.join(out) + '\n'
+
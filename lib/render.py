@@ -1,8 +1,18 @@
 """Shared rendering utilities for Jinja2 template processing."""
 import yaml
 import base64
+import functools
+import hashlib
+import hmac
+import os
 import re
-from jinja2 import Undefined
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from jinja2 import Template, Undefined, pass_context
+import jsonpath_ng
+
+from lib.cache import PasswdHashCache, cache_disabled
 
 
 # Sensible defaults for common clusterfile variables.
@@ -39,16 +49,48 @@ def _default_for(name):
     return _DEFAULTS.get(leaf, 'CHANGEME')
 
 
+# name → substituted value for the render running in the current context.
+# A ContextVar (not a class attribute) so concurrent renders in threads or
+# asyncio tasks each see only their own misses.
+_missing_vars = ContextVar('clusterfile_missing_vars', default=None)
+
+
+@contextmanager
+def collect_missing():
+    """Collect the undefined variables substituted by LoggingUndefined within the block.
+
+    Yields the dict that fills up as the template renders::
+
+        with collect_missing() as missing:
+            output = template.render(data)
+    """
+    missing = {}
+    token = _missing_vars.set(missing)
+    try:
+        yield missing
+    finally:
+        _missing_vars.reset(token)
+
+
+def record_missing(found):
+    """Add substitutions collected elsewhere (a cached fragment) to the active collect_missing() block."""
+    missing = _missing_vars.get()
+    if missing is not None:
+        for name, value in found.items():
+            missing.setdefault(name, value)
+
+
 class LoggingUndefined(Undefined):
     """Undefined that substitutes sensible defaults and logs warnings.
     Overrides _fail_with_undefined_error so no operation ever crashes.
+    Substitutions are recorded in the active collect_missing() block, if any.
     """
-    _missing = {}  # name → substituted value
 
     def _log(self, value=None):
         name = self._undefined_name
-        if name and name not in LoggingUndefined._missing:
-            LoggingUndefined._missing[name] = value if value is not None else _default_for(name)
+        missing = _missing_vars.get()
+        if name and missing is not None and name not in missing:
+            missing[name] = value if value is not None else _default_for(name)
 
     def _default(self):
         return _default_for(self._undefined_name)
@@ -94,13 +136,15 @@ class LoggingUndefined(Undefined):
         if name.startswith('_'):
             raise AttributeError(name)
         full = f"{self._undefined_name}.{name}" if self._undefined_name else name
-        LoggingUndefined._missing.setdefault(full, _default_for(full))
-        return LoggingUndefined(name=full)
+        missing = _missing_vars.get()
+        if missing is not None:
+            missing.setdefault(full, _default_for(full))
+        return type(self)(name=full)
 
     def __getitem__(self, name):
         full = f"{self._undefined_name}[{name}]" if self._undefined_name else f"[{name}]"
         self._log()
-        return LoggingUndefined(name=full)
+        return type(self)(name=full)
 
 
 class IndentDumper(yaml.SafeDumper):
@@ -109,6 +153,35 @@ class IndentDumper(yaml.SafeDumper):
         return super().increase_indent(flow, False)
 
 
+# libyaml fast path. CSafeLoader builds the same objects as SafeLoader;
+# CSafeDumper emits the same text as SafeDumper except that libyaml always
+# writes block sequences under a mapping key "indentless", which
+# dump_yaml() corrects afterwards. CLUSTERFILE_PURE_YAML=1 forces pure Python.
+try:
+    from yaml import CSafeLoader as _CSafeLoader, CSafeDumper as _CSafeDumper
+except ImportError:
+    _CSafeLoader = _CSafeDumper = None
+
+if _CSafeDumper is not None and os.environ.get('CLUSTERFILE_PURE_YAML', '') in ('', '0'):
+    FastSafeLoader = _CSafeLoader
+
+    class CIndentDumper(_CSafeDumper):
+        """IndentDumper's representers on the libyaml emitter (see dump_yaml)."""
+else:
+    FastSafeLoader = yaml.SafeLoader
+    CIndentDumper = None
+
+
+def load_yaml(stream):
+    """yaml.safe_load via libyaml when available."""
+    return yaml.load(stream, Loader=FastSafeLoader)
+
+
+def load_all_yaml(stream):
+    """yaml.safe_load_all via libyaml when available."""
+    return yaml.load_all(stream, Loader=FastSafeLoader)
+
+
 def represent_multiline_yaml_str():
     """Configure YAML to use literal block style for multiline strings."""
     yaml.SafeDumper.org_represent_str = yaml.SafeDumper.represent_str
@@ -117,9 +190,80 @@ def represent_multiline_yaml_str():
             return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='|')
         return dumper.org_represent_str(data)
     yaml.add_representer(str, repr_str, Dumper=yaml.SafeDumper)
+    if CIndentDumper is not None:
+        CIndentDumper.org_represent_str = CIndentDumper.represent_str
+        yaml.add_representer(str, repr_str, Dumper=CIndentDumper)
 
 represent_multiline_yaml_str()
 
+_UNSAFE_LINE_BREAKS = ('\r', '\x85', '\u2028', '\u2029')
+
+
+def _indent_block_sequences(text, width):
+    """Shift every block sequence nested in a mapping right by two columns.
+
+    This turns libyaml output into what IndentDumper produces. Line spans come
+    from the C parser's event marks. Returns None when the text contains
+    something the shift cannot reproduce exactly (non-\\n line breaks, complex
+    keys, scalar documents, lines close enough to ``width`` that the emitters
+    may wrap them differently), so the caller falls back to the pure-Python dumper.
+    """
+    if any(ch in text for ch in _UNSAFE_LINE_BREAKS):
+        return None
+    lines = text.split('\n')
+    delta = [0] * (len(lines) + 1)
+    stack = []  # per open collection: [is_block_mapping, expecting_key, shifted_from_line]
+    for event in yaml.parse(text, Loader=_CSafeLoader):
+        if isinstance(event, (yaml.SequenceStartEvent, yaml.MappingStartEvent)):
+            shifted = None
+            if stack and stack[-1][0]:
+                if stack[-1][1]:
+                    return None  # complex key
+                if isinstance(event, yaml.SequenceStartEvent) and not event.flow_style:
+                    shifted = event.start_mark.line
+            is_block_mapping = isinstance(event, yaml.MappingStartEvent) and not event.flow_style
+            stack.append([is_block_mapping, True, shifted])
+            continue
+        if isinstance(event, (yaml.SequenceEndEvent, yaml.MappingEndEvent)):
+            closed = stack.pop()
+            if closed[2] is not None:
+                delta[closed[2]] += 2
+                delta[event.start_mark.line] -= 2
+        elif isinstance(event, (yaml.ScalarEvent, yaml.AliasEvent)):
+            if not stack:
+                return None  # scalar document; the emitters differ on the "..." end marker
+            if stack and stack[-1][0] and stack[-1][1] and (
+                    isinstance(event, yaml.AliasEvent) or len(event.value) > 120 or '\n' in event.value):
+                return None  # emitted as an explicit "? key"
+        else:
+            continue
+        if stack:
+            stack[-1][1] = not stack[-1][1]
+    out = []
+    shift = 0
+    for i, line in enumerate(lines):
+        shift += delta[i]
+        if shift and line:
+            line = ' ' * shift + line
+        if len(line) >= width - 2:
+            return None
+        out.append(line)
+    return '\n'.join(out)
+
+
+def dump_yaml(data, all_documents=False, **kwargs):
+    """yaml.dump(_all) with IndentDumper output, via libyaml when it is available.
+
+    Output is byte-identical to the pure-Python IndentDumper; inputs the
+    libyaml path cannot reproduce exactly are dumped in pure Python.
+    """
+    dump = yaml.dump_all if all_documents else yaml.dump
+    if CIndentDumper is not None:
+        text = _indent_block_sequences(dump(data, Dumper=CIndentDumper, **kwargs), kwargs.get('width', 80))
+        if text is not None:
+            return text
+    return dump(data, Dumper=IndentDumper, **kwargs)
+
 
 def base64encode(s):
     """Encode a string or bytes to base64."""
@@ -133,23 +277,73 @@ def as_list(v):
     return [v] if isinstance(v, str) else list(v)
 
 
-def passwd_hash(password):
-    """Hash plaintext with SHA-512 crypt ($6$) for MachineConfig passwd.users.passwordHash.
-    Passes browser placeholders (<file:path>) through unchanged.
-    """
-    if not password or not isinstance(password, str):
-        return ""
-    if password.startswith("<") and password.endswith(">"):
-        return password  # browser context placeholder — pass through
+# crypt(3)'s default SHA-512 rounds; passlib and crypt both omit it from the hash.
+PASSWD_HASH_ROUNDS = 5000
+
+_CRYPT_SALT_CHARS = './0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+PASSWD_HASH_CACHE = PasswdHashCache()
+
+
+def passwd_salt(password, secret):
+    """16-character crypt salt derived from HMAC-SHA256(secret, password)."""
+    mac = hmac.new(secret.encode('utf-8'), password.encode('utf-8'), hashlib.sha256).digest()
+    return ''.join(_CRYPT_SALT_CHARS[b % 64] for b in mac[:16])
+
+
+def _sha512_crypt(password, salt=None, rounds=None):
     try:
         from passlib.hash import sha512_crypt
-        return sha512_crypt.hash(password.strip())
+        if salt is None and rounds is None:
+            return sha512_crypt.hash(password)
+        return sha512_crypt.using(salt=salt, rounds=rounds).hash(password)
     except ImportError:
         import warnings
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", DeprecationWarning)
             import crypt
-            return crypt.crypt(password.strip(), crypt.mksalt(crypt.METHOD_SHA512))
+            setting = crypt.mksalt(crypt.METHOD_SHA512, rounds=rounds) if salt is None else '$6$' + salt
+            if salt is not None and rounds not in (None, PASSWD_HASH_ROUNDS):
+                setting = f'$6$rounds={rounds}${salt}'
+            return crypt.crypt(password, setting)
+
+
+def passwd_hash(password, salt_secret=None, rounds=None):
+    """Hash plaintext with SHA-512 crypt ($6$) for MachineConfig passwd.users.passwordHash.
+    Passes browser placeholders (<file:path>) through unchanged.
+
+    With salt_secret (a cluster-specific secret such as the content of
+    cluster.corePasswordSalt) the salt is derived from it and the password,
+    so the same inputs always give the same hash, with either backend.
+    Otherwise the salt is random. Results are cached in PASSWD_HASH_CACHE
+    for the life of the process, so a batch or fleet render hashes each
+    password once and repeats the same hash in every output. Only
+    secret-salted hashes are written to the optional disk cache: their key
+    is an HMAC of the password, not a plain digest.
+    """
+    if not password or not isinstance(password, str):
+        return ""
+    if password.startswith("<") and password.endswith(">"):
+        return password  # browser context placeholder — pass through
+    password = password.strip()
+    if not isinstance(salt_secret, str) or not salt_secret or salt_secret.startswith("<"):
+        salt_secret = None
+    if salt_secret is None:
+        salt = None
+        digest = hashlib.sha256(password.encode('utf-8')).digest()
+    else:
+        salt = passwd_salt(password, salt_secret)
+        rounds = rounds or PASSWD_HASH_ROUNDS
+        digest = hmac.new(salt_secret.encode('utf-8'), password.encode('utf-8'), hashlib.sha256).digest()
+    if cache_disabled():
+        return _sha512_crypt(password, salt, rounds)
+    key = (digest, salt, rounds)
+    persist = salt is not None
+    value = PASSWD_HASH_CACHE.get(key, persist)
+    if value is None:
+        value = _sha512_crypt(password, salt, rounds)
+        PASSWD_HASH_CACHE.put(key, value, persist)
+    return value
 
 
 # --- JSONPath upsert helpers -------------------------------------------------
@@ -231,6 +425,178 @@ def set_by_path(doc, path_expr, value):
     return doc
 
 
+# Plain dotted/indexed paths, with keys jsonpath_ng reads as a single field.
+# For these a JSONPath update and set_by_path do the same thing, so they can be
+# applied together in one walk.
+_simple_path_re = re.compile(r"^\$?\.?[A-Za-z_@][\w@-]*(?:\.[A-Za-z_@][\w@-]*|\[\d+\])*$")
+_JSONPATH_RESERVED = frozenset({'where', 'wherenot'})
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_jsonpath(path_expr):
+    """jsonpath_ng.parse, cached; None when the expression does not parse."""
+    try:
+        return jsonpath_ng.parse(path_expr)
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def _simple_path_tokens(path_expr):
+    if not _simple_path_re.match(path_expr):
+        return None
+    tokens = []
+    for key, _idxgrp, idxnum in _key_index_re.findall(path_expr.lstrip('$').lstrip('.')):
+        if key in _JSONPATH_RESERVED:
+            return None
+        tokens.append(('key', key) if key else ('idx', int(idxnum)))
+    return tuple(tokens)
+
+
+def _apply_jsonpath(doc, path_expr, value):
+    """One override the way -p always worked: JSONPath update, else set_by_path."""
+    expr = compile_jsonpath(path_expr)
+    if expr is not None:
+        try:
+            matches = expr.find(doc)
+            if matches:
+                for m in matches:
+                    m.full_path.update(doc, value)
+                return
+        except Exception:
+            pass  # e.g. [*] over a scalar: fall back like an unparsable path
+    set_by_path(doc, path_expr, value)
+
+
+class _PathTrie:
+    """Simple-path overrides grouped by shared prefix, applied in one walk.
+
+    A batch only holds overrides that commute: no path is a prefix of another
+    and every node's children are all keys or all indices. add() returns False
+    for an override that would break that, so the caller flushes first.
+    """
+    _LEAF = object()
+
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def add(self, tokens, value):
+        node = self.root
+        for i, token in enumerate(tokens):
+            if not isinstance(node, dict):
+                return False  # a shorter path already assigns here
+            if node and next(iter(node))[0] != token[0]:
+                return False  # key/index container conflict
+            if i == len(tokens) - 1:
+                child = node.get(token)
+                if isinstance(child, dict):
+                    return False  # a longer path goes through here
+                node[token] = (self._LEAF, value)  # same path again: last one wins
+                self.size += 1
+                return True
+            child = node.setdefault(token, {})
+            if not isinstance(child, dict):
+                return False
+            node = child
+        return False
+
+    def apply(self, doc):
+        self._walk(doc, None, None, self.root)
+
+    def _walk(self, cur, parent, parent_key, children):
+        # Mirrors set_by_path step for step, once per shared node.
+        kind = next(iter(children))[0]
+        if kind == 'key' and not isinstance(cur, dict):
+            if parent is None:
+                raise TypeError("Root is not a dict; cannot set by key")
+            parent[parent_key] = cur = {}
+        elif kind == 'idx' and not isinstance(cur, list):
+            if parent is None:
+                raise TypeError("Root is not a list; cannot index")
+            parent[parent_key] = cur = []
+        for (ttype, tval), child in children.items():
+            if ttype == 'idx':
+                while len(cur) <= tval:
+                    cur.append({})
+            if isinstance(child, tuple):
+                cur[tval] = child[1]
+                continue
+            if ttype == 'key':
+                sub = _ensure_container(cur, tval, next(iter(child))[0] == 'idx')
+            else:
+                sub = cur[tval]
+            self._walk(sub, cur, tval, child)
+
+
+def parse_override(override):
+    """Split a 'path=value' override; the value's backslash escapes (\\n, \\t) are decoded."""
+    path_expr, val = override.split("=", 1)
+    return path_expr, val.encode("utf-8").decode("unicode_escape")
+
+
+def apply_overrides(data, params):
+    """Apply overrides in order with JSONPath update and create-if-missing fallback.
+
+    ``params`` holds 'path=value' strings (entries without '=' are skipped) or
+    (path, value) pairs. Plain dotted/indexed paths are grouped by prefix and
+    applied in one traversal per run; other JSONPath expressions are applied
+    one by one through the compiled-expression cache. The result is the same
+    as applying each override in turn.
+    """
+    trie = _PathTrie()
+    for override in params:
+        if isinstance(override, str):
+            if "=" not in override:
+                continue
+            path_expr, val = parse_override(override)
+        else:
+            path_expr, val = override
+        tokens = _simple_path_tokens(path_expr)
+        if tokens is not None and trie.add(tokens, val):
+            continue
+        if trie.size:
+            trie.apply(data)
+            trie = _PathTrie()
+        if tokens is not None:
+            trie.add(tokens, val)
+        else:
+            _apply_jsonpath(data, path_expr, val)
+    if trie.size:
+        trie.apply(data)
+    return data
+
+
+def load_params_file(path):
+    """Read overrides from a file as a list of (path, value) pairs.
+
+    ``.yaml``/``.yml``/``.json`` files hold a mapping of path to value (values
+    keep their types) or a list of 'path=value' strings. Any other file is read
+    as 'path=value' lines; blank lines and lines starting with '#' are ignored.
+    """
+    with open(path, 'r') as f:
+        text = f.read()
+    if os.path.splitext(path)[1].lower() in ('.yaml', '.yml', '.json'):
+        try:
+            parsed = load_yaml(text)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Error: Invalid params file '{path}': {e}")
+        if parsed is None:
+            return []
+        if isinstance(parsed, dict):
+            return [(str(k), v) for k, v in parsed.items()]
+        if isinstance(parsed, list) and all(isinstance(item, str) for item in parsed):
+            return [parse_override(item) for item in parsed if "=" in item]
+        raise ValueError(f"Error: Params file '{path}' must hold a mapping of path to value "
+                         f"or a list of 'path=value' strings")
+    overrides = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#') and "=" in line:
+            overrides.append(parse_override(line))
+    return overrides
+
+
 def resolve_path(data, dotted_path):
     """Check if a dotted path like 'cluster.name' exists in nested dict."""
     parts = dotted_path.split('.')
@@ -271,49 +637,224 @@ def validate_data_for_template(data, meta):
     return warnings, errors
 
 
+# Clusterfile fields that name files read by templates through load_file().
+# '*' matches every value of a mapping or item of a list.
+FILE_REFERENCE_PATHS = (
+    'account.pullSecret',
+    'cluster.sshKeys.*',
+    'cluster.corePassword',
+    'cluster.corePasswordSalt',
+    'cluster.manifests.*.file',
+    'network.trustBundle',
+    'hosts.*.bmc.password',
+    'plugins.aws.credentials',
+    'plugins.azure.credentials',
+    'plugins.gcp.credentials',
+    'plugins.ibmcloud.credentials',
+    'plugins.openstack.password',
+    'plugins.openstack.cloudsYaml',
+    'plugins.vsphere.vcenter.password',
+    'plugins.nutanix.prismCentral.password',
+)
+
+
+def file_references(data, patterns=FILE_REFERENCE_PATHS):
+    """Return the string values found at the FILE_REFERENCE_PATHS patterns in data."""
+    found = []
+    for pattern in patterns:
+        nodes = [data]
+        for part in pattern.split('.'):
+            nxt = []
+            for node in nodes:
+                if part == '*':
+                    if isinstance(node, dict):
+                        nxt.extend(node.values())
+                    elif isinstance(node, list):
+                        nxt.extend(node)
+                elif isinstance(node, dict) and part in node:
+                    nxt.append(node[part])
+            nodes = nxt
+        found.extend(n for n in nodes if isinstance(n, str) and n)
+    return found
+
+
+def _prefix_length(subnet):
+    """The prefix of a CIDR string the way ``subnet.split('/')[-1] | int(24)`` reads it."""
+    value = subnet.split('/')[-1]
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return int(float(value))
+        except ValueError:
+            return 24
+
+
+class ClusterFacts:
+    """Values derived from a clusterfile once, shared by every template rendered from it.
+
+    Templates see it as ``facts``; FactsTemplate adds it to every render
+    context, so the templates use it instead of re-scanning ``hosts`` in
+    every template and every host loop. Build it with derive_facts().
+    """
+
+    ROLES = ('control', 'master', 'worker', 'bootstrap')
+
+    def __init__(self, data):
+        hosts = data.get('hosts')
+        self.hosts = hosts if isinstance(hosts, dict) else {}
+        self.network = data.get('network')
+        self.hostsByRole = {role: [] for role in self.ROLES}
+        self._boot_nics = {}
+        for host in self.hosts.values():
+            role = host.get('role') if isinstance(host, dict) else None
+            self.hostsByRole.setdefault(role, []).append(host)
+            nic = self._find_boot_nic(host)
+            if nic is not None:
+                self._boot_nics[id(host)] = nic
+        self.controlHosts = [host for host in self.hosts.values()
+                             if isinstance(host, dict) and host.get('role') in ('control', 'master')]
+        self.workerHosts = self.hostsByRole['worker']
+        self.roleCounts = {role: len(hosts) for role, hosts in self.hostsByRole.items()}
+        self.controlCount = len(self.controlHosts)
+        self.workerCount = len(self.workerHosts)
+        primary = self.network.get('primary') if isinstance(self.network, dict) else None
+        subnet = primary.get('subnet') if isinstance(primary, dict) else None
+        self.primaryPrefix = _prefix_length(subnet) if isinstance(subnet, str) else 24
+
+    @staticmethod
+    def _find_boot_nic(host):
+        network = host.get('network') if isinstance(host, dict) else None
+        if not isinstance(network, dict):
+            return None
+        primary, interfaces = network.get('primary'), network.get('interfaces')
+        ports = primary.get('ports') if isinstance(primary, dict) else None
+        if not (isinstance(ports, list) and ports and isinstance(interfaces, list)):
+            return None
+        return next((nic for nic in interfaces if isinstance(nic, dict) and nic.get('name') == ports[0]), None)
+
+    @pass_context
+    def bootNic(self, context, host):
+        """host's interface named by network.primary.ports[0].
+
+        A host that names no such interface gets the template expression's own
+        result, so its missing keys are reported as the template would.
+        """
+        nic = self._boot_nics.get(id(host))
+        if nic is None:
+            nic = self._find_boot_nic(host)
+        return nic if nic is not None else _boot_nic_expression(context.environment)(host=host)
+
+
+_BOOT_NIC = "host.network.interfaces | selectattr('name', 'equalto', host.network.primary.ports[0]) | first"
+_BOOT_NIC_EXPRESSIONS = weakref.WeakKeyDictionary()
+
+
+def _boot_nic_expression(env):
+    expression = _BOOT_NIC_EXPRESSIONS.get(env)
+    if expression is None:
+        expression = _BOOT_NIC_EXPRESSIONS[env] = env.compile_expression(_BOOT_NIC, undefined_to_none=False)
+    return expression
+
+
+def derive_facts(data):
+    """ClusterFacts for data, or None when data is not a mapping."""
+    if not isinstance(data, dict):
+        return None
+    return ClusterFacts(data)
+
+
+def with_facts(data, facts=None):
+    """The render context for data: a shallow copy with ``facts`` set (derived unless given).
+
+    data itself is returned when it already carries ClusterFacts. ``facts``
+    is not a clusterfile key, so a top-level ``facts`` in data is replaced.
+    """
+    if not isinstance(data, dict) or isinstance(data.get('facts'), ClusterFacts):
+        return data
+    facts = derive_facts(data) if facts is None else facts
+    return dict(data, facts=facts)
+
+
+class FactsTemplate(Template):
+    """Template that renders with the ClusterFacts of its data in the context.
+
+    Set as an Environment's ``template_class``; every render path (render,
+    generate, streaming, traced overlays) goes through new_context. Includes
+    rendered with context inherit the facts already there.
+    """
+
+    def new_context(self, vars=None, shared=False, locals=None):
+        if vars is not None:
+            vars = with_facts(vars)
+        return super().new_context(vars, shared, locals)
+
+
 YAMLLINT_CONFIG = 'extends: default\nrules:\n  line-length: disable'
 
 
+class _ChunkReader:
+    """File-like view of an iterator of text chunks (e.g. Template.generate()).
+
+    Lets the YAML parser consume a template while it renders, so the full
+    rendered text never exists as one string.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = []
+        self._pending_len = 0
+
+    def read(self, size=-1):
+        while size < 0 or self._pending_len < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._pending.append(chunk)
+            self._pending_len += len(chunk)
+        text = ''.join(self._pending)
+        if 0 <= size < len(text):
+            text, rest = text[:size], text[size:]
+            self._pending, self._pending_len = [rest], len(rest)
+        else:
+            self._pending, self._pending_len = [], 0
+        return text
+
+
 def format_yaml_output(processed_template, meta=None):
     """Parse rendered YAML and serialize it according to template metadata."""
-    docs = [d for d in yaml.safe_load_all(processed_template) if d is not None]
+    try:
+        return dump_documents(load_all_yaml(processed_template), meta)
+    except yaml.YAMLError:
+        if FastSafeLoader is yaml.SafeLoader:
+            raise
+        # libyaml words its errors differently: report them as PyYAML always has.
+        return dump_documents(yaml.load_all(processed_template, Loader=yaml.SafeLoader), meta)
+
+
+def format_yaml_stream(chunks, meta=None):
+    """format_yaml_output for a render still in progress.
+
+    ``chunks`` is an iterator of text such as ``Template.generate()``; it is
+    parsed as it is produced, so documents are built once and dumped once.
+    """
+    return dump_documents(load_all_yaml(_ChunkReader(chunks)), meta)
+
+
+def dump_documents(documents, meta=None):
+    """Serialize parsed YAML documents the way format_yaml_output does.
+
+    Empty documents are dropped; several documents are wrapped in a v1 List,
+    or written as a multi-document stream when ``yamlWrapper`` is ``raw``.
+    """
+    docs = [d for d in documents if d is not None]
     yaml_wrapper = (meta or {}).get('yamlWrapper', 'list')
 
     if not docs:
         return ""
 
-    if len(docs) == 1:
-        output_obj = docs[0]
-        return yaml.dump(
-            output_obj,
-            width=4096,
-            Dumper=IndentDumper,
-            explicit_start=True,
-            indent=2,
-            sort_keys=False,
-            default_style=None,
-            default_flow_style=None,
-            allow_unicode=True
-        )
-
-    if yaml_wrapper == 'raw':
-        return yaml.dump_all(
-            docs,
-            width=4096,
-            Dumper=IndentDumper,
-            explicit_start=True,
-            indent=2,
-            sort_keys=False,
-            default_style=None,
-            default_flow_style=None,
-            allow_unicode=True
-        )
-
-    output_obj = {"apiVersion": "v1", "kind": "List", "items": docs}
-    return yaml.dump(
-        output_obj,
+    dump_args = dict(
         width=4096,
-        Dumper=IndentDumper,
         explicit_start=True,
         indent=2,
         sort_keys=False,
@@ -321,3 +862,12 @@ def format_yaml_output(processed_template, meta=None):
         default_flow_style=None,
         allow_unicode=True
     )
+
+    if len(docs) == 1:
+        return dump_yaml(docs[0], **dump_args)
+
+    if yaml_wrapper == 'raw':
+        return dump_yaml(docs, all_documents=True, **dump_args)
+
+    output_obj = {"apiVersion": "v1", "kind": "List", "items": docs}
+    return dump_yaml(output_obj, **dump_args)
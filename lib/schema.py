@@ -0,0 +1,317 @@
+"""Merged clusterfile schema and compiled validators, shared by process.py and the editor.
+
+The schema served and validated against is clusterfile.schema.json with every
+plugins/<group>/<name>/schema.json merged in. Both the merged schema and the
+validator compiled from it are cached on disk, keyed by a hash of all those
+inputs, and in memory keyed by their (mtime, size).
+
+When fastjsonschema is installed the validator is generated Python code,
+stored as marshalled bytecode, which answers "is this valid?" an order of
+magnitude faster than jsonschema. jsonschema still produces the error list
+for invalid data, so reported errors are the same either way.
+"""
+import glob
+import hashlib
+import importlib.util
+import json
+import marshal
+import os
+import threading
+
+from lib.cache import atomic_write, cache_disabled, default_cache_dir, default_cache_max_bytes, evict_lru
+from lib.render import load_yaml
+
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
+# Bumped when the layout of cached entries changes.
+_CACHE_VERSION = b'1'
+
+# fastjsonschema implements draft-07. Schemas using keywords whose 2020-12
+# meaning differs (or that draft-07 lacks) are validated by jsonschema alone.
+_DRAFT2020_KEYWORDS = frozenset({
+    'prefixItems', 'unevaluatedProperties', 'unevaluatedItems', 'dependentSchemas',
+    'dependentRequired', 'minContains', 'maxContains', '$dynamicRef', '$dynamicAnchor',
+    '$recursiveRef', '$recursiveAnchor', '$anchor', '$id', '$vocabulary',
+})
+# Keywords allowed next to $ref: draft-07 ignores $ref siblings, 2020-12 applies them.
+_REF_SIBLINGS = frozenset({'$ref', '$comment', 'title', 'description', 'default', 'examples', 'deprecated'})
+# Formats fastjsonschema checks at least as strictly as jsonschema's FormatChecker.
+_STRICT_FORMATS = frozenset({'email', 'ipv4'})
+
+
+def plugins_root_for(schema_path):
+    """The plugins/ directory next to the schema's directory."""
+    return os.path.join(os.path.dirname(os.path.abspath(schema_path)), '..', 'plugins')
+
+
+def schema_inputs(schema_path, plugins_root=None):
+    """The schema file plus every plugin schema.json merged into it."""
+    plugins_root = plugins_root or plugins_root_for(schema_path)
+    return [schema_path] + sorted(glob.glob(os.path.join(plugins_root, '*', '*', 'schema.json')))
+
+
+def merge_plugin_schemas(schema, schema_path, plugins_root=None):
+    plugins_root = plugins_root or plugins_root_for(schema_path)
+    schema.setdefault('$defs', {})
+    plugins = schema.setdefault('properties', {}).setdefault('plugins', {}).setdefault('properties', {})
+    for group in sorted(os.listdir(plugins_root)):
+        group_dir = os.path.join(plugins_root, group)
+        if not os.path.isdir(group_dir):
+            continue
+        props = plugins.setdefault(group, {}).setdefault('properties', {})
+        prefix = group[:-1] if group.endswith('s') else group
+        for name in sorted(os.listdir(group_dir)):
+            schema_file = os.path.join(group_dir, name, 'schema.json')
+            if os.path.isfile(schema_file):
+                def_key = prefix + ''.join(part.capitalize() for part in name.split('-'))
+                with open(schema_file) as fh:
+                    schema['$defs'][def_key] = json.load(fh)
+                props[name] = {"$ref": f"#/$defs/{def_key}"}
+    return schema
+
+
+def parse_schema(path):
+    """Load a JSON or YAML schema file without merging plugins."""
+    try:
+        with open(path, 'r') as fh:
+            txt = fh.read()
+    except Exception as e:
+        raise FileNotFoundError(f"Schema file '{path}' not found: {e}")
+    try:
+        return json.loads(txt)
+    except Exception:
+        try:
+            return load_yaml(txt)
+        except Exception as e:
+            raise ValueError(f"Could not parse schema file '{path}': {e}")
+
+
+def inputs_digest(schema_path, plugins_root=None):
+    """sha256 over the names and contents of every schema input."""
+    paths = schema_inputs(schema_path, plugins_root)
+    h = hashlib.sha256(_CACHE_VERSION)
+    for i, path in enumerate(paths):
+        name = 'schema' if i == 0 else os.path.relpath(path, plugins_root or plugins_root_for(schema_path))
+        with open(path, 'rb') as fh:
+            content = fh.read()
+        h.update(f"\0{name}\0{len(content)}\0".encode('utf-8'))
+        h.update(content)
+    return h.hexdigest()
+
+
+def _stamp(schema_path, plugins_root=None):
+    try:
+        return tuple((p, st.st_mtime_ns, st.st_size)
+                     for p in schema_inputs(schema_path, plugins_root) for st in [os.stat(p)])
+    except OSError:
+        return None
+
+
+def _cache_dir():
+    return None if cache_disabled() else default_cache_dir('schema')
+
+
+def _read_cached(name):
+    directory = _cache_dir()
+    if directory is None:
+        return None
+    path = os.path.join(directory, name)
+    try:
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        os.utime(path)
+        return data
+    except OSError:
+        return None
+
+
+def _write_cached(name, data):
+    directory = _cache_dir()
+    if directory is None:
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+        atomic_write(os.path.join(directory, name), data)
+        evict_lru(directory, default_cache_max_bytes(), os.path.splitext(name)[1])
+    except OSError:
+        pass  # a read-only or full cache dir must never break validation
+
+
+def _load_merged(schema_path, plugins_root, digest):
+    cached = _read_cached(digest + '.json')
+    if cached is not None:
+        try:
+            return json.loads(cached)
+        except ValueError:
+            pass
+    schema = merge_plugin_schemas(parse_schema(schema_path), schema_path, plugins_root)
+    _write_cached(digest + '.json', json.dumps(schema).encode('utf-8'))
+    return schema
+
+
+# Merged schemas and validators kept across calls in one process, keyed by schema path.
+_SCHEMAS = {}
+_VALIDATORS = {}
+_LOCK = threading.Lock()
+
+
+def load_schema(path, plugins_root=None):
+    """Load a JSON or YAML schema file and merge in the plugin schemas.
+
+    The result is shared between callers; treat it as read-only.
+    """
+    path = os.path.abspath(path)
+    stamp = _stamp(path, plugins_root)
+    with _LOCK:
+        entry = _SCHEMAS.get((path, plugins_root))
+    if stamp and entry is not None and entry[0] == stamp:
+        return entry[1]
+    digest = inputs_digest(path, plugins_root) if stamp else None
+    if digest is None:
+        return merge_plugin_schemas(parse_schema(path), path, plugins_root)
+    schema = _load_merged(path, plugins_root, digest)
+    with _LOCK:
+        _SCHEMAS[(path, plugins_root)] = (stamp, schema, digest)
+    return schema
+
+
+def codegen_supported(schema):
+    """True when fastjsonschema's draft-07 code validates ``schema`` at least as strictly as jsonschema."""
+    from jsonschema import FormatChecker
+    checked_formats = set(FormatChecker().checkers)
+    stack = [schema]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, dict):
+            continue
+        if _DRAFT2020_KEYWORDS & node.keys():
+            return False
+        if '$ref' in node and any(k not in _REF_SIBLINGS and not k.startswith('x-') for k in node):
+            return False
+        if isinstance(node.get('items'), list):
+            return False
+        fmt = node.get('format')
+        if isinstance(fmt, str) and fmt in checked_formats and fmt not in _STRICT_FORMATS:
+            return False
+        stack.extend(node.values())
+    return True
+
+
+def _compile_check(schema, digest):
+    """Return fastjsonschema's generated validate() for schema, from the disk cache when possible."""
+    if fastjsonschema is None:
+        return None
+    name = hashlib.sha256(f"{digest}\0{fastjsonschema.VERSION}\0".encode('utf-8')
+                          + importlib.util.MAGIC_NUMBER).hexdigest() + '.validator'
+    cached = _read_cached(name)
+    code = None
+    if cached == b'':
+        return None  # schema known to be unsupported
+    if cached is not None:
+        try:
+            code = marshal.loads(cached)
+        except (EOFError, ValueError, TypeError):
+            code = None
+    if code is None:
+        if not codegen_supported(schema):
+            _write_cached(name, b'')
+            return None
+        try:
+            # use_default=False: the generated code must never fill defaults into the data
+            source = fastjsonschema.compile_to_code(schema, use_default=False)
+        except Exception:
+            return None
+        code = compile(source, f'<validator {digest[:12]}>', 'exec')
+        _write_cached(name, marshal.dumps(code))
+    namespace = {}
+    exec(code, namespace)
+    return namespace['validate']
+
+
+class SchemaValidator:
+    """iter_errors() with a compiled fast path for valid data.
+
+    ``check`` is a compiled validate(obj) that raises on invalid data, or None.
+    When it passes, no jsonschema validator is ever built; otherwise
+    jsonschema (with FormatChecker) reports the errors.
+    """
+
+    def __init__(self, schema, check=None):
+        self.schema = schema
+        self.check = check
+        self._validator = None
+
+    @property
+    def compiled(self):
+        return self.check is not None
+
+    def _jsonschema(self):
+        if self._validator is None:
+            try:
+                import jsonschema
+                from jsonschema import FormatChecker
+            except ImportError:
+                raise RuntimeError("jsonschema package is required for schema validation. "
+                                   "Install with: pip install jsonschema")
+            cls = jsonschema.validators.validator_for(self.schema)
+            self._validator = cls(self.schema, format_checker=FormatChecker())
+        return self._validator
+
+    def is_valid(self, obj):
+        if self.check is not None:
+            try:
+                self.check(obj)
+                return True
+            except Exception:
+                pass
+        return self._jsonschema().is_valid(obj)
+
+    def iter_errors(self, obj):
+        if self.check is not None:
+            try:
+                self.check(obj)
+                return iter(())
+            except Exception:
+                pass
+        return self._jsonschema().iter_errors(obj)
+
+
+def get_validator(schema_path, plugins_root=None):
+    """Return a SchemaValidator for schema_path, rebuilt only when a schema input changes."""
+    schema_path = os.path.abspath(schema_path)
+    stamp = _stamp(schema_path, plugins_root)
+    with _LOCK:
+        entry = _VALIDATORS.get((schema_path, plugins_root))
+    if stamp and entry is not None and entry[0] == stamp:
+        return entry[1]
+    schema = load_schema(schema_path, plugins_root)
+    with _LOCK:
+        cached = _SCHEMAS.get((schema_path, plugins_root))
+    check = None
+    if cached is not None and cached[0] == stamp:
+        try:
+            check = _compile_check(schema, cached[2])
+        except ImportError:
+            check = None  # no jsonschema to vet the schema with; jsonschema path will say so
+    validator = SchemaValidator(schema, check)
+    if stamp:
+        with _LOCK:
+            _VALIDATORS[(schema_path, plugins_root)] = (stamp, validator)
+    return validator
+
+
+def validate_against_schema(obj, schema_path, plugins_root=None):
+    """Validate obj against the schema at schema_path; returns a list of 'path: message' strings."""
+    validator = get_validator(schema_path, plugins_root)
+    errors = sorted(validator.iter_errors(obj), key=lambda e: list(e.path))
+    msgs = []
+    for e in errors:
+        p = ".".join([str(x) for x in e.path]) if e.path else "<root>"
+        msgs.append(f"{p}: {e.message}")
+    return msgs
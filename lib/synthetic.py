@@ -0,0 +1,278 @@
+"""Synthetic clusterfiles for scale and load testing.
+
+generate_clusterfile() scales an example clusterfile (start-full, acm,
+plugin-*) to any number of hosts and interfaces per host. Everything outside
+``hosts`` is kept, with ``<placeholder>`` values filled in. Each generated
+host is a copy of a base host of the same role, so cloud hosts stay cloud
+hosts and baremetal hosts keep their BMC, storage hints and NICs.
+
+Addresses are assigned like generate-mac-in-range.sh: the sha256 of an
+identity (``cluster|domain|host|interface``) picks a slot in the range, and a
+taken slot moves on to the next free one. The result depends only on the
+inputs, and no two interfaces, hosts or BMCs share a MAC or IP. Subnets too
+small for the host count are widened to a supernet of the base subnet, so
+addresses stay inside network.primary.subnet.
+"""
+import copy
+import hashlib
+import ipaddress
+import math
+import re
+import uuid
+
+# Locally administered range used for generated MACs unless one is given.
+DEFAULT_MAC_RANGE = ('52:54:00:00:00:00', '52:54:FF:FF:FF:FF')
+
+# Network for BMC addresses when the base clusterfile has none to widen.
+DEFAULT_BMC_NETWORK = '172.16.0.0'
+
+# Values for the <placeholder> strings found in the example clusterfiles.
+# Network placeholders are filled from the primary subnet instead.
+PLACEHOLDERS = {
+    'cluster-name': 'scale',
+    'base-domain': 'example.com',
+    'location': 'dc1',
+    'bmc-vendor': 'dell',
+    'bmc-username': 'root',
+}
+
+_PLACEHOLDER = re.compile(r'<([a-z0-9-]+)>')
+
+
+def mac_to_int(mac):
+    return int(mac.replace(':', '').replace('-', ''), 16)
+
+
+def int_to_mac(value):
+    digits = f"{value:012x}"
+    return ':'.join(digits[i:i + 2] for i in range(0, 12, 2)).upper()
+
+
+class AddressPool:
+    """Unique integers in [start, end], chosen by hashing an identity.
+
+    The same identities assigned in the same order always get the same values.
+    Values in ``reserved`` are never handed out.
+    """
+
+    def __init__(self, start, end, reserved=()):
+        if start > end:
+            raise ValueError("address range start is greater than its end")
+        self.start = start
+        self.size = end - start + 1
+        self.taken = set(reserved)
+
+    def assign(self, identity):
+        if len(self.taken) >= self.size:
+            raise ValueError(f"address range exhausted assigning {identity}")
+        digest = hashlib.sha256(identity.encode('utf-8')).digest()
+        offset = int.from_bytes(digest, 'big') % self.size
+        value = self.start + offset
+        while value in self.taken:
+            offset = (offset + 1) % self.size
+            value = self.start + offset
+        self.taken.add(value)
+        return value
+
+
+def mac_pool(start=DEFAULT_MAC_RANGE[0], end=DEFAULT_MAC_RANGE[1]):
+    """An AddressPool over a MAC range; share one across a fleet to keep MACs unique fleet-wide."""
+    return AddressPool(mac_to_int(start), mac_to_int(end))
+
+
+def _prefix_for(count, max_prefix=24):
+    """Longest IPv4 prefix whose network keeps ``count`` addresses under half full."""
+    bits = max(math.ceil(math.log2(2 * count + 4)), 32 - max_prefix)
+    if bits > 24:
+        raise ValueError(f"{count} addresses do not fit in a /8")
+    return 32 - bits
+
+
+def _network(value, prefix):
+    """value's network (a CIDR or an address) widened to at most ``prefix``; None when value is not IPv4."""
+    try:
+        network = ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        return None
+    if network.version != 4:
+        return None
+    return network.supernet(new_prefix=prefix) if network.prefixlen > prefix else network
+
+
+def _pool(network, reserved=()):
+    reserved_ints = {int(ipaddress.ip_address(address)) for address in reserved}
+    return AddressPool(int(network.network_address) + 1, int(network.broadcast_address) - 1, reserved_ints)
+
+
+def _is_ipv4(value):
+    try:
+        return ipaddress.ip_address(value).version == 4
+    except ValueError:
+        return False
+
+
+def _fill(value, fills):
+    """Deep copy of value with <placeholder> strings replaced from fills; unknown placeholders are kept."""
+    if isinstance(value, dict):
+        return {key: _fill(item, fills) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill(item, fills) for item in value]
+    if isinstance(value, str) and '<' in value:
+        return _PLACEHOLDER.sub(lambda m: fills(m.group(1)) or m.group(0), value)
+    return value
+
+
+def _primary_network(data, hosts):
+    """Fill and size network.primary; returns (subnet, reserved addresses)."""
+    network = data.setdefault('network', {})
+    primary = network.setdefault('primary', {})
+    prefix = _prefix_for(2 * hosts + 8)
+    subnet = _network(primary.get('subnet', ''), prefix) or ipaddress.ip_network(f"10.0.0.0/{prefix}")
+    primary['subnet'] = str(subnet)
+    defaults = {'gateway': 1, 'api-vip': 2, 'apps-vip': 3, 'dns-server': 4, 'ntp-server': 4}
+
+    def fills(name):
+        if name in defaults:
+            return str(subnet.network_address + defaults[name])
+        return None
+
+    for key in ('gateway', 'vips', 'nameservers', 'ntpservers'):
+        container = primary if key in ('gateway', 'vips') else network
+        if key in container:
+            container[key] = _fill(container[key], fills)
+    reserved = [primary.get('gateway')] + list((primary.get('vips') or {}).values())
+    reserved += list(network.get('nameservers') or []) + list(network.get('ntpservers') or [])
+    return subnet, [address for address in reserved if isinstance(address, str) and _is_ipv4(address)
+                    and ipaddress.ip_address(address) in subnet]
+
+
+def _base_hosts(base):
+    """Host shapes by role: the first base host of each role, with the first host as fallback."""
+    shapes = {}
+    for host in (base.get('hosts') or {}).values():
+        if isinstance(host, dict):
+            shapes.setdefault(host.get('role', 'worker'), host)
+    if not shapes:
+        raise ValueError("base clusterfile has no hosts to scale")
+    first = next(iter(shapes.values()))
+    return {role: shapes.get(role, first) for role in ('control', 'worker')}
+
+
+def _interface_names(shape, count):
+    names = [interface.get('name') for interface in ((shape.get('network') or {}).get('interfaces') or [])
+             if isinstance(interface, dict) and interface.get('name')]
+    if count is None:
+        return names
+    names = names[:count]
+    index = 0
+    while len(names) < count:
+        if f"eth{index}" not in names:
+            names.append(f"eth{index}")
+        index += 1
+    return names
+
+
+def _uuid(name, identity):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{identity}|{name}"))
+
+
+def generate_clusterfile(base, hosts, interfaces=None, controls=None, name=None, domain=None,
+                         bond=None, vlan=None, macs=None):
+    """A clusterfile like ``base`` (parsed data) with ``hosts`` hosts.
+
+    ``interfaces`` sets the NICs per host (default: as many as the base host
+    has); ``controls`` the control-plane hosts (default 3, or 1 below 3 hosts).
+    ``name`` and ``domain`` replace the cluster name and base domain. ``bond``
+    (a bonding mode) and ``vlan`` (an ID) set network.primary.bond/vlan; a
+    bonded primary uses the first two NICs. ``macs`` is the AddressPool MACs
+    come from (default: a new pool over DEFAULT_MAC_RANGE).
+    """
+    if hosts < 1:
+        raise ValueError("hosts must be at least 1")
+    controls = (3 if hosts >= 3 else 1) if controls is None else min(controls, hosts)
+    macs = macs or mac_pool()
+    shapes = _base_hosts(base)
+    data = {key: copy.deepcopy(value) for key, value in base.items() if key != 'hosts'}
+
+    cluster = data.setdefault('cluster', {})
+    network = data.setdefault('network', {})
+    cluster_name = name or cluster.get('name', '')
+    cluster_name = cluster_name if cluster_name and '<' not in cluster_name else PLACEHOLDERS['cluster-name']
+    base_domain = domain or network.get('domain', '')
+    base_domain = base_domain if base_domain and '<' not in base_domain else PLACEHOLDERS['base-domain']
+    cluster['name'] = cluster_name
+    network['domain'] = base_domain
+    if bond is not None:
+        network.setdefault('primary', {})['bond'] = bond
+    if vlan is not None:
+        network.setdefault('primary', {})['vlan'] = vlan
+
+    subnet, reserved = _primary_network(data, hosts)
+    addresses = _pool(subnet, reserved)
+    fixed = dict(PLACEHOLDERS, **{'cluster-name': cluster_name, 'base-domain': base_domain})
+
+    def fills(key):
+        if key.endswith('uuid'):
+            return _uuid(key, f"{cluster_name}|{base_domain}")
+        return fixed.get(key)
+
+    data = _fill(data, fills)
+    bonded = bool(network.get('primary', {}).get('bond'))
+    bmc_pools = {}
+    width = max(2, len(str(hosts)))
+    counters = {'control': 0, 'worker': 0}
+    generated = data['hosts'] = {}
+
+    for index in range(hosts):
+        role = 'control' if index < controls else 'worker'
+        counters[role] += 1
+        host_name = f"{role}{counters[role]:0{width}d}.{cluster_name}.{base_domain}"
+        identity = f"{cluster_name}|{base_domain}|{host_name}"
+        host = _fill(shapes[role], fills)  # _fill copies every dict and list
+        host['role'] = role
+
+        host_network = host.get('network')
+        if isinstance(host_network, dict) and 'interfaces' in host_network:
+            names = _interface_names(shapes[role], interfaces)
+            host_network['interfaces'] = [
+                {'name': nic, 'macAddress': int_to_mac(macs.assign(f"{identity}|{nic}"))} for nic in names]
+            host_network.setdefault('primary', {})['ports'] = names[:2] if bonded and len(names) > 1 else names[:1]
+        if isinstance(host_network, dict) and isinstance(host_network.get('primary'), dict):
+            address = addresses.assign(f"{identity}|primary")
+            host_network['primary']['address'] = str(ipaddress.ip_address(address))
+
+        bmc = host.get('bmc')
+        if isinstance(bmc, dict):
+            address = shapes[role].get('bmc', {}).get('address', '')
+            if _is_ipv4(address) or _PLACEHOLDER.fullmatch(str(address)):
+                bmc_network = _network(address, subnet.prefixlen) if _is_ipv4(address) else None
+                bmc_network = bmc_network or ipaddress.ip_network(f"{DEFAULT_BMC_NETWORK}/{subnet.prefixlen}")
+                if bmc_network.overlaps(subnet):
+                    pool = addresses
+                else:
+                    pool = bmc_pools.get(bmc_network) or bmc_pools.setdefault(bmc_network, _pool(bmc_network))
+                bmc['address'] = str(ipaddress.ip_address(pool.assign(f"{identity}|bmc")))
+            if 'macAddress' in bmc:
+                bmc['macAddress'] = int_to_mac(macs.assign(f"{identity}|bmc"))
+
+        os_disk = (host.get('storage') or {}).get('os')
+        if isinstance(os_disk, dict) and 'wwn' in os_disk:
+            os_disk['wwn'] = '0x' + hashlib.sha256(f"{identity}|wwn".encode('utf-8')).hexdigest()[:16]
+        generated[host_name] = host
+    return data
+
+
+def generate_fleet(base, clusters, hosts, name=None, macs=None, **options):
+    """Yield (cluster name, clusterfile data) for ``clusters`` copies of base, each with ``hosts`` hosts.
+
+    Clusters are named ``<name>-0001``... and draw MACs from one pool, so MACs
+    are unique across the whole fleet. Other options go to generate_clusterfile.
+    """
+    macs = macs or mac_pool()
+    prefix = name or (base.get('cluster') or {}).get('name') or PLACEHOLDERS['cluster-name']
+    if '<' in prefix:
+        prefix = PLACEHOLDERS['cluster-name']
+    width = max(4, len(str(clusters)))
+    for index in range(1, clusters + 1):
+        cluster_name = f"{prefix}-{index:0{width}d}"
+        yield cluster_name, generate_clusterfile(base, hosts, name=cluster_name, macs=macs, **options)
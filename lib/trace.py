@@ -0,0 +1,221 @@
+"""Data-access tracing: which clusterfile paths a template reads, and how often.
+
+A traced render wraps the clusterfile in TracedDict/TracedList proxies and
+resolves top-level names through TracingContext, so every lookup the template
+makes (``cluster.name``, ``hosts[name].bmc``, each host yielded by
+``hosts.items()``, a ``.get('key')`` that misses...) is counted against its
+path. The proxies subclass dict and list and keep the original values, so
+filters, ``tojson`` and equality see plain data and the output is unchanged.
+
+Paths are reported twice: as concrete paths (``hosts['node1.example.com'].role``)
+and as patterns where the keys of KEYED_COLLECTIONS become ``*`` and list
+indices ``[*]`` (``hosts.*.network.interfaces[*].name``), which is what shows
+a per-host hot spot.
+"""
+import contextlib
+import contextvars
+import re
+import weakref
+from collections import Counter
+
+from jinja2.runtime import Context, missing
+
+# Mappings keyed by name whose entries share one shape; their keys collapse to '*' in patterns.
+KEYED_COLLECTIONS = frozenset({('hosts',)})
+
+# Pattern component standing for any list index.
+ANY_INDEX = '[*]'
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][\w-]*$')
+
+_ACTIVE = contextvars.ContextVar('clusterfile_data_trace', default=None)
+
+
+def format_path(path):
+    """Render a path tuple as ``a.b[0]['c.d']``."""
+    out = ''
+    for key in path:
+        if isinstance(key, int):
+            out += f'[{key}]'
+        elif key == ANY_INDEX:
+            out += key
+        elif key == '*' or _IDENTIFIER.match(key):
+            out += f'.{key}' if out else key
+        else:
+            out += f'[{key!r}]'
+    return out
+
+
+class DataTrace:
+    """Read counts for one render, by concrete path, by pattern and for misses."""
+
+    def __init__(self):
+        self.paths = Counter()
+        self.patterns = Counter()
+        self.missing = Counter()
+        self._roots = {}
+
+    def hit(self, path, pattern):
+        self.paths[path] += 1
+        self.patterns[pattern] += 1
+
+    def miss(self, path):
+        self.missing[path] += 1
+
+    def wrap(self, data):
+        """The render context for data: each top-level value wrapped in a tracing proxy."""
+        context = {key: _wrap(value, self, (key,), (key,)) for key, value in data.items()}
+        self._roots = dict(context)
+        return context
+
+    def resolved(self, key, value):
+        if key in self._roots and self._roots[key] is value:
+            self.hit((key,), (key,))
+
+    def report(self, **info):
+        """JSON-ready summary: ``info`` (template name, data file...) plus counts, most read first."""
+        def ordered(counter):
+            return {format_path(path): count
+                    for path, count in sorted(counter.items(), key=lambda kv: (-kv[1], format_path(kv[0])))}
+        return dict(info, reads=sum(self.paths.values()), distinct_paths=len(self.paths),
+                    patterns=ordered(self.patterns), paths=ordered(self.paths), missing=ordered(self.missing))
+
+
+def _wrap(value, trace, path, pattern):
+    if isinstance(value, dict) and not isinstance(value, TracedDict):
+        return TracedDict(value, trace, path, pattern)
+    if isinstance(value, list) and not isinstance(value, TracedList):
+        return TracedList(value, trace, path, pattern)
+    return value
+
+
+class TracedDict(dict):
+    """dict proxy that records key reads. Holds the original values; wraps them on the way out."""
+
+    def __init__(self, data, trace, path, pattern):
+        super().__init__(data)
+        self.__trace = trace, path, pattern
+        self.__children = {}
+
+    def __child(self, key):
+        trace, path, pattern = self.__trace
+        child_path = path + (key,)
+        child_pattern = pattern + ('*' if path in KEYED_COLLECTIONS else key,)
+        trace.hit(child_path, child_pattern)
+        child = self.__children.get(key)
+        if child is None:
+            value = dict.__getitem__(self, key)
+            child = _wrap(value, trace, child_path, child_pattern)
+            if child is not value:
+                self.__children[key] = child
+        return child
+
+    def __getitem__(self, key):
+        if not dict.__contains__(self, key):
+            self.__trace[0].miss(self.__trace[1] + (key,))
+            raise KeyError(key)
+        return self.__child(key)
+
+    def get(self, key, default=None):
+        if not dict.__contains__(self, key):
+            self.__trace[0].miss(self.__trace[1] + (key,))
+            return default
+        return self.__child(key)
+
+    def __contains__(self, key):
+        trace, path, pattern = self.__trace
+        if dict.__contains__(self, key):
+            trace.hit(path + (key,), pattern + ('*' if path in KEYED_COLLECTIONS else key,))
+            return True
+        trace.miss(path + (key,))
+        return False
+
+    def values(self):
+        return [self.__child(key) for key in dict.keys(self)]
+
+    def items(self):
+        return [(key, self.__child(key)) for key in dict.keys(self)]
+
+    def __reduce__(self):
+        return dict, (dict(dict.items(self)),)
+
+
+class TracedList(list):
+    """list proxy that records item reads by index and iteration."""
+
+    def __init__(self, data, trace, path, pattern):
+        super().__init__(data)
+        self.__trace = trace, path, pattern
+        self.__children = {}
+
+    def __child(self, index):
+        trace, path, pattern = self.__trace
+        trace.hit(path + (index,), pattern + (ANY_INDEX,))
+        child = self.__children.get(index)
+        if child is None:
+            value = list.__getitem__(self, index)
+            child = _wrap(value, trace, path + (index,), pattern + (ANY_INDEX,))
+            if child is not value:
+                self.__children[index] = child
+        return child
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.__child(i) for i in range(len(self))[index]]
+        if not -len(self) <= index < len(self):
+            self.__trace[0].miss(self.__trace[1] + (index,))
+            raise IndexError(index)
+        return self.__child(index % len(self))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.__child(index)
+
+    def __reduce__(self):
+        return list, (list(list.__iter__(self)),)
+
+
+class TracingContext(Context):
+    """Jinja2 context that reports top-level clusterfile names to the active DataTrace."""
+
+    def resolve_or_missing(self, key):
+        value = super().resolve_or_missing(key)
+        trace = _ACTIVE.get()
+        if trace is not None and value is not missing:
+            trace.resolved(key, value)
+        return value
+
+
+_TRACING_ENVIRONMENTS = weakref.WeakKeyDictionary()
+
+
+def tracing_environment(env):
+    """An overlay of env whose templates render with TracingContext.
+
+    The overlay has its own template cache, so templates compiled for it never
+    leak into untraced renders.
+    """
+    overlay = _TRACING_ENVIRONMENTS.get(env)
+    if overlay is None:
+        overlay = env.overlay(cache_size=400)
+        overlay.context_class = TracingContext
+        _TRACING_ENVIRONMENTS[env] = overlay
+    return overlay
+
+
+@contextlib.contextmanager
+def tracing(trace):
+    """Report top-level name lookups to trace (a DataTrace, or None for no tracing) inside the block."""
+    if trace is None:
+        yield
+        return
+    token = _ACTIVE.set(trace)
+    try:
+        yield
+    finally:
+        _ACTIVE.reset(token)
+
+
+def active_trace():
+    """The DataTrace recording the render in progress, or None."""
+    return _ACTIVE.get()
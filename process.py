@@ -1,35 +1,60 @@
 #!/usr/bin/env python3
+import os
+import sys
+
+if __name__ == "__main__" and "--daemon" not in sys.argv:
+    # Hand the call to a warm render daemon if one is listening. This runs
+    # before the heavy imports below, so a served call never pays for them.
+    from lib.daemon import forward
+    forward(sys.argv[1:])
+
 import yaml
 from jinja2 import Environment, FileSystemLoader, TemplateNotFound, UndefinedError
 import argparse
-import os
-import sys
-import yamllint.config
-import yamllint.linter
-import jsonpath_ng
+import io
+from collections import OrderedDict, namedtuple
+from contextlib import nullcontext, redirect_stdout, redirect_stderr
 import json
 import re
-try:
-    import jsonschema
-    from jsonschema import FormatChecker
-except Exception:
-    jsonschema = None
-
+import gc
+import glob
+import multiprocessing
+import queue
+from jinja2 import meta as jinja2_meta
 from lib.render import (
-    IndentDumper, LoggingUndefined, base64encode, as_list, passwd_hash, set_by_path,
-    resolve_path, validate_data_for_template, YAMLLINT_CONFIG, format_yaml_output,
+    IndentDumper, LoggingUndefined, PASSWD_HASH_CACHE, base64encode, as_list, passwd_hash, set_by_path,
+    resolve_path, validate_data_for_template, format_yaml_output,
+    collect_missing, file_references, load_yaml, format_yaml_stream, apply_overrides, load_params_file,
+    derive_facts, with_facts, FactsTemplate,
+)
+from lib.cache import open_bytecode_cache, FileCache
+from lib.schema import (
+    merge_plugin_schemas, load_schema, schema_inputs, get_validator, validate_against_schema,
 )
+from lib.lint import LINT_LEVELS, LINT_CACHE, default_lint_level, lint_yaml
+from lib.incremental import DataDigest, note_file_read, open_output_cache, record_file_reads
+from lib.trace import DataTrace, tracing, tracing_environment
+from lib.fragments import FRAGMENT_CACHE, FragmentCacheExtension
+from lib.parallel import ParallelLoopExtension, default_render_jobs, set_render_jobs
+from lib.profiler import TemplateProfiler
+from lib import daemon
+
+# Contents of files read by templates, shared by every render in this process.
+FILE_CACHE = FileCache()
 
 def load_file(path):
     if not path or not isinstance(path, str):
         return ""
-    try:
-        with open(path, 'r') as f:
-            content = f.read()
-        return content.rstrip()
-    except (FileNotFoundError, IOError):
+    content = FILE_CACHE.read(path)
+    note_file_read(path, content)
+    if content is None:
         print(f"WARNING: load_file('{path}'): file not found or unreadable", file=sys.stderr)
         return ""
+    return content.rstrip()
+
+def prefetch_files(data):
+    """Read the files the clusterfile points at (pull secret, SSH keys, BMC passwords...) concurrently."""
+    FILE_CACHE.prefetch(file_references(data))
 
 def parse_template_meta(template_file):
     """Parse @meta block from a template file."""
@@ -39,212 +64,728 @@ def parse_template_meta(template_file):
             content = f.read()
         match = re.search(r'\{#-?\s*@meta\s*\n(.*?)\n\s*-?#\}', content, re.DOTALL)
         if match:
-            parsed = yaml.safe_load(match.group(1))
+            parsed = load_yaml(match.group(1))
             if isinstance(parsed, dict):
                 meta.update(parsed)
     except Exception:
         pass
     return meta
 
-def process_template(config_data, template_file, data_file):
-    """
-    Processes a Jinja2 template with data loaded from a YAML file.
-
-    Args:
-        config_data: yaml object
-        template_file (str): Path to the main Jinja2 template file.
-    """
-    template_dir = os.path.dirname(os.path.abspath(template_file))
-    config_dir   = os.path.dirname(os.path.abspath(data_file))
+def build_environment(template_dir, config_dir, bytecode_cache=None):
+    """Build the Jinja2 Environment used to render templates from template_dir."""
     includes_dir = os.path.join(template_dir, 'includes')
     plugins_tpl  = os.path.join(template_dir, 'plugins')
     repo_root    = os.path.dirname(template_dir)
     plugins_root = os.path.join(repo_root, 'plugins')
     env = Environment(loader=FileSystemLoader([template_dir, includes_dir, plugins_tpl, plugins_root, config_dir]),
-                      undefined=LoggingUndefined)
+                      undefined=LoggingUndefined, bytecode_cache=bytecode_cache,
+                      extensions=[FragmentCacheExtension, ParallelLoopExtension])
+    env.template_class = FactsTemplate
     env.globals["load_file"] = load_file
     env.filters["base64encode"] = base64encode
     env.filters["as_list"] = as_list
     env.filters["passwd_hash"] = passwd_hash
     env.filters["merge"] = lambda a, b: {**a, **b}
+    return env
+
+# Environments reused across renders in one process (batch, daemon). Jinja2's
+# auto_reload re-checks template mtimes, so edits are still picked up.
+_ENVIRONMENTS = OrderedDict()
+_ENVIRONMENTS_MAX = 32
+
+def get_environment(template_dir, config_dir, bytecode_cache=None):
+    """Return a cached Environment for (template_dir, config_dir), building it on first use."""
+    key = (template_dir, config_dir, id(bytecode_cache))
+    env = _ENVIRONMENTS.get(key)
+    if env is None:
+        env = _ENVIRONMENTS[key] = build_environment(template_dir, config_dir, bytecode_cache)
+        while len(_ENVIRONMENTS) > _ENVIRONMENTS_MAX:
+            _ENVIRONMENTS.popitem(last=False)
+    else:
+        _ENVIRONMENTS.move_to_end(key)
+    return env
+
+def process_template(config_data, template_file, data_file, bytecode_cache=None, env=None, trace=None, facts=None):
+    """
+    Processes a Jinja2 template with data loaded from a YAML file.
+
+    Args:
+        config_data: yaml object
+        template_file (str): Path to the main Jinja2 template file.
+        data_file (str): Path to the data file; its directory is searched for templates too.
+        bytecode_cache: optional jinja2 BytecodeCache for compiled templates.
+        env: optional prebuilt Environment (batch mode shares one across templates).
+        trace: optional DataTrace that records every data path the render reads.
+        facts: ClusterFacts derived from config_data (batch mode derives them once per clusterfile).
+    """
+    template = load_template(template_file, data_file, bytecode_cache, env)
+    template, config_data = _context(template, config_data, trace, facts)
+    with collect_missing() as missing, tracing(trace):
+        output = template.render(config_data)
+    return output, missing
+
+def process_template_structured(config_data, template_file, data_file, meta=None, bytecode_cache=None, env=None,
+                                trace=None, facts=None):
+    """Render a YAML template straight into formatted output.
+
+    The render is streamed into the YAML parser, so the rendered text is never
+    held as a whole and is not parsed a second time. Same result as
+    process_template followed by format_yaml_output.
+    """
+    template = load_template(template_file, data_file, bytecode_cache, env)
+    template, config_data = _context(template, config_data, trace, facts)
+    with collect_missing() as missing, tracing(trace):
+        output = format_yaml_stream(template.generate(config_data), meta)
+    return output, missing
+
+def _context(template, config_data, trace, facts):
+    """The template and context to render.
+
+    With a trace, the tracing overlay and the wrapped data; the facts are then
+    derived from the wrapped data, so the trace records the reads behind them.
+    Otherwise the data with its ClusterFacts added.
+    """
+    if trace is None:
+        return template, with_facts(config_data, facts)
+    return tracing_environment(template.environment).get_template(template.name), trace.wrap(config_data)
+
+def load_template(template_file, data_file, bytecode_cache=None, env=None):
+    """Look template_file up in env, or in the shared Environment for its directory and data_file's."""
+    if env is None:
+        template_dir = os.path.dirname(os.path.abspath(template_file))
+        config_dir   = os.path.dirname(os.path.abspath(data_file)) if data_file else os.getcwd()
+        env = get_environment(template_dir, config_dir, bytecode_cache)
     try:
-        template = env.get_template(os.path.basename(template_file))
+        return env.get_template(os.path.basename(template_file))
     except TemplateNotFound:
         raise FileNotFoundError(f"Error: Template file '{template_file}' not found.")
-    LoggingUndefined._missing = {}
-    output = template.render(config_data)
-    return output, dict(LoggingUndefined._missing)
-
-def merge_plugin_schemas(schema, schema_path):
-    plugins_root = os.path.join(os.path.dirname(os.path.abspath(schema_path)), '..', 'plugins')
-    schema.setdefault('$defs', {})
-    plugins = schema.setdefault('properties', {}).setdefault('plugins', {}).setdefault('properties', {})
-    for group in sorted(os.listdir(plugins_root)):
-        group_dir = os.path.join(plugins_root, group)
-        if not os.path.isdir(group_dir):
+
+def load_data(source):
+    """Load the data source: inline JSON string, YAML/JSON file path, or None for {}."""
+    if not source:
+        return {}
+    # Try parsing as JSON string first
+    try:
+        return json.loads(source)
+    except Exception:
+        pass
+    # Fallback to file path (YAML/JSON)
+    try:
+        with open(source, 'r') as f:
+            return load_yaml(f) or {}
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Error: Data file '{source}' not found.")
+    except yaml.YAMLError as e:
+        raise ValueError(f"Error: Invalid YAML format in '{source}': {e}")
+
+def is_yaml_template(template_file):
+    return template_file.endswith('yaml.tpl') or template_file.endswith('yaml.tmpl')
+
+class FormatError(Exception):
+    """Rendered YAML that could not be parsed or formatted; its message is the underlying error's."""
+
+class _StderrMessages(list):
+    """A render_file() messages list that also prints each message to stderr as it is added.
+
+    The single-template CLI uses it so warnings appear as they arise, in order
+    with the load_file() warnings printed during the render.
+    """
+
+    def append(self, message):
+        super().append(message)
+        print(message, file=sys.stderr)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+def render_file(data, template_file, data_file, messages, env=None, bytecode_cache=None, lint_level=None,
+                structured=False, trace=None, facts=None):
+    """Run the full pipeline for one template: pre-render checks, render, YAML format and lint.
+
+    Warnings and lint problems are appended to ``messages`` as they are produced,
+    so the caller still has them when a later stage raises. ``lint_level`` is
+    one of LINT_LEVELS (default: default_lint_level()). With ``structured``,
+    YAML templates are rendered through process_template_structured. ``trace``
+    (a DataTrace) records the data paths the render reads; ``facts`` are the
+    ClusterFacts derived from data, when the caller has them already. Output
+    that is not valid YAML raises FormatError.
+    """
+    # Pre-render validation (warnings only, never blocks rendering)
+    meta = parse_template_meta(template_file)
+    val_warnings, val_errors = validate_data_for_template(data, meta)
+    messages.extend(f"WARNING: {w}" for w in val_warnings + val_errors)
+
+    yaml_template = is_yaml_template(template_file)
+    if structured and yaml_template:
+        try:
+            output, missing_vars = process_template_structured(data, template_file, data_file, meta, bytecode_cache,
+                                                               env, trace, facts)
+        except yaml.YAMLError as e:
+            raise FormatError(e) from e
+    else:
+        output, missing_vars = process_template(data, template_file, data_file, bytecode_cache, env, trace, facts)
+    for var, default in sorted(missing_vars.items()):
+        messages.append(f"WARNING: {var} undefined, substituted {default!r}")
+
+    if not yaml_template:
+        return output
+    if not structured:
+        try:
+            output = format_yaml_output(output, meta)
+        except Exception as e:
+            raise FormatError(e) from e
+    messages.extend(lint_yaml(output, lint_level or default_lint_level()))
+    return output
+
+def expand_related_templates(template_files):
+    """Return template_files plus the transitive closure of their @meta relatedTemplates.
+
+    Related names resolve relative to the directory of the template that lists
+    them; names that do not exist are skipped with a warning.
+    """
+    ordered, seen = [], set()
+    queue = list(template_files)
+    while queue:
+        path = queue.pop(0)
+        key = os.path.abspath(path)
+        if key in seen:
             continue
-        props = plugins.setdefault(group, {}).setdefault('properties', {})
-        prefix = group[:-1] if group.endswith('s') else group
-        for name in sorted(os.listdir(group_dir)):
-            schema_file = os.path.join(group_dir, name, 'schema.json')
-            if os.path.isfile(schema_file):
-                def_key = prefix + ''.join(part.capitalize() for part in name.split('-'))
-                with open(schema_file) as fh:
-                    schema['$defs'][def_key] = json.load(fh)
-                props[name] = {"$ref": f"#/$defs/{def_key}"}
-    return schema
+        seen.add(key)
+        ordered.append(path)
+        base = os.path.dirname(path)
+        for related in parse_template_meta(path).get('relatedTemplates') or []:
+            related_path = os.path.join(base, related)
+            if os.path.isfile(related_path):
+                queue.append(related_path)
+            else:
+                print(f"WARNING: {path}: related template '{related}' not found", file=sys.stderr)
+    return ordered
 
-if __name__ == "__main__":
+def output_name(template_file, taken):
+    """Output filename for a template: its basename without .tpl/.tmpl, prefixed with
+    the parent directory name when another template already claimed it."""
+    name = os.path.basename(template_file)
+    for suffix in ('.tpl', '.tmpl'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    if name in taken:
+        name = f"{os.path.basename(os.path.dirname(os.path.abspath(template_file)))}-{name}"
+    taken.add(name)
+    return name
+
+class RenderResult(namedtuple('RenderResult', 'template_file output_path messages error')):
+    """One template's outcome in a batch. ``skipped`` is True when an --incremental
+    run reused the cached output instead of rendering."""
+    skipped = False
+
+def _write_output(out_path, output, only_if_changed=False):
+    content = output + '\n'
+    if only_if_changed:
+        try:
+            with open(out_path, 'r') as f:
+                if f.read() == content:
+                    return  # leave the mtime alone, as make would
+        except OSError:
+            pass
+    with open(out_path, 'w') as f:
+        f.write(content)
+
+def write_trace_report(trace_dir, name, trace, template_file, data_file):
+    """Write trace's report to <trace_dir>/<name>.trace.json and return the path."""
+    os.makedirs(trace_dir, exist_ok=True)
+    path = os.path.join(trace_dir, name + '.trace.json')
+    with open(path, 'w') as f:
+        json.dump(trace.report(template=template_file, data=data_file), f, indent=2)
+        f.write('\n')
+    return path
+
+def render_batch(data, template_files, data_file, output_dir, bytecode_cache=None, envs=None, lint_level=None,
+                 structured=False, outputs=None, trace_dir=None):
+    """Render many templates against one already-loaded data object.
+
+    Environments are shared per (template dir, data dir) through ``envs``, so
+    includes compile once for the whole batch, and the ClusterFacts are derived
+    once for all templates. A failing template is reported and skipped;
+    returns a list of RenderResult(template_file, output_path or None, messages, error or None).
+
+    With ``outputs`` (an OutputCache) a template whose closure, relevant data
+    and load_file() reads are unchanged since a previous run is not rendered:
+    its cached output and messages are reused and the result is marked skipped.
+    With ``trace_dir`` every template is rendered with a DataTrace and its
+    report written there as <output name>.trace.json.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    config_dir = os.path.dirname(os.path.abspath(data_file)) if data_file else os.getcwd()
+    envs = {} if envs is None else envs
+    lint_level = lint_level or default_lint_level()
+    digest = DataDigest(data) if outputs is not None else None
+    facts = derive_facts(data)
+    taken, results = set(), []
+    for template_file in template_files:
+        key = (os.path.dirname(os.path.abspath(template_file)), config_dir)
+        if key not in envs:
+            envs[key] = get_environment(key[0], config_dir, bytecode_cache)
+        messages = []
+        name = output_name(template_file, taken)
+        out_path = os.path.join(output_dir, name)
+        cache_key = None
+        trace = DataTrace() if trace_dir else None
+        try:
+            if outputs is not None:
+                cache_key = outputs.key(envs[key], os.path.basename(template_file), digest,
+                                        parse_template_meta(template_file), lint=lint_level)
+                cached = None if trace is not None else outputs.get(cache_key)
+                if cached is not None:
+                    output, messages = cached
+                    _write_output(out_path, output, only_if_changed=True)
+                    result = RenderResult(template_file, out_path, messages, None)
+                    result.skipped = True
+                    results.append(result)
+                    continue
+            with record_file_reads() as reads:
+                output = render_file(data, template_file, data_file, messages, envs[key],
+                                     lint_level=lint_level, structured=structured, trace=trace,
+                                     facts=facts)
+            if trace is not None:
+                write_trace_report(trace_dir, name, trace, template_file, data_file)
+            _write_output(out_path, output, only_if_changed=outputs is not None)
+            if cache_key is not None:
+                outputs.put(cache_key, output, messages, reads)
+            results.append(RenderResult(template_file, out_path, messages, None))
+        except Exception as e:
+            results.append(RenderResult(template_file, None, messages, e))
+    return results
+
+def preload_templates(env, names):
+    """Compile names and every template they statically include/import into env's cache.
+
+    Dynamic includes (e.g. 'platforms/' ~ platform ~ '/...') cannot be resolved
+    here and still compile on first use.
+    """
+    queue, seen = list(names), set()
+    while queue:
+        name = queue.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        try:
+            source = env.loader.get_source(env, name)[0]
+            env.get_template(name)
+        except TemplateNotFound:
+            continue
+        for ref in jinja2_meta.find_referenced_templates(env.parse(source)):
+            if ref:
+                queue.append(ref)
+    return seen
+
+def iter_clusterfiles(pattern):
+    """Yield clusterfile paths from a directory (*.clusterfile, *.yaml, *.yml) or a glob, lazily."""
+    if os.path.isdir(pattern):
+        with os.scandir(pattern) as it:
+            for entry in sorted(it, key=lambda e: e.name):
+                if entry.is_file() and entry.name.endswith(('.clusterfile', '.yaml', '.yml')):
+                    yield entry.path
+        return
+    yield from glob.iglob(pattern, recursive=True)
+
+def clusterfile_stem(clusterfile):
+    """Fleet output subdirectory name for a clusterfile: its basename without the extension."""
+    return os.path.splitext(os.path.basename(clusterfile))[0]
+
+def default_jobs():
+    """Number of CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+# Fleet worker state. Populated in the parent before the pool forks so that
+# Environments and compiled templates are shared copy-on-write.
+_FLEET = {}
+
+# Clusterfiles handed to the pool per worker ahead of the finished results.
+FLEET_WINDOW_PER_JOB = 4
+
+def _fleet_init(template_files, params, schema, output_dir, config_dirs, bytecode_cache=None, structured=False,
+                lint_level=None, outputs=None, trace_dir=None, validate_scope="data"):
+    envs = {}
+    for config_dir in config_dirs:
+        for template_file in template_files:
+            key = (os.path.dirname(os.path.abspath(template_file)), config_dir)
+            if key not in envs:
+                envs[key] = build_environment(key[0], config_dir, bytecode_cache)
+            preload_templates(envs[key], [os.path.basename(template_file)])
+    _FLEET.update(templates=template_files, params=params, schema=schema, output_dir=output_dir,
+                  envs=envs, structured=structured, lint_level=lint_level or default_lint_level(), outputs=outputs,
+                  trace_dir=trace_dir, validate_scope=validate_scope)
+
+def _fleet_render(clusterfile):
+    """Worker: load, validate, override and render one clusterfile.
+
+    Validation follows --validate-scope as in single mode: the data file
+    before overrides, and with 'data+params' the result again after them.
+    Outputs are written straight to disk; only a small picklable summary comes back.
+    """
+    stem = clusterfile_stem(clusterfile)
+    schema = _FLEET['schema']
+    try:
+        data = load_data(clusterfile)
+        if schema:
+            errs = validate_against_schema(data, schema)
+            if errs:
+                return clusterfile, [], "schema validation failed (data file): " + "; ".join(errs)
+        apply_overrides(data, _FLEET['params'])
+        if schema and _FLEET['validate_scope'] == "data+params":
+            errs = validate_against_schema(data, schema)
+            if errs:
+                return clusterfile, [], "schema validation failed (after applying overrides): " + "; ".join(errs)
+        prefetch_files(data)
+        results = render_batch(data, _FLEET['templates'], clusterfile,
+                               os.path.join(_FLEET['output_dir'], stem),
+                               envs=_FLEET['envs'], lint_level=_FLEET['lint_level'],
+                               structured=_FLEET['structured'], outputs=_FLEET['outputs'],
+                               trace_dir=_FLEET['trace_dir'] and os.path.join(_FLEET['trace_dir'], stem))
+    except Exception as e:
+        return clusterfile, [], str(e)
+    summary = []
+    for result in results:
+        error = result.error
+        summary.append(result._replace(error=None if error is None else str(error)))
+        summary[-1].skipped = result.skipped
+    return clusterfile, summary, None
+
+def render_fleet(pattern, template_files, output_dir, params=(), schema=None, jobs=None, bytecode_cache=None,
+                 structured=False, lint_level=None, outputs=None, trace_dir=None, validate_scope="data"):
+    """Render template_files for every clusterfile matched by pattern on a process pool.
+
+    Yields (clusterfile, results, error) as each cluster finishes, results being
+    render_batch's RenderResults. The directory or glob is listed once; paths
+    go to the workers a few at a time and outputs are written by the workers,
+    so rendered data never piles up in the parent.
+    ``validate_scope`` is --validate-scope ('data' or 'data+params') for ``schema``.
+    ``outputs`` is an OutputCache shared by the workers for --incremental runs;
+    with ``trace_dir`` each cluster's data-trace reports go to <trace_dir>/<clusterfile name>/.
+    Raises ValueError before rendering anything when two clusterfiles share a name,
+    since their outputs would overwrite each other.
+    """
+    jobs = jobs or default_jobs()
+    paths = list(iter_clusterfiles(pattern))
+    if not paths:
+        return
+    claimed = {}
+    for path in paths:
+        other = claimed.setdefault(clusterfile_stem(path), path)
+        if other is not path:
+            raise ValueError(f"{other} and {path} would both write to "
+                             f"{os.path.join(output_dir, clusterfile_stem(path))}/; rename one of them")
+    # a glob may span directories; each needs its own loader search path
+    config_dirs = sorted({os.path.dirname(os.path.abspath(p)) for p in paths})
+    init_args = (list(template_files), list(params), schema, output_dir, config_dirs, bytecode_cache, structured,
+                 lint_level, outputs, trace_dir, validate_scope)
+    if jobs == 1:
+        _fleet_init(*init_args)
+        for path in paths:
+            yield _fleet_render(path)
+        return
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _fleet_init(*init_args)
+        gc.freeze()  # keep the preloaded heap out of GC passes so pages stay shared
+        ctx, initializer, initargs = multiprocessing.get_context('fork'), None, ()
+    else:
+        ctx, initializer, initargs = multiprocessing.get_context(), _fleet_init, init_args
+    try:
+        with ctx.Pool(jobs, initializer=initializer, initargs=initargs) as pool:
+            yield from _imap_bounded(pool, _fleet_render, paths, jobs * FLEET_WINDOW_PER_JOB)
+    finally:
+        gc.unfreeze()
+
+def _imap_bounded(pool, fn, items, window):
+    """pool.imap_unordered that submits at most ``window`` items ahead of the results read.
+
+    imap_unordered's task thread drains ``items`` at once; this keeps the
+    backlog of queued tasks bounded.
+    """
+    done = queue.SimpleQueue()
+    pending = 0
+    for item in items:
+        pool.apply_async(fn, (item,), callback=done.put, error_callback=done.put)
+        pending += 1
+        if pending >= window:
+            pending -= 1
+            yield _pool_result(done.get())
+    while pending:
+        pending -= 1
+        yield _pool_result(done.get())
+
+def _pool_result(result):
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+# One cache object per directory, so a daemon keeps reusing its Environments.
+_BYTECODE_CACHES = {}
+
+def get_bytecode_cache(cache_dir=None):
+    if cache_dir not in _BYTECODE_CACHES:
+        _BYTECODE_CACHES[cache_dir] = open_bytecode_cache(
+            os.path.join(cache_dir, 'bytecode') if cache_dir else None)
+    return _BYTECODE_CACHES[cache_dir]
+
+def serve_request(argv, cwd):
+    """Daemon handler: run one CLI invocation in this warm process and capture its output."""
+    out, err = io.StringIO(), io.StringIO()
+    code = 0
+    prev = os.getcwd()
+    try:
+        os.chdir(cwd)
+        with redirect_stdout(out), redirect_stderr(err):
+            try:
+                main(argv)
+            except SystemExit as e:
+                if isinstance(e.code, str):
+                    print(e.code, file=sys.stderr)
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except Exception as e:
+                print(f"ERROR: {e}", file=sys.stderr)
+                code = 1
+    except OSError as e:
+        err.write(f"ERROR: {e}\n")
+        code = 1
+    finally:
+        os.chdir(prev)
+    return code, out.getvalue(), err.getvalue()
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Process Jinja2 templates with YAML data.")
     parser.add_argument("data_file", nargs="?", help="Path to the YAML data file, inline JSON string, or omit to use -p only")
-    parser.add_argument("template_file", help="Path to the main Jinja2 template file")
+    parser.add_argument("template_file", nargs="*",
+                        help="Path to the main Jinja2 template file; give several (with -o) to render a batch")
     parser.add_argument(
         "-p", "--param", action="append", default=[],
         help="Override parameter using JSONPath syntax: path=value (repeatable). Supports dotted paths and [index]."
     )
+    parser.add_argument("--params-file", action="append", default=[], metavar="FILE",
+                        help="Read overrides from FILE (repeatable): a YAML/JSON mapping of path to value, "
+                             "or path=value lines. Applied before -p.")
     parser.add_argument("-s", "--schema", help="Path to a JSON Schema (JSON or YAML) to validate the data file against")
     parser.add_argument("--validate-scope", choices=["data", "data+params"], default="data",
                         help="When to run schema validation: 'data' validates before overrides, 'data+params' validates again after applying -p overrides")
     parser.add_argument("-S", dest="validate_data_and_params", action="store_true",
                         help="Shortcut flag: if present, validate both data and params (equivalent to --validate-scope=data+params)")
-    args = parser.parse_args()
+    parser.add_argument("-o", "--output-dir",
+                        help="Batch mode: write each rendered template to its own file in this directory")
+    parser.add_argument("--related", action="store_true",
+                        help="Batch mode: also render the relatedTemplates closure from each template's @meta block")
+    parser.add_argument("--fleet", metavar="DIR_OR_GLOB",
+                        help="Fleet mode: render the templates for every clusterfile in a directory or glob (requires -o)")
+    parser.add_argument("-j", "--jobs", type=int, help="Fleet mode: worker processes (default: number of CPUs)")
+    parser.add_argument("--render-jobs", type=int, metavar="N",
+                        help="Processes for {% parallel %} host loops in one large render "
+                             "(default: $CLUSTERFILE_RENDER_JOBS or 1, which renders serially)")
+    parser.add_argument("--structured", action="store_true",
+                        help="YAML templates: stream the render into the YAML parser instead of re-parsing the rendered text")
+    parser.add_argument("--lint", choices=LINT_LEVELS, default=None,
+                        help="yamllint level for YAML output: off, fast (syntax + line rules) or full "
+                             "(default: $CLUSTERFILE_LINT or full)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Batch/fleet mode: skip templates whose template closure, relevant data and "
+                             "loaded files are unchanged since the last run, reusing the cached output")
+    parser.add_argument("--trace", metavar="DIR",
+                        help="Record every clusterfile path each template reads, with counts, "
+                             "and write one JSON report per template to DIR (<output name>.trace.json)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Profile the render: print the slowest template lines, includes, macros and filters "
+                             "to stderr and write collapsed stacks for flame graph tools to FILE")
+    parser.add_argument("--profile-top", type=int, default=20, metavar="N",
+                        help="Rows per section in the --profile table (default: 20)")
+    parser.add_argument("--cache-dir", help="Compiled-template cache directory (default: $CLUSTERFILE_CACHE_DIR or ~/.cache/clusterfile)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Disable the on-disk compiled-template cache (also: CLUSTERFILE_NO_CACHE=1)")
+    parser.add_argument("--stats", action="store_true", help="Print cache statistics to stderr after rendering")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Run as a render daemon on a Unix socket; later process.py calls are served by it")
+    parser.add_argument("--socket", help="Daemon socket path (default: $CLUSTERFILE_SOCKET or $XDG_RUNTIME_DIR/clusterfile.sock)")
+    args = parser.parse_args(argv)
+
+    if args.daemon:
+        daemon.serve(serve_request, args.socket)
+        return
+    if not args.template_file and not (args.fleet and args.data_file):
+        parser.error("the following arguments are required: template_file")
+    set_render_jobs(args.render_jobs or default_render_jobs())
 
     # If the -S shortcut flag was used, set validate_scope accordingly
     if getattr(args, 'validate_data_and_params', False):
         args.validate_scope = "data+params"
 
-    # Load data source (file path OR inline JSON). If omitted, start from {}.
-    data = {}
-    if args.data_file:
-        # Try parsing as JSON string first
-        try:
-            data = json.loads(args.data_file)
-        except Exception:
-            # Fallback to file path (YAML/JSON)
-            try:
-                with open(args.data_file, 'r') as f:
-                    data = yaml.safe_load(f) or {}
-            except FileNotFoundError:
-                raise FileNotFoundError(f"Error: Data file '{args.data_file}' not found.")
-            except yaml.YAMLError as e:
-                raise ValueError(f"Error: Invalid YAML format in '{args.data_file}': {e}")
-
-    # Schema validation helpers
-    def _load_schema(path):
-        s = None
+    try:
+        overrides = [o for path in args.params_file for o in load_params_file(path)] + args.param
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+    template_files = args.template_file
+    if args.fleet and args.data_file:
+        # in fleet mode every positional is a template
+        template_files = [args.data_file] + template_files
+        args.data_file = None
+    if args.related:
+        template_files = expand_related_templates(template_files)
+    batch = args.output_dir is not None
+    if len(template_files) > 1 and not batch:
+        parser.error("Rendering several templates requires -o/--output-dir.")
+    if args.fleet and not batch:
+        parser.error("--fleet requires -o/--output-dir.")
+    if args.fleet and args.profile:
+        parser.error("--profile is not supported with --fleet; profile one clusterfile in batch mode instead.")
+
+    bytecode_cache = None if args.no_cache else get_bytecode_cache(args.cache_dir)
+    outputs = None
+    if args.incremental:
+        if not batch:
+            parser.error("--incremental requires -o/--output-dir.")
+        outputs = open_output_cache(os.path.join(args.cache_dir, 'outputs') if args.cache_dir else None,
+                                    read_file=FILE_CACHE.read)
+        if outputs is None:
+            print("WARNING: --incremental: output cache disabled or unusable; rendering everything", file=sys.stderr)
+
+    profiler = TemplateProfiler() if args.profile else None
+
+    def _print_profile():
+        if profiler is None:
+            return
+        print(profiler.table(args.profile_top), file=sys.stderr, end='')
         try:
-            with open(path, 'r') as fh:
-                txt = fh.read()
-        except Exception as e:
-            raise FileNotFoundError(f"Schema file '{path}' not found: {e}")
+            with open(args.profile, 'w') as f:
+                f.write(profiler.collapsed())
+            print(f"Profile stacks: {args.profile}", file=sys.stderr)
+        except OSError as e:
+            print(f"WARNING: could not write profile stacks: {e}", file=sys.stderr)
+
+    def _print_stats():
+        if args.stats:
+            print(f"STATS: {bytecode_cache.stats() if bytecode_cache else 'bytecode-cache disabled'}", file=sys.stderr)
+            print(f"STATS: {FILE_CACHE.stats()}", file=sys.stderr)
+            print(f"STATS: {LINT_CACHE.stats()}", file=sys.stderr)
+            print(f"STATS: {FRAGMENT_CACHE.stats()}", file=sys.stderr)
+            print(f"STATS: {PASSWD_HASH_CACHE.stats()}", file=sys.stderr)
+
+    if args.fleet:
+        clusters = failed = rebuilt = skipped = 0
+        fleet = render_fleet(args.fleet, template_files, args.output_dir, overrides,
+                             args.schema, args.jobs, bytecode_cache, args.structured, args.lint, outputs, args.trace,
+                             args.validate_scope)
         try:
-            s = json.loads(txt)
-        except Exception:
-            try:
-                s = yaml.safe_load(txt)
-            except Exception as e:
-                raise ValueError(f"Could not parse schema file '{path}': {e}")
-        return merge_plugin_schemas(s, path)
-
-    def _validate_against_schema(obj, schema_path):
-        if not args.schema:
-            return []
-        if jsonschema is None:
-            raise RuntimeError("jsonschema package is required for schema validation. Install with: pip install jsonschema")
-        schema = _load_schema(schema_path)
-        Validator = jsonschema.validators.validator_for(schema)
-        validator = Validator(schema, format_checker=FormatChecker())
-        errors = sorted(validator.iter_errors(obj), key=lambda e: list(e.path))
-        msgs = []
-        for e in errors:
-            p = ".".join([str(x) for x in e.path]) if e.path else "<root>"
-            msgs.append(f"{p}: {e.message}")
-        return msgs
+            for clusterfile, results, error in fleet:
+                clusters += 1
+                if error is not None:
+                    failed += 1
+                    print(f"ERROR: {clusterfile}: {error}", file=sys.stderr)
+                    continue
+                errors = [(t, err) for t, _, _, err in results if err is not None]
+                for template_file, out_path, messages, err in results:
+                    for m in messages:
+                        print(f"{clusterfile}: {template_file}: {m}", file=sys.stderr)
+                    if err is not None:
+                        print(f"ERROR: {clusterfile}: {template_file}: {err}", file=sys.stderr)
+                failed += bool(errors)
+                reused = sum(r.skipped for r in results)
+                rebuilt += len(results) - len(errors) - reused
+                skipped += reused
+                detail = f", {reused} up to date" if outputs is not None else ""
+                print(f"{'FAIL' if errors else 'OK'} {clusterfile} ({len(results) - len(errors)}/{len(results)} templates{detail})",
+                      file=sys.stderr)
+        except ValueError as e:  # clusterfiles whose outputs would collide
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Fleet: {clusters - failed}/{clusters} clusters rendered", file=sys.stderr)
+        if outputs is not None:
+            print(f"Incremental: {rebuilt} rebuilt, {skipped} up to date", file=sys.stderr)
+        _print_stats()
+        sys.exit(1 if failed or not clusters else 0)
 
-    # If a schema was provided and scope includes 'data', validate original data before applying overrides
-    if args.schema and args.validate_scope in ("data", "data+params"):
+    # Load data source (file path OR inline JSON). If omitted, start from {}.
+    data = load_data(args.data_file)
+
+    def _validate_or_exit(label):
         try:
-            errs = _validate_against_schema(data, args.schema)
+            errs = validate_against_schema(data, args.schema)
         except Exception as e:
             print(f"Schema validation setup error: {e}", file=sys.stderr)
             sys.exit(2)
         if errs:
-            print("Schema validation errors (data file):", file=sys.stderr)
+            print(f"Schema validation errors ({label}):", file=sys.stderr)
             for m in errs:
                 print(m, file=sys.stderr)
             sys.exit(2)
 
+    # If a schema was provided and scope includes 'data', validate original data before applying overrides
+    if args.schema and args.validate_scope in ("data", "data+params"):
+        _validate_or_exit("data file")
+
     # Require at least one input source
-    if not args.data_file and not args.param:
+    if not args.data_file and not overrides:
         parser.error("Provide either a data_file or at least one -p override.")
 
     # Apply JSONPath overrides with create-if-missing semantics
-    for override in args.param:
-        if "=" not in override:
-            continue
-        path_expr, val = override.split("=", 1)
-        # allow multi-line via \n, \t, etc.
-        val = val.encode("utf-8").decode("unicode_escape")
-        try:
-            # Try strict JSONPath update for existing nodes
-            expr = jsonpath_ng.parse(path_expr)
-            matches = expr.find(data)
-            if matches:
-                for m in matches:
-                    m.full_path.update(data, val)
-                continue
-        except Exception:
-            # If parse fails, fall back to dotted/indexed path
-            pass
-        # Create missing structure using dotted/index fallback
-        set_by_path(data, path_expr, val)
+    apply_overrides(data, overrides)
 
     # If schema provided and scope is data+params, validate now after applying overrides
     if args.schema and args.validate_scope == "data+params":
-        try:
-            errs = _validate_against_schema(data, args.schema)
-        except Exception as e:
-            print(f"Schema validation setup error: {e}", file=sys.stderr)
-            sys.exit(2)
-        if errs:
-            print("Schema validation errors (after applying overrides):", file=sys.stderr)
-            for m in errs:
-                print(m, file=sys.stderr)
-            sys.exit(2)
+        _validate_or_exit("after applying overrides")
 
-    config = yamllint.config.YamlLintConfig(YAMLLINT_CONFIG)
+    prefetch_files(data)
 
-    # Pre-render validation (warnings to stderr, never blocks rendering)
-    meta = parse_template_meta(args.template_file)
-    val_warnings, val_errors = validate_data_for_template(data, meta)
-    for w in val_warnings + val_errors:
-        print(f"WARNING: {w}", file=sys.stderr)
+    if batch:
+        failed = rebuilt = skipped = 0
+        with profiler or nullcontext():
+            results = render_batch(
+                data, template_files, args.data_file, args.output_dir, bytecode_cache,
+                lint_level=args.lint, structured=args.structured,
+                outputs=outputs, trace_dir=args.trace)
+        for result in results:
+            template_file, out_path, messages, error = result
+            for m in messages:
+                print(f"{template_file}: {m}", file=sys.stderr)
+            if error is not None:
+                failed += 1
+                print(f"ERROR: {template_file}: {error}", file=sys.stderr)
+            elif outputs is None:
+                print(f"{template_file} -> {out_path}", file=sys.stderr)
+            else:
+                skipped += result.skipped
+                rebuilt += not result.skipped
+                print(f"{template_file} -> {out_path} ({'up to date' if result.skipped else 'rebuilt'})",
+                      file=sys.stderr)
+        if outputs is not None:
+            print(f"Incremental: {rebuilt} rebuilt, {skipped} up to date", file=sys.stderr)
+        _print_profile()
+        _print_stats()
+        sys.exit(1 if failed else 0)
 
+    template_file = template_files[0]
+    trace = DataTrace() if args.trace else None
     try:
-        processedTemplate, missing_vars = process_template(data, args.template_file, args.data_file)
-        if missing_vars:
-            for var, default in sorted(missing_vars.items()):
-                print(f"WARNING: {var} undefined, substituted {default!r}", file=sys.stderr)
+        with profiler or nullcontext():
+            output = render_file(data, template_file, args.data_file, _StderrMessages(), bytecode_cache=bytecode_cache,
+                                 lint_level=args.lint, structured=args.structured, trace=trace)
+    except FormatError as e:
+        print(e)
+        sys.exit(1)
     except (FileNotFoundError, ValueError) as e:
         print(e, file=sys.stderr)
         sys.exit(1)
     except Exception as e:
         print(f"ERROR: Template rendering failed: {e}", file=sys.stderr)
         sys.exit(1)
+    if trace is not None:
+        report = write_trace_report(args.trace, output_name(template_file, set()), trace, template_file, args.data_file)
+        print(f"Data trace: {report}", file=sys.stderr)
+    _print_profile()
+    _print_stats()
+    print(output)
 
-    if args.template_file.endswith('yaml.tpl') or args.template_file.endswith('yaml.tmpl'):
-        try:
-            outputYaml = format_yaml_output(processedTemplate, meta)
-        except Exception as e:
-            print(e)
-            sys.exit(1)
-
-        try:
-            problems = yamllint.linter.run(outputYaml, config)
-            for problem in problems:
-                print(problem, file=sys.stderr)
-            print(outputYaml)
-        except Exception as e:
-            print(e)
-    else:
-        print(processedTemplate)
+if __name__ == "__main__":
+    main()
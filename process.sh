@@ -3,6 +3,26 @@
 
 set -euo pipefail
 
+# Check if we have arguments
+if [[ $# -lt 1 ]]; then
+    echo "Usage: $0 <template> [-p param=value...]"
+    echo "   or: $0 <data_file> <template> [-p param=value...]"
+    exit 1
+fi
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+# Use a running render daemon (./process.py --daemon) when one is listening.
+# The daemon sees the host filesystem, so arguments pass through unmapped.
+# lib/daemon.py exits 75 when no daemon answered (or CLUSTERFILE_NO_DAEMON=1).
+if command -v python3 &> /dev/null; then
+    rc=0
+    python3 "${SCRIPT_DIR}/lib/daemon.py" "$@" || rc=$?
+    if [[ $rc -ne 75 ]]; then
+        exit $rc
+    fi
+fi
+
 # Detect container runtime
 if command -v podman &> /dev/null; then
     CONTAINER_CMD="podman"
@@ -13,14 +33,6 @@ else
     exit 1
 fi
 
-# Check if we have arguments
-if [[ $# -lt 1 ]]; then
-    echo "Usage: $0 <template> [-p param=value...]"
-    echo "   or: $0 <data_file> <template> [-p param=value...]"
-    exit 1
-fi
-
-SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 WORK_DIR="$(pwd)"
 IMAGE_REF="${IMAGE_REF:-quay.io/dds/process:latest}"
 
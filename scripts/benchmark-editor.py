@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Load-test the editor's render path: p50/p99 latency with and without its caches.
+
+Replays /api/render requests (every data/*.clusterfile against each
+template) through the editor's render_template from --concurrency threads,
+the way the editor's render pool runs them, in three modes:
+    uncached - what the editor used to do: a new Environment and loader per
+               request, the template and every include compiled again
+    cached   - the process-wide Environment and compiled-template cache
+    results  - cached, plus the render result cache: repeated requests skip
+               rendering entirely
+and checks all modes return the same output. The fragment, lint and
+passwd caches are process-wide in every mode.
+
+Usage:
+    python3 scripts/benchmark-editor.py [--requests 400] [--concurrency 4] [-t acm-ztp.yaml.tpl ...]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "apps/editor"))
+
+from app import template_processor as tp  # noqa: E402
+
+TEMPLATES_DIR = REPO_ROOT / "templates"
+DEFAULT_TEMPLATES = ["install-config.yaml.tpl", "agent-config.yaml.tpl", "acm-ztp.yaml.tpl",
+                     "acm-capi-m3.yaml.tpl", "operators.yaml.tpl", "cluster-overview.html.tpl"]
+
+
+def uncached_compile(template_content, template_dir, template_name=None):
+    return tp.build_environment(template_dir).from_string(template_content)
+
+
+def run(requests, concurrency, cache):
+    def one(request):
+        yaml_text, template = request
+        start = time.perf_counter()
+        result = tp.render_template(yaml_text, template, [], TEMPLATES_DIR, cache=cache)
+        return time.perf_counter() - start, result.get("output")
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(one, requests))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400, help="requests per mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent renders (editor default: up to 4)")
+    parser.add_argument("-t", "--template", action="append", help="template to render (repeatable)")
+    args = parser.parse_args()
+
+    samples = [p.read_text() for p in sorted((REPO_ROOT / "data").glob("*.clusterfile"))]
+    combos = [(text, t) for t in (args.template or DEFAULT_TEMPLATES) for text in samples]
+    requests = [combos[i % len(combos)] for i in range(args.requests)]
+    os.chdir(REPO_ROOT / "data")
+
+    cached_compile = tp.compile_template
+    results = {}
+    modes = (("uncached", uncached_compile, False), ("cached", cached_compile, False),
+             ("results", cached_compile, True))
+    for mode, compile_fn, cache in modes:
+        tp.compile_template = compile_fn
+        tp.clear_template_cache()
+        tp.RENDER_CACHE.clear()
+        run(requests[:len(combos)], args.concurrency, cache)  # warm the caches alike for every mode
+        start = time.perf_counter()
+        results[mode] = run(requests, args.concurrency, cache)
+        wall = time.perf_counter() - start
+        latencies = [elapsed * 1000 for elapsed, _ in results[mode]]
+        print(f"{mode:<9} p50 {statistics.median(latencies):8.1f} ms  p99 {percentile(latencies, 99):8.1f} ms"
+              f"  {len(requests) / wall:7.1f} req/s")
+    tp.compile_template = cached_compile
+    outputs = [[output for _, output in timings] for timings in results.values()]
+    same = all(o == outputs[0] for o in outputs)
+    print(f"same output: {'yes' if same else 'NO'}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Compare schema validation cost per clusterfile: rebuild-every-time vs cached validators.
+
+For every data/*.clusterfile, runs the two validation passes of
+`process.py -S` (data file, then data + params) three ways:
+    rebuild  - what process.py used to do: parse clusterfile.schema.json, merge
+               every plugin schema and build a jsonschema validator per pass
+    cold     - a new process with a warm disk cache: merged schema and compiled
+               validator loaded from ~/.cache/clusterfile/schema
+    warm     - a batch render or daemon: validator already in memory
+and checks all three report the same errors.
+
+Usage:
+    python3 scripts/benchmark-schema.py [--repeat 5]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import jsonschema  # noqa: E402
+from jsonschema import FormatChecker  # noqa: E402
+
+from lib import schema as schema_lib  # noqa: E402
+from lib.render import load_yaml  # noqa: E402
+
+SCHEMA = str(REPO_ROOT / "schema/clusterfile.schema.json")
+
+
+def messages(errors):
+    return [f"{'.'.join(str(x) for x in e.path) if e.path else '<root>'}: {e.message}"
+            for e in sorted(errors, key=lambda e: list(e.path))]
+
+
+def rebuild(data):
+    out = []
+    for _ in range(2):
+        schema = schema_lib.merge_plugin_schemas(schema_lib.parse_schema(SCHEMA), SCHEMA)
+        validator = jsonschema.validators.validator_for(schema)(schema, format_checker=FormatChecker())
+        out = messages(validator.iter_errors(data))
+    return out
+
+
+def cold(data):
+    schema_lib._SCHEMAS.clear()
+    schema_lib._VALIDATORS.clear()
+    return warm(data)
+
+
+def warm(data):
+    out = []
+    for _ in range(2):
+        out = schema_lib.validate_against_schema(data, SCHEMA)
+    return out
+
+
+def best_of(fn, data, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement; the best is reported")
+    args = parser.parse_args()
+
+    warm({})  # populate the disk cache
+    compiled = schema_lib.get_validator(SCHEMA).compiled
+    print(f"compiled validator: {'yes (fastjsonschema)' if compiled else 'no (jsonschema only)'}")
+    print(f"{'clusterfile':<32} {'errors':>6} {'rebuild':>9} {'cold':>9} {'warm':>9} {'speedup':>8}  same")
+    ok = True
+    for path in sorted((REPO_ROOT / "data").glob("*.clusterfile")):
+        data = load_yaml(path.read_text()) or {}
+        t_rebuild, expected = best_of(rebuild, data, args.repeat)
+        t_cold, cold_out = best_of(cold, data, args.repeat)
+        t_warm, warm_out = best_of(warm, data, args.repeat)
+        same = expected == cold_out == warm_out
+        ok &= same
+        print(f"{path.name:<32} {len(expected):>6} {t_rebuild * 1000:>8.2f}m {t_cold * 1000:>8.2f}m "
+              f"{t_warm * 1000:>8.2f}m {t_rebuild / t_warm:>7.1f}x  {'yes' if same else 'NO'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""Scale benchmark: every template against every clusterfile, timed by pipeline stage.
+
+Renders each templates/*.tpl and each operator/auth plugin template
+(plugins/*/*/*.tpl outside plugins/platforms/, whose templates are includes)
+against every data/*.clusterfile and against synthetic clusterfiles that
+lib/synthetic.py scales from data/plugin-baremetal.clusterfile to 1, 10,
+100, 1000 and 5000 hosts.
+Each clusterfile is timed through the stages process.py runs once per input:
+    load      - reading and parsing the clusterfile (load_data)
+    override  - a fixed set of -p overrides, one of them per host (apply_overrides)
+    validate  - schema validation with the cached validator (validate_against_schema)
+and each template through the stages it runs per output:
+    validate  - the @meta pre-render checks (validate_data_for_template)
+    render    - Template.render() with the shared Environment (process_template)
+    format    - re-parse and re-dump of YAML output (format_yaml_output)
+    lint      - yamllint at --lint, without the lint cache (lint_problems)
+Every time is the best of --repeat runs, after an untimed render that
+compiles the template and its includes. Peak traced memory is measured in a
+separate run per input and per template, so tracemalloc does not skew the
+times.
+
+Results are written as JSON (--output). With --baseline, every stage time and
+peak is compared with the same entry of an earlier results file, and the run
+exits 1 when one grew by more than --threshold (and by more than --min-delta
+ms, or 1 MiB for memory), or when a template that rendered now fails.
+
+Usage:
+    python3 scripts/benchmark-templates.py [--output results.json] [--baseline baseline.json]
+    python3 scripts/benchmark-templates.py --hosts 100 --templates 'templates/acm-*' --repeat 1
+"""
+import argparse
+import contextlib
+import copy
+import fnmatch
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import jinja2  # noqa: E402
+import yaml  # noqa: E402
+
+import process  # noqa: E402
+from lib import render  # noqa: E402
+from lib.lint import LINT_LEVELS, default_lint_level, lint_problems  # noqa: E402
+from lib.schema import get_validator, validate_against_schema  # noqa: E402
+from lib.synthetic import generate_clusterfile  # noqa: E402
+
+SCHEMA = str(REPO_ROOT / "schema/clusterfile.schema.json")
+SYNTHETIC_BASE = REPO_ROOT / "data/plugin-baremetal.clusterfile"
+DEFAULT_HOSTS = (1, 10, 100, 1000, 5000)
+INPUT_STAGES = ("load", "override", "validate")
+TEMPLATE_STAGES = ("validate", "render", "format", "lint")
+
+# Overrides applied in the override stage; the last one matches every host.
+OVERRIDES = (
+    "cluster.name=bench",
+    "network.domain=bench.example.com",
+    "cluster.version=4.18.1",
+    "hosts.*.bmc.username=bench",
+)
+
+# A measurement stops repeating once its runs add up to this many seconds.
+REPEAT_BUDGET = 2.0
+
+RESULTS_VERSION = 1
+
+
+def best_of(fn, repeat):
+    """Best time of up to ``repeat`` runs of fn, stopping early past REPEAT_BUDGET; returns (seconds, result)."""
+    best, spent, result = None, 0.0, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        spent += elapsed
+        if spent > REPEAT_BUDGET:
+            break
+    return best, result
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def template_files():
+    """templates/*.tpl plus the operator and auth plugin templates, as paths relative to the repo."""
+    found = sorted(REPO_ROOT.glob("templates/*.tpl"))
+    found += sorted(path for path in REPO_ROOT.glob("plugins/*/*/*.tpl") if path.parts[-3] != "platforms")
+    return [str(path.relative_to(REPO_ROOT)) for path in found]
+
+
+def synthetic_clusterfile(hosts):
+    """plugin-baremetal.clusterfile scaled to ``hosts`` hosts by lib.synthetic, as YAML text."""
+    return render.dump_yaml(generate_clusterfile(render.load_yaml(SYNTHETIC_BASE.read_text()), hosts), sort_keys=False)
+
+
+def inputs(hosts, workdir):
+    """(label, path) for every data/*.clusterfile and every synthetic host count."""
+    found = [(path.name, str(path)) for path in sorted((REPO_ROOT / "data").glob("*.clusterfile"))]
+    for count in hosts:
+        path = os.path.join(workdir, f"synthetic-{count}.clusterfile")
+        with open(path, "w") as fh:
+            fh.write(synthetic_clusterfile(count))
+        found.append((f"synthetic-{count}", path))
+    return found
+
+
+def ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def bench_input(path, repeat, memory):
+    """Load, override and validate one clusterfile; returns (result entry, overridden data)."""
+    stages = {}
+    stages["load"], data = best_of(lambda: process.load_data(path), repeat)
+    copies = [copy.deepcopy(data) for _ in range(repeat)]
+    stages["override"], _ = best_of(lambda: render.apply_overrides(copies.pop(), OVERRIDES), repeat)
+    data = render.apply_overrides(data, OVERRIDES)
+    stages["validate"], errors = best_of(lambda: validate_against_schema(data, SCHEMA), repeat)
+    entry = {"hosts": len(data.get("hosts") or {}), "bytes": os.path.getsize(path),
+             "schema_errors": len(errors), "stages": {k: ms(v) for k, v in stages.items()}}
+    if memory:
+        entry["peak_memory"] = peak_memory(
+            lambda: validate_against_schema(render.apply_overrides(process.load_data(path), OVERRIDES), SCHEMA))
+    return entry, data
+
+
+def bench_template(data, template_file, data_file, env, lint_level, repeat, memory):
+    """Run one template's stages against data; returns its result entry."""
+    meta = process.parse_template_meta(template_file)
+    yaml_template = process.is_yaml_template(template_file)
+    stages = {}
+    try:
+        process.process_template(data, template_file, data_file, env=env)  # compiles the closure; not timed
+        stages["validate"], _ = best_of(lambda: render.validate_data_for_template(data, meta), repeat)
+        stages["render"], (output, _missing) = best_of(
+            lambda: process.process_template(data, template_file, data_file, env=env), repeat)
+        rendered_bytes = len(output)
+        if yaml_template:
+            stages["format"], output = best_of(lambda: render.format_yaml_output(output, meta), repeat)
+            stages["lint"], problems = best_of(lambda: lint_problems(output, lint_level), repeat)
+    except Exception as e:
+        first_line = (str(e).splitlines() or [''])[0]
+        return {"error": f"{type(e).__name__}: {first_line}"}
+    entry = {"stages": {k: ms(v) for k, v in stages.items()}, "output_bytes": rendered_bytes}
+    if yaml_template:
+        entry["lint_problems"] = len(problems)
+    if memory:
+        def pipeline():
+            render.validate_data_for_template(data, meta)
+            text = process.process_template(data, template_file, data_file, env=env)[0]
+            if yaml_template:
+                lint_problems(render.format_yaml_output(text, meta), lint_level)
+        entry["peak_memory"] = peak_memory(pipeline)
+    return entry
+
+
+def environment_info():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "jinja2": jinja2.__version__,
+        "pyyaml": yaml.__version__,
+        "libyaml": render.CIndentDumper is not None,
+        "compiled_validator": get_validator(SCHEMA).compiled,
+    }
+
+
+def run(args):
+    templates = [t for t in template_files()
+                 if not args.templates or any(fnmatch.fnmatchcase(t, pattern) for pattern in args.templates)]
+    results = {"version": RESULTS_VERSION, "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+               "environment": environment_info(),
+               "settings": {"lint": args.lint, "repeat": args.repeat, "overrides": list(OVERRIDES)},
+               "inputs": {}, "renders": {}}
+    print(f"{'input':<30} {'hosts':>5} {'load':>8} {'overr':>8} {'valid':>8} {'render':>9} {'format':>9} "
+          f"{'lint':>9} {'peak':>8} {'fail':>4}  (ms, sums over {len(templates)} templates)")
+    with tempfile.TemporaryDirectory(prefix="clusterfile-bench-") as workdir:
+        for label, path in inputs(args.hosts, workdir):
+            if args.inputs and not any(fnmatch.fnmatchcase(label, pattern) for pattern in args.inputs):
+                continue
+            # synthetic clusterfiles render with data/ as their directory, like the files they were cloned from
+            data_file = path if label.endswith(".clusterfile") else str(SYNTHETIC_BASE)
+            with contextlib.redirect_stderr(io.StringIO()):
+                entry, data = bench_input(path, args.repeat, args.memory)
+                renders = {}
+                for template_file in templates:
+                    template_path = str(REPO_ROOT / template_file)
+                    env = process.get_environment(os.path.dirname(template_path), os.path.dirname(data_file))
+                    renders[template_file] = bench_template(data, template_path, data_file, env, args.lint,
+                                                            args.repeat, args.memory)
+            results["inputs"][label] = entry
+            results["renders"][label] = renders
+            print_input(label, entry, renders)
+    return results
+
+
+def print_input(label, entry, renders):
+    sums = dict.fromkeys(TEMPLATE_STAGES[1:], 0.0)
+    peak = entry.get("peak_memory", 0)
+    for result in renders.values():
+        for stage in sums:
+            sums[stage] += result.get("stages", {}).get(stage, 0.0)
+        peak = max(peak, result.get("peak_memory", 0))
+    failed = sum(1 for result in renders.values() if "error" in result)
+    stages = entry["stages"]
+    print(f"{label:<30} {entry['hosts']:>5} {stages['load']:>8.1f} {stages['override']:>8.1f} "
+          f"{stages['validate']:>8.1f} {sums['render']:>9.1f} {sums['format']:>9.1f} {sums['lint']:>9.1f} "
+          f"{peak / 2**20:>7.1f}M {failed:>4}", flush=True)
+
+
+def print_slowest(results, top):
+    cases = []
+    for label, renders in results["renders"].items():
+        for template_file, result in renders.items():
+            if "stages" in result:
+                cases.append((sum(result["stages"].values()), label, template_file, result))
+    if not cases or not top:
+        return
+    print()
+    print(f"Slowest {top} renders (ms)")
+    print(f"{'total':>9} {'render':>9} {'format':>9} {'lint':>9} {'peak':>8}  template @ input")
+    for total, label, template_file, result in sorted(cases, key=lambda case: -case[0])[:top]:
+        stages = result["stages"]
+        print(f"{total:>9.1f} {stages['render']:>9.1f} {stages.get('format', 0):>9.1f} "
+              f"{stages.get('lint', 0):>9.1f} {result.get('peak_memory', 0) / 2**20:>7.1f}M  {template_file} @ {label}")
+
+
+def measurements(results):
+    """Flatten results to {(input, template or None, stage): value}; stage 'peak_memory' holds bytes."""
+    out = {}
+    for label, entry in results.get("inputs", {}).items():
+        for stage, value in entry.get("stages", {}).items():
+            out[(label, None, stage)] = value
+        if "peak_memory" in entry:
+            out[(label, None, "peak_memory")] = entry["peak_memory"]
+    for label, renders in results.get("renders", {}).items():
+        for template_file, result in renders.items():
+            for stage, value in result.get("stages", {}).items():
+                out[(label, template_file, stage)] = value
+            if "peak_memory" in result:
+                out[(label, template_file, "peak_memory")] = result["peak_memory"]
+    return out
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Regressions of results against baseline, as printable strings."""
+    regressions = []
+    current, previous = measurements(results), measurements(baseline)
+    for key, value in current.items():
+        old = previous.get(key)
+        if old is None:
+            continue
+        label, template_file, stage = key
+        min_delta = 2**20 if stage == "peak_memory" else min_delta_ms
+        if value > old * threshold and value - old > min_delta:
+            where = f"{template_file} @ {label}" if template_file else label
+            if stage == "peak_memory":
+                change = f"{old / 2**20:.1f}M -> {value / 2**20:.1f}M"
+            else:
+                change = f"{old:.1f}ms -> {value:.1f}ms"
+            regressions.append(f"{stage:<11} {change:<24} x{value / old if old else float('inf'):.2f}  {where}")
+    for label, renders in results.get("renders", {}).items():
+        for template_file, result in renders.items():
+            before = baseline.get("renders", {}).get(label, {}).get(template_file)
+            if "error" in result and before is not None and "error" not in before:
+                regressions.append(f"{'error':<11} {result['error']}  {template_file} @ {label}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, action="append",
+                        help="synthetic host count (repeatable; default 1, 10, 100, 1000 and 5000; 0 for none)")
+    parser.add_argument("--templates", action="append", metavar="GLOB",
+                        help="only templates whose repo-relative path matches (repeatable)")
+    parser.add_argument("--inputs", action="append", metavar="GLOB",
+                        help="only inputs whose name matches, e.g. 'plugin-*' or 'synthetic-*' (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best is reported")
+    parser.add_argument("--lint", choices=LINT_LEVELS, default=default_lint_level(), help="lint level to time")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the peak memory runs")
+    parser.add_argument("--top", type=int, default=10, help="slowest renders to list")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON to compare against; exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="regression when a stage takes more than this times the baseline (default 1.5)")
+    parser.add_argument("--min-delta", type=float, default=10.0,
+                        help="ignore time regressions smaller than this many ms (default 10)")
+    args = parser.parse_args()
+    args.hosts = [count for count in (args.hosts or DEFAULT_HOSTS) if count > 0]
+
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+    os.chdir(REPO_ROOT / "data")  # clusterfiles reference secrets/ relative to data/
+    get_validator(SCHEMA)  # build or load the cached validator outside the timings
+    results = run(args)
+    print_slowest(results, args.top)
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+            fh.write("\n")
+        print(f"\nResults: {args.output}")
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+    print()
+    if regressions:
+        print(f"{len(regressions)} regression(s) against {args.baseline} (threshold x{args.threshold}):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"No regressions against {args.baseline} (threshold x{args.threshold}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Compare the pure-Python and libyaml YAML paths used by the renderer.
+
+For every data/*.clusterfile and for a synthetic clusterfile scaled up from
+data/acm.clusterfile, times:
+    load     - parsing the clusterfile (yaml.safe_load vs load_yaml)
+    format   - re-parsing and re-dumping the rendered acm-ztp.yaml output
+               (format_yaml_output with and without the libyaml fast path)
+and checks the formatted output is byte-identical on both paths. Then, for
+the synthetic clusterfiles, compares rendering acm-ztp.yaml.tpl as text and
+re-parsing it against --structured mode (process_template_structured), by
+time and by peak traced memory.
+
+Usage:
+    python3 scripts/benchmark-yaml.py [--hosts 1000] [--repeat 3]
+"""
+import argparse
+import contextlib
+import copy
+import io
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import yaml  # noqa: E402
+
+from lib import render  # noqa: E402
+import process  # noqa: E402
+
+TEMPLATE = REPO_ROOT / "templates/acm-ztp.yaml.tpl"
+
+
+@contextlib.contextmanager
+def pure_python():
+    """Temporarily disable the libyaml fast path in lib.render."""
+    saved = render.FastSafeLoader, render.CIndentDumper
+    render.FastSafeLoader, render.CIndentDumper = yaml.SafeLoader, None
+    try:
+        yield
+    finally:
+        render.FastSafeLoader, render.CIndentDumper = saved
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def synthetic_clusterfile(hosts):
+    """acm.clusterfile with its host entry cloned ``hosts`` times."""
+    data = yaml.safe_load((REPO_ROOT / "data/acm.clusterfile").read_text())
+    template_host = next(iter(data["hosts"].values()))
+    data["hosts"] = {}
+    for i in range(hosts):
+        host = copy.deepcopy(template_host)
+        host["role"] = "control" if i < 3 else "worker"
+        host["network"]["interfaces"][0]["macAddress"] = "52:54:00:%02x:%02x:%02x" % (i >> 16 & 255, i >> 8 & 255, i & 255)
+        host["network"]["primary"]["address"] = "10.%d.%d.%d" % (i >> 16 & 255, i >> 8 & 255, i & 255)
+        data["hosts"][f"node{i:05d}.example.com"] = host
+    return yaml.dump(data, sort_keys=False)
+
+
+def bench(label, text, repeat):
+    pure_load, data = best_of(lambda: yaml.safe_load(text), repeat)
+    fast_load, _ = best_of(lambda: render.load_yaml(text), repeat)
+    with contextlib.redirect_stderr(io.StringIO()):
+        rendered, _missing = process.process_template(data, str(TEMPLATE), None)
+    with pure_python():
+        pure_fmt, pure_out = best_of(lambda: render.format_yaml_output(rendered), repeat)
+    fast_fmt, fast_out = best_of(lambda: render.format_yaml_output(rendered), repeat)
+    same = "yes" if pure_out == fast_out else "NO"
+    print(f"{label:<32} {len(text) // 1024:>7}K {pure_load * 1000:>9.1f} {fast_load * 1000:>9.1f} {pure_load / fast_load:>6.1f}x "
+          f"{len(fast_out) // 1024:>7}K {pure_fmt * 1000:>9.1f} {fast_fmt * 1000:>9.1f} {pure_fmt / fast_fmt:>6.1f}x  {same}")
+    return pure_out == fast_out
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_structured(hosts, repeat):
+    data = yaml.safe_load(synthetic_clusterfile(hosts))
+    meta = process.parse_template_meta(str(TEMPLATE))
+
+    def text():
+        return render.format_yaml_output(process.process_template(data, str(TEMPLATE), None)[0], meta)
+
+    def structured():
+        return process.process_template_structured(data, str(TEMPLATE), None, meta)[0]
+
+    with contextlib.redirect_stderr(io.StringIO()):
+        text_time, text_out = best_of(text, repeat)
+        struct_time, struct_out = best_of(structured, repeat)
+        text_peak, struct_peak = peak_memory(text), peak_memory(structured)
+    same = "yes" if text_out == struct_out else "NO"
+    print(f"{f'acm-ztp ({hosts} hosts)':<32} {text_time * 1000:>9.1f} {struct_time * 1000:>9.1f} {text_time / struct_time:>6.2f}x "
+          f"{text_peak / 2**20:>8.1f}M {struct_peak / 2**20:>8.1f}M  {same}")
+    return text_out == struct_out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, action="append", help="synthetic host count (repeatable; default 100 and 1000)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best is reported")
+    args = parser.parse_args()
+
+    if render.CIndentDumper is None:
+        print("libyaml is not available (or CLUSTERFILE_PURE_YAML is set); nothing to compare", file=sys.stderr)
+        return 1
+
+    os.chdir(REPO_ROOT / "data")  # clusterfiles reference secrets/ relative to data/
+    print(f"{'input':<32} {'size':>8} {'load py':>9} {'load C':>9} {'':>7} "
+          f"{'output':>8} {'fmt py':>9} {'fmt C':>9} {'':>7}  identical")
+    ok = True
+    for path in sorted((REPO_ROOT / "data").glob("*.clusterfile")):
+        ok &= bench(path.name, path.read_text(), args.repeat)
+    for hosts in args.hosts or [100, 1000]:
+        ok &= bench(f"synthetic ({hosts} hosts)", synthetic_clusterfile(hosts), args.repeat)
+    print()
+    print(f"{'structured render':<32} {'text':>9} {'struct':>9} {'':>7} {'peak txt':>9} {'peak str':>9}  identical")
+    for hosts in args.hosts or [100, 1000]:
+        ok &= bench_structured(hosts, args.repeat)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Generate synthetic clusterfiles with many hosts for scale and load testing.
+
+Scales an example clusterfile (a path, or a name from data/ such as
+start-full, acm or plugin-baremetal) to --hosts hosts with --interfaces NICs
+each. MACs and IPs are deterministic and unique, assigned by hashing each
+host and interface the way generate-mac-in-range.sh does (see lib/synthetic.py).
+With --clusters, writes a fleet of that many clusterfiles to a directory,
+with MACs unique across the fleet.
+
+Every generated clusterfile is validated against schema/clusterfile.schema.json
+unless --no-validate is given; the exit status is 1 if any fails.
+Relative file references (secrets/...) are kept, so render from data/ or
+copy data/secrets/ next to the output.
+
+Usage:
+    python3 scripts/generate-clusterfile.py start-full --hosts 1000 --interfaces 4 --bond 802.3ad --vlan 100 -o big.clusterfile
+    python3 scripts/generate-clusterfile.py acm --hosts 1 --clusters 10000 -o sites/
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from lib.render import dump_yaml, load_yaml  # noqa: E402
+from lib.schema import validate_against_schema  # noqa: E402
+from lib.synthetic import DEFAULT_MAC_RANGE, generate_clusterfile, generate_fleet, mac_pool  # noqa: E402
+
+SCHEMA = str(REPO_ROOT / "schema/clusterfile.schema.json")
+
+
+def base_path(name):
+    """name as given if it is a file, else data/<name> or data/<name>.clusterfile."""
+    for candidate in (Path(name), REPO_ROOT / "data" / name, REPO_ROOT / "data" / f"{name}.clusterfile"):
+        if candidate.is_file():
+            return candidate
+    raise FileNotFoundError(f"Error: base clusterfile '{name}' not found (also looked in data/).")
+
+
+def serialize(data, fmt):
+    if fmt == "json":
+        return json.dumps(data, indent=2) + "\n"
+    return dump_yaml(data, sort_keys=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base", help="base clusterfile: a path or a data/ name (start-full, acm, plugin-*...)")
+    parser.add_argument("--hosts", type=int, required=True, help="hosts per clusterfile")
+    parser.add_argument("--interfaces", type=int, help="NICs per host (default: as many as the base host has)")
+    parser.add_argument("--controls", type=int, help="control-plane hosts (default 3, or 1 below 3 hosts)")
+    parser.add_argument("--clusters", type=int, help="write a fleet of this many clusterfiles to the -o directory")
+    parser.add_argument("--name", help="cluster name (fleet: name prefix)")
+    parser.add_argument("--domain", help="base domain")
+    parser.add_argument("--bond", help="bonding mode for network.primary (e.g. 802.3ad, active-backup)")
+    parser.add_argument("--vlan", type=int, help="VLAN ID for network.primary")
+    parser.add_argument("--mac-range", nargs=2, metavar=("START", "END"), default=DEFAULT_MAC_RANGE,
+                        help="MAC range to assign from (default %(default)s)")
+    parser.add_argument("--format", choices=("yaml", "json"), default="yaml", help="output format")
+    parser.add_argument("--no-validate", dest="validate", action="store_false", help="skip schema validation")
+    parser.add_argument("-o", "--output", help="output file (default stdout); with --clusters, a directory")
+    args = parser.parse_args()
+    if args.clusters and not args.output:
+        parser.error("--clusters requires -o DIR")
+
+    base = load_yaml(base_path(args.base).read_text()) or {}
+    options = dict(interfaces=args.interfaces, controls=args.controls, domain=args.domain,
+                   bond=args.bond, vlan=args.vlan, macs=mac_pool(*args.mac_range))
+    start = time.perf_counter()
+    if args.clusters:
+        os.makedirs(args.output, exist_ok=True)
+        clusters = generate_fleet(base, args.clusters, args.hosts, name=args.name, **options)
+    else:
+        clusters = [(None, generate_clusterfile(base, args.hosts, name=args.name, **options))]
+
+    failed = written = hosts = 0
+    for cluster_name, data in clusters:
+        label = cluster_name or args.output or "<stdout>"
+        if args.validate:
+            errors = validate_against_schema(data, SCHEMA)
+            if errors:
+                failed += 1
+                print(f"{label}: {len(errors)} schema error(s)", file=sys.stderr)
+                for error in errors[:5]:
+                    print(f"  {error}", file=sys.stderr)
+        text = serialize(data, args.format)
+        if cluster_name:
+            with open(os.path.join(args.output, f"{cluster_name}.clusterfile"), "w") as fh:
+                fh.write(text)
+        elif args.output:
+            with open(args.output, "w") as fh:
+                fh.write(text)
+        else:
+            sys.stdout.write(text)
+        written += 1
+        hosts += len(data["hosts"])
+    print(f"Generated {written} clusterfile(s), {hosts} hosts in {time.perf_counter() - start:.1f}s"
+          f"{f'; {failed} failed validation' if failed else ''}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -31,8 +31,8 @@ docs: https://github.com/openshift-assisted/cluster-api-provider-openshift-assis
 {%- if hasMirrorRegistries -%}
 {%- set generatedDiscoveryIgnitionOverride %}{% include "includes/disconnected-discovery-ignition-override.json.tpl" %}{% endset -%}
 {%- endif -%}
-{%- set controlCount = hosts.values() | selectattr('role', 'equalto', 'control') | list | length -%}
-{%- set workerCount  = hosts.values() | selectattr('role', 'equalto', 'worker')  | list | length -%}
+{%- set controlCount = facts.roleCounts.control -%}
+{%- set workerCount  = facts.workerCount -%}
 apiVersion: v1
 kind: List
 metadata:
@@ -247,7 +247,7 @@ items:
             role: worker
         pullSecretRef:
           name: "pullsecret-{{ cluster.name }}"
-        sshAuthorizedKey: '{{load_file(cluster.sshKeys|first)|safe}}'{% endif %}{% for name,host in hosts.items() %}{% set shortname=name.split('.')[0] %}
+        sshAuthorizedKey: '{{load_file(cluster.sshKeys|first)|safe}}'{% endif %}{% parallel name, host in hosts.items() %}{% set shortname=name.split('.')[0] %}
 - kind: Secret
   apiVersion: v1
   metadata:
@@ -301,9 +301,9 @@ items:
     bootMode: {{ host.bootMode }}{% endif %}
     automatedCleaningMode: {{ bmIronic.automatedCleaningMode | default('metadata') }}{% if host.bmc %}{%- set bmc %}{% include "includes/bmc.yaml.tpl" %}{% endset %}
     bmc:
-{{ bmc | indent(6, true) }}{% endif %}{% set bootNic = host.network.interfaces | selectattr('name', 'equalto', host.network.primary.ports[0]) | first %}
+{{ bmc | indent(6, true) }}{% endif %}{% set bootNic = facts.bootNic(host) %}
     bootMACAddress: {{ bootNic.macAddress }}
-    online: false{% endfor %}
+    online: false{% endparallel %}
 {%- set pocBanner %}{% include "includes/poc-banner-manifestwork.yaml.tpl" %}{% endset %}
 {{ pocBanner }}{% if isKubevirt %}
 - kind: ManifestWork
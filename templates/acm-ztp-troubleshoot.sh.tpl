@@ -17,8 +17,8 @@ relatedTemplates:
   - acm-creds.yaml.tpl
 docs: https://docs.redhat.com/en/documentation/red_hat_advanced_cluster_management_for_kubernetes/2.11/html/clusters/cluster_mce_overview#ztp-intro
 -#}
-{%- set controlCount = hosts.values() | selectattr('role', 'equalto', 'control') | list | length -%}
-{%- set workerCount  = hosts.values() | selectattr('role', 'equalto', 'worker')  | list | length -%}
+{%- set controlCount = facts.roleCounts.control -%}
+{%- set workerCount  = facts.workerCount -%}
 {%- set enableTPM = cluster.tpm | default(false) -%}
 {%- set hasExtraManifests = cluster.manifests | default(false) or cluster.mirrors | default(false) or enableTPM -%}
 #!/bin/bash
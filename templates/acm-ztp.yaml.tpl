@@ -21,8 +21,8 @@ docs: https://docs.redhat.com/en/documentation/red_hat_advanced_cluster_manageme
 -#}
 {%- set imageArch = cluster.arch | default("x86_64", true) -%}
 {%- set majorMinor = cluster.version.split('.')[:2] | join('.') -%}
-{%- set controlCount = hosts.values() | selectattr('role', 'equalto', 'control') | list | length -%}
-{%- set workerCount  = hosts.values() | selectattr('role', 'equalto', 'worker')  | list | length -%}
+{%- set controlCount = facts.roleCounts.control -%}
+{%- set workerCount  = facts.workerCount -%}
 {%- set enableTPM = cluster.tpm | default(false) -%}
 {%- set enableTang = cluster.diskEncryption is defined and cluster.diskEncryption.type | default("none") == "tang" -%}
 {%- set isKubevirt = (plugins | default({})).kubevirt is defined -%}
@@ -214,7 +214,7 @@ items:
     hubAcceptsClient: true
     leaseDurationSeconds: 60
 # https://nmstate.io/examples.html
-# https://access.redhat.com/solutions/7011711{% for name,host in hosts.items() %}
+# https://access.redhat.com/solutions/7011711{% parallel name, host in hosts.items() %}
 - apiVersion: agent-install.openshift.io/v1beta1
   kind: NMStateConfig
   metadata:
@@ -258,11 +258,11 @@ items:
     bootMode: {{ host.bootMode }}{% endif %}
     automatedCleaningMode: {{ bmIronic.automatedCleaningMode | default('metadata') }}{% if host.bmc %}{%- set bmc %}{% include "includes/bmc.yaml.tpl" %}{% endset %}
     bmc:
-{{ bmc | indent(6, true) }}{% endif %}{% set bootNic = host.network.interfaces | selectattr('name', 'equalto', host.network.primary.ports[0]) | first %}
+{{ bmc | indent(6, true) }}{% endif %}{% set bootNic = facts.bootNic(host) %}
     bootMACAddress: {{ bootNic.macAddress }}
     online: true
     customDeploy:
-      method: start_assisted_install{% endfor %}
+      method: start_assisted_install{% endparallel %}
 - kind: InfraEnv
   apiVersion: agent-install.openshift.io/v1beta1
   metadata:
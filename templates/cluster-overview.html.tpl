@@ -21,8 +21,8 @@ relatedTemplates:
   - pre-check.sh.tpl
 docs: https://docs.openshift.com/container-platform/latest/installing/index.html
 -#}
-{%- set controlHosts = hosts.values() | selectattr('role', 'in', ['control', 'master']) | list -%}
-{%- set workerHosts  = hosts.values() | selectattr('role', 'equalto', 'worker') | list -%}
+{%- set controlHosts = facts.controlHosts -%}
+{%- set workerHosts  = facts.workerHosts -%}
 {%- set platform = cluster.platform | default('baremetal', true) -%}
 {%- set platformNames = {
   'baremetal': 'Bare Metal (Agent-based)',
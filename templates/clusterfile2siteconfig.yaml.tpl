@@ -18,8 +18,8 @@ relatedTemplates:
 docs: https://github.com/stolostron/siteconfig
 -#}
 {%- set bmIronic = (((plugins | default({})).baremetal | default({})).ironic | default({})).host | default({}) -%}
-{%- set controlCount = hosts.values() | selectattr('role', 'equalto', 'control') | list | length -%}
-{%- set workerCount  = hosts.values() | selectattr('role', 'equalto', 'worker')  | list | length -%}
+{%- set controlCount = facts.roleCounts.control -%}
+{%- set workerCount  = facts.workerCount -%}
 {%- set imageArch = cluster.arch | default("x86_64", true) -%}
 {%- set clusterType = cluster.clusterType | default("SNO" if controlCount == 1 else "HighlyAvailable") -%}
 {%- set platformType = cluster.platform | default("BareMetal" if controlCount > 1 else "None", true) -%}
@@ -96,7 +96,7 @@ spec:
       role: {{ 'master' if host.role == 'control' else host.role }}{% if host.bmc is defined %}
       bmcAddress: {% include "includes/bmc-url.yaml.tpl" %}
       bmcCredentialsName:
-        name: bmc-secret-{{ name }}{% endif %}{% set bootNic = host.network.interfaces | selectattr('name', 'equalto', host.network.primary.ports[0]) | first %}
+        name: bmc-secret-{{ name }}{% endif %}{% set bootNic = facts.bootNic(host) %}
       bootMACAddress: {{ bootNic.macAddress }}{% if host.bootMode is defined %}
       bootMode: {{ host.bootMode }}{% endif %}{% if host.storage is defined and host.storage.os is defined %}{% if host.storage.os is string %}
       rootDeviceHints:
@@ -1,4 +1,4 @@
-{%- set pw_hash = load_file(cluster.corePassword) | passwd_hash -%}
+{%- set pw_hash = load_file(cluster.corePassword) | passwd_hash(load_file(cluster.get('corePasswordSalt'))) -%}
 {%- if pw_hash %}
 - apiVersion: machineconfiguration.openshift.io/v1
   kind: MachineConfig
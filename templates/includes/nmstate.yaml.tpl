@@ -1,5 +1,5 @@
-{% set nmstate %}{% set skipMacMapping=true %}{% include "nmstate.config.yaml.tpl" %}{% set skipMacMapping=none %}{% endset -%}
+{% cache host, name, network %}{% set nmstate %}{% set skipMacMapping=true %}{% include "nmstate.config.yaml.tpl" %}{% set skipMacMapping=none %}{% endset -%}
 {{ nmstate | indent(2, true) }}
 interfaces:{% for interface in host.network.interfaces %}
   - name: {{ interface.name }}
-    macAddress: {{ interface.macAddress }}{% endfor %}
+    macAddress: {{ interface.macAddress }}{% endfor %}{% endcache %}
@@ -30,8 +30,8 @@ relatedTemplates:
 docs: https://docs.openshift.com/container-platform/latest/installing/index.html
 yamlWrapper: raw
 -#}
-{%- set controlCount = hosts.values() | selectattr('role', 'in', ['control', 'master']) | list | length -%}
-{%- set workerCount  = hosts.values() | selectattr('role', 'equalto', 'worker') | list | length -%}
+{%- set controlCount = facts.controlCount -%}
+{%- set workerCount  = facts.workerCount -%}
 {%- set platform = cluster.platform | default('baremetal', true) -%}
 {%- set isKubevirt = (plugins | default({})).kubevirt is defined -%}
 {%- set installConfigPlatform = 'none' if isKubevirt and controlCount == 1 and workerCount == 0 else platform -%}
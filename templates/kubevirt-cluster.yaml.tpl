@@ -37,7 +37,7 @@ docs: https://docs.openshift.com/container-platform/4.20/virt/about_virt/about-v
 {%- set netRef = netName if netType == "nad" and "/" in netName else namespace ~ "/" ~ netName -%}
 {%- set enableTPM = cluster.tpm | default(false) -%}
 {%- set performanceSC = kvsc.performance | default(defaultSC) -%}
-{%- set controlCount = hosts.values() | selectattr('role', 'equalto', 'control') | list | length -%}
+{%- set controlCount = facts.roleCounts.control -%}
 {%- set nsKey = kv.nodeSelector | default("") -%}
 {%- set bootDelivery = bootDelivery | default("bmc") -%}
 {%- set hasIsoDisk = true if bootDelivery == 'iso' else false -%}
@@ -0,0 +1,98 @@
+"""
+Shared fixtures and helpers for the tests in this directory.
+"""
+import os
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path for imports
+sys.path.insert(0, REPO)
+
+
+# --- Cluster data ---
+
+def base_cluster_data():
+    """Return base cluster configuration common to all platforms."""
+    return {
+        'account': {
+            'pullSecret': 'secrets/pull-secret.json'
+        },
+        'cluster': {
+            'name': 'test-cluster',
+            'version': '4.18.0',
+            'arch': 'x86_64',
+            'location': 'us-east-1',
+            'sshKeys': ['secrets/id_rsa.pub']
+        },
+        'network': {
+            'domain': 'example.com',
+            'primary': {
+                'subnet': '10.0.0.0/16',
+                'type': 'OVNKubernetes'
+            },
+            'cluster': {
+                'subnet': '10.128.0.0/14',
+                'hostPrefix': 23
+            },
+            'service': {
+                'subnet': '172.30.0.0/16'
+            }
+        },
+        'hosts': {
+            'control-0.test-cluster.example.com': {'role': 'control'},
+            'control-1.test-cluster.example.com': {'role': 'control'},
+            'control-2.test-cluster.example.com': {'role': 'control'},
+            'worker-0.test-cluster.example.com': {'role': 'worker'},
+            'worker-1.test-cluster.example.com': {'role': 'worker'},
+            'worker-2.test-cluster.example.com': {'role': 'worker'}
+        },
+        'plugins': {}
+    }
+
+
+def ztp_host_data(data):
+    """Enrich all hosts in data with BMC/network/storage for ZTP template rendering."""
+    data.setdefault('network', {}).setdefault('primary', {}).setdefault('vips', {'api': '10.0.0.2', 'apps': '10.0.0.3'})
+    for host in data['hosts'].values():
+        host['bmc'] = {'vendor': 'dell', 'version': 9, 'address': '10.0.1.1', 'macAddress': 'aa:bb:cc:dd:ee:ff', 'username': 'root', 'password': 'pw'}
+        host['network'] = {'interfaces': [{'name': 'eth0', 'macAddress': 'aa:bb:cc:dd:ee:01'}], 'primary': {'address': '10.0.0.10', 'ports': ['eth0']}}
+        host['storage'] = {'os': {'deviceName': '/dev/sda'}}
+    return data
+
+
+# --- Fixtures ---
+
+@pytest.fixture
+def repo():
+    """Path of the repository root."""
+    return REPO
+
+
+@pytest.fixture
+def tpl():
+    """Path of a template under templates/."""
+    return lambda name: os.path.join(REPO, 'templates', name)
+
+
+@pytest.fixture
+def cluster_data():
+    """A fresh copy of base_cluster_data()."""
+    return base_cluster_data()
+
+
+@pytest.fixture
+def ztp_data():
+    """base_cluster_data() with BMC, network and storage on every host, for ZTP templates."""
+    return ztp_host_data(base_cluster_data())
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Point CLUSTERFILE_CACHE_DIR at an empty directory and make sure caching is on."""
+    path = tmp_path / 'cache'
+    monkeypatch.setenv('CLUSTERFILE_CACHE_DIR', str(path))
+    monkeypatch.delenv('CLUSTERFILE_NO_CACHE', raising=False)
+    return path
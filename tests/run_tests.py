@@ -11,6 +11,9 @@ import traceback
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from jinja2 import Environment, FileSystemLoader
+from lib.fragments import FragmentCacheExtension
+from lib.parallel import ParallelLoopExtension
+from lib.render import FactsTemplate
 
 
 class TestRunner:
@@ -52,7 +55,9 @@ def create_template_env():
     plugins_tpl  = os.path.join(template_dir, 'plugins')
     plugins_root = os.path.join(os.path.dirname(template_dir), 'plugins')
 
-    env = Environment(loader=FileSystemLoader([template_dir, includes_dir, plugins_tpl, plugins_root]))
+    env = Environment(loader=FileSystemLoader([template_dir, includes_dir, plugins_tpl, plugins_root]),
+                      extensions=[FragmentCacheExtension, ParallelLoopExtension])
+    env.template_class = FactsTemplate
 
     def load_file(path):
         if not path or not isinstance(path, str):
@@ -84,7 +89,7 @@ def create_template_env():
     def as_list(v):
         return [v] if isinstance(v, str) else list(v)
 
-    def passwd_hash(password):
+    def passwd_hash(password, *args):
         if not password or not isinstance(password, str):
             return ""
         if password.startswith("<") and password.endswith(">"):
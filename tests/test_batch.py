@@ -0,0 +1,53 @@
+"""
+Tests for process.py batch mode (several templates, one data load).
+"""
+import os
+
+import pytest
+
+import process
+from process import expand_related_templates, output_name, render_batch, render_file
+
+
+class TestBatchRender:
+    """render_batch, --related expansion and output naming."""
+
+    def test_related_closure_expands_transitively(self, tpl):
+        files = [os.path.basename(p) for p in expand_related_templates([tpl('install-config.yaml.tpl')])]
+        assert files[0] == 'install-config.yaml.tpl'
+        assert 'agent-config.yaml.tpl' in files
+        assert 'pre-check.sh.tpl' in files
+        # pre-check.sh.tpl lists its own module scripts, pulled in transitively
+        assert 'pre-check-dns.sh.tpl' in files
+        assert len(files) == len(set(files))
+
+    def test_batch_matches_single_renders(self, tmp_path, cluster_data, tpl):
+        cluster_data['cluster']['platform'] = 'none'
+        templates = [tpl('install-config.yaml.tpl'), tpl('pre-check.sh.tpl')]
+        results = render_batch(cluster_data, templates, None, str(tmp_path))
+        assert [r[3] for r in results] == [None, None]
+        for template_file, out_path, _, _ in results:
+            single = render_file(cluster_data, template_file, None, [])
+            assert open(out_path).read() == single + '\n'
+
+    def test_failure_is_isolated(self, tmp_path, cluster_data, tpl):
+        bad = tmp_path / 'bad.yaml.tpl'
+        bad.write_text('x: {{ broken(')
+        results = render_batch(cluster_data, [str(bad), tpl('creds.yaml.tpl')], None, str(tmp_path / 'out'))
+        assert results[0][1] is None and results[0][3] is not None
+        assert results[1][3] is None and os.path.isfile(results[1][1])
+
+    def test_output_name_disambiguates_collisions(self):
+        taken = set()
+        assert output_name('plugins/operators/lvm/manifests.yaml.tpl', taken) == 'manifests.yaml'
+        assert output_name('plugins/operators/odf/manifests.yaml.tpl', taken) == 'odf-manifests.yaml'
+
+    def test_single_template_yaml_error_on_stdout(self, tmp_path, capsys):
+        bad = tmp_path / 'bad.yaml.tpl'
+        bad.write_text('name: {{ cluster.name }}\nlist: [1\n')
+        with pytest.raises(SystemExit) as exc:
+            process.main(['--no-cache', '{"cluster": {}}', str(bad)])
+        assert exc.value.code == 1
+        out, err = capsys.readouterr()
+        assert out.startswith('while parsing a flow sequence\n  in "<unicode string>", line 2, column 7:\n')
+        assert err == "WARNING: name undefined, substituted 'CHANGEME'\n"
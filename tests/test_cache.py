@@ -0,0 +1,102 @@
+"""
+Tests for the caches in lib/cache: compiled templates and load_file contents.
+"""
+import os
+
+from lib.cache import FileCache, TemplateBytecodeCache, evict_lru, open_bytecode_cache
+from lib.render import file_references
+from process import process_template
+
+
+class TestBytecodeCache:
+    """TemplateBytecodeCache and its eviction."""
+
+    def render(self, cache, data, tpl, template='install-config.yaml.tpl'):
+        data['cluster']['platform'] = 'none'
+        return process_template(data, tpl(template), 'test.clusterfile', cache)
+
+    def test_second_render_hits_cache(self, tmp_path, cluster_data, tpl):
+        first = TemplateBytecodeCache(str(tmp_path))
+        out1, _ = self.render(first, cluster_data, tpl)
+        assert first.misses > 0 and first.hits == 0
+        second = TemplateBytecodeCache(str(tmp_path))
+        out2, _ = self.render(second, cluster_data, tpl)
+        assert second.misses == 0 and second.hits == first.misses
+        assert out1 == out2
+
+    def test_changed_source_misses(self, tmp_path):
+        tpl_dir = tmp_path / 'templates'
+        tpl_dir.mkdir()
+        (tpl_dir / 'a.tpl').write_text('{% include "b.tpl" %}')
+        (tpl_dir / 'b.tpl').write_text('one')
+        cache_dir = str(tmp_path / 'cache')
+        cache = TemplateBytecodeCache(cache_dir)
+        assert process_template({}, str(tpl_dir / 'a.tpl'), None, cache)[0] == 'one'
+        (tpl_dir / 'b.tpl').write_text('two')
+        cache = TemplateBytecodeCache(cache_dir)
+        assert process_template({}, str(tpl_dir / 'a.tpl'), None, cache)[0] == 'two'
+        assert cache.hits == 1 and cache.misses == 1
+
+    def test_size_cap_evicts_least_recently_used(self, tmp_path):
+        for i, name in enumerate(['old', 'mid', 'new']):
+            p = tmp_path / f'{name}.jinjabc'
+            p.write_bytes(b'x' * 100)
+            os.utime(p, (1000 + i, 1000 + i))
+        assert evict_lru(str(tmp_path), 250, '.jinjabc') == 1
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['mid.jinjabc', 'new.jinjabc']
+
+    def test_corrupt_entry_is_a_miss(self, tmp_path, cluster_data, tpl):
+        self.render(TemplateBytecodeCache(str(tmp_path)), cluster_data, tpl)
+        for p in tmp_path.iterdir():
+            p.write_bytes(b'garbage')
+        cache = TemplateBytecodeCache(str(tmp_path))
+        self.render(cache, cluster_data, tpl)
+        assert cache.hits == 0 and cache.misses > 0
+
+    def test_disabled_by_environment(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('CLUSTERFILE_NO_CACHE', '1')
+        assert open_bytecode_cache(str(tmp_path)) is None
+        monkeypatch.setenv('CLUSTERFILE_NO_CACHE', '0')
+        assert open_bytecode_cache(str(tmp_path)) is not None
+
+
+class TestFileCache:
+    """Tests for the load_file content cache and clusterfile prefetch."""
+
+    def test_hit_until_file_changes(self, tmp_path):
+        p = tmp_path / 'pull-secret.json'
+        p.write_text('{"auths":{}}\n')
+        cache = FileCache()
+        assert cache.read(str(p)) == '{"auths":{}}\n'
+        assert cache.read(str(p)) == '{"auths":{}}\n'
+        assert (cache.hits, cache.misses) == (1, 1)
+        p.write_text('{"auths":{"changed":{}}}\n')
+        assert 'changed' in cache.read(str(p))
+        assert cache.read(str(tmp_path / 'missing')) is None
+
+    def test_large_files_read_through_mmap_match_text_mode(self, tmp_path, monkeypatch):
+        p = tmp_path / 'ca-bundle.pem'
+        p.write_bytes(b'-----BEGIN CERTIFICATE-----\r\nMIID\r\n-----END CERTIFICATE-----\r\n' * 100)
+        expected = FileCache().read(str(p))
+        monkeypatch.setattr(FileCache, 'mmap_threshold', 1)
+        assert FileCache().read(str(p)) == expected
+        assert '\r' not in expected
+
+    def test_prefetch_warms_cache(self, tmp_path):
+        paths = []
+        for i in range(20):
+            p = tmp_path / f'bmc-{i}.txt'
+            p.write_text(f'password-{i}')
+            paths.append(str(p))
+        cache = FileCache()
+        cache.prefetch(paths + [str(tmp_path / 'missing.txt')])
+        assert cache.misses == 20
+        assert [cache.read(p) for p in paths] == [f'password-{i}' for i in range(20)]
+        assert cache.hits == 20
+
+    def test_file_references_finds_static_paths(self, cluster_data):
+        cluster_data['cluster']['sshKeys'] = ['a.pub', 'b.pub']
+        cluster_data['hosts']['control-0.test-cluster.example.com']['bmc'] = {'password': 'bmc0.txt'}
+        cluster_data['plugins'] = {'vsphere': {'vcenter': {'password': 'vc.txt'}}}
+        refs = file_references(cluster_data)
+        assert set(refs) == {'secrets/pull-secret.json', 'a.pub', 'b.pub', 'bmc0.txt', 'vc.txt'}
@@ -0,0 +1,119 @@
+"""
+Tests for the process.py --daemon Unix socket mode.
+"""
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+import yaml
+
+import lib.daemon
+from lib.daemon import request, serve, socket_path, trusted_socket
+from process import serve_request
+
+
+class TestRenderDaemon:
+    """serve_request, the lib/daemon client and the CLI round trip."""
+
+    def test_serve_request_captures_output_and_exit(self, repo):
+        code, out, err = serve_request(['data/start-sno.clusterfile', 'templates/install-config.yaml.tpl'], repo)
+        assert code == 0
+        assert yaml.safe_load(out)['metadata']['name'] == '<cluster-name>'
+        code, out, err = serve_request(['data/start-sno.clusterfile'], repo)
+        assert code == 2 and 'template_file' in err
+
+    def test_client_falls_back_without_daemon(self, tmp_path):
+        assert request(['x'], path=str(tmp_path / 'missing.sock')) is None
+        (tmp_path / 'stale.sock').write_text('')
+        assert request(['x'], path=str(tmp_path / 'stale.sock')) is None
+
+    def test_cli_uses_running_daemon(self, tmp_path, repo):
+        sock = str(tmp_path / 'render.sock')
+        env = dict(os.environ, CLUSTERFILE_SOCKET=sock, CLUSTERFILE_CACHE_DIR=str(tmp_path / 'cache'))
+        args = ['data/start-sno.clusterfile', 'templates/install-config.yaml.tpl']
+        daemon = subprocess.Popen([sys.executable, 'process.py', '--daemon'], cwd=repo, env=env,
+                                  stderr=subprocess.PIPE)
+        try:
+            for _ in range(100):
+                if os.path.exists(sock):
+                    break
+                time.sleep(0.05)
+            served = subprocess.run([sys.executable, 'lib/daemon.py'] + args, cwd=repo, env=env,
+                                    capture_output=True, text=True)
+            assert served.returncode == 0
+            direct = subprocess.run([sys.executable, 'process.py'] + args, cwd=repo,
+                                    env=dict(env, CLUSTERFILE_NO_DAEMON='1'), capture_output=True, text=True)
+            assert served.stdout == direct.stdout
+            assert served.stderr == direct.stderr
+        finally:
+            daemon.terminate()
+            daemon.wait(timeout=10)
+        assert not os.path.exists(sock)
+        fallback = subprocess.run([sys.executable, 'lib/daemon.py'] + args, cwd=repo, env=env)
+        assert fallback.returncode == 75
+
+    def test_only_private_sockets_are_trusted(self, tmp_path):
+        run = tmp_path / 'run'
+        run.mkdir(mode=0o700)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+            listener.bind(str(run / 'render.sock'))
+            assert trusted_socket(str(run / 'render.sock'))
+            os.symlink(run / 'render.sock', run / 'link.sock')
+            assert not trusted_socket(str(run / 'link.sock'))
+            run.chmod(0o1777)  # e.g. /tmp: anyone could have created it
+            assert not trusted_socket(str(run / 'render.sock'))
+            assert request(['x'], path=str(run / 'render.sock'), timeout=1) is None
+        (tmp_path / 'file.sock').write_text('')
+        assert not trusted_socket(str(tmp_path / 'file.sock'))
+
+    def test_serve_refuses_shared_directory(self, tmp_path):
+        shared = tmp_path / 'shared'
+        shared.mkdir()
+        shared.chmod(0o777)
+        with pytest.raises(RuntimeError, match='writable by other users'):
+            serve(lambda argv, cwd: (0, '', ''), str(shared / 'render.sock'))
+
+    def test_client_gives_up_on_a_hung_daemon(self, tmp_path, monkeypatch):
+        run = tmp_path / 'run'
+        run.mkdir(mode=0o700)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+            listener.bind(str(run / 'render.sock'))
+            listener.listen(1)  # accepts connections but never answers
+            start = time.monotonic()
+            assert request(['x'], path=str(run / 'render.sock'), timeout=0.5) is None
+            monkeypatch.setenv('CLUSTERFILE_DAEMON_TIMEOUT', '0.5')
+            assert request(['x'], path=str(run / 'render.sock')) is None
+            assert time.monotonic() - start < 5
+
+    def test_silent_client_does_not_stall_daemon(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(lib.daemon, 'REQUEST_TIMEOUT', 0.5)
+        sock = str(tmp_path / 'run' / 'render.sock')
+
+        def handler(argv, cwd):
+            if argv == ['stop']:
+                raise KeyboardInterrupt
+            return 0, ' '.join(argv), ''
+        daemon = threading.Thread(target=serve, args=(handler, sock), daemon=True)
+        daemon.start()
+        try:
+            for _ in range(100):
+                if os.path.exists(sock):
+                    break
+                time.sleep(0.05)
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as silent:
+                silent.connect(sock)
+                silent.sendall(b'{"argv": ')  # never finishes its request line
+                assert request(['render', 'me'], path=sock, timeout=5) == (0, 'render me', '')
+        finally:
+            request(['stop'], path=sock, timeout=5)
+            daemon.join(timeout=10)
+        assert not daemon.is_alive()
+
+    def test_default_socket_in_private_directory(self, monkeypatch):
+        monkeypatch.delenv('CLUSTERFILE_SOCKET', raising=False)
+        monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+        assert socket_path() == f'/tmp/clusterfile-{os.getuid()}/daemon.sock'
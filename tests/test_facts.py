@@ -0,0 +1,61 @@
+"""
+Tests for derived facts (lib/render ClusterFacts) injected into the render context.
+"""
+import process
+from lib.render import ClusterFacts, collect_missing, derive_facts, with_facts
+from lib.trace import DataTrace
+from process import process_template
+
+
+class TestClusterFacts:
+    """derive_facts, with_facts and their use in renders."""
+
+    def test_facts_match_template_expressions(self, ztp_data):
+        data = ztp_data
+        data['hosts']['master-x'] = {'role': 'master'}
+        data['hosts']['odd'] = 'not a host'
+        facts = derive_facts(data)
+        hosts = list(data['hosts'].values())
+        assert facts.roleCounts['control'] == sum(1 for h in hosts if isinstance(h, dict) and h.get('role') == 'control')
+        assert facts.roleCounts['bootstrap'] == 0
+        assert facts.controlCount == facts.roleCounts['control'] + 1
+        assert facts.controlHosts[-1] is data['hosts']['master-x']
+        assert facts.workerCount == len(facts.workerHosts)
+        assert facts.primaryPrefix == int(data['network']['primary']['subnet'].split('/')[-1])
+
+    def test_boot_nic(self, tmp_path, ztp_data):
+        env = process.build_environment(str(tmp_path), str(tmp_path))
+        boot_nic = env.from_string('{{ facts.bootNic(host).name }}')
+        host = next(iter(ztp_data['hosts'].values()))
+        port = host['network']['primary']['ports'][0]
+        assert boot_nic.render(ztp_data, host=host) == port
+        assert boot_nic.render(ztp_data, host=dict(host)) == port  # any host, not only the clusterfile's own
+        with collect_missing() as missing:
+            boot_nic.render(ztp_data, host={'role': 'worker'})
+        assert {'network.interfaces', 'network.primary.ports'} <= set(missing)  # reported as by the template
+
+    def test_context_always_has_facts(self):
+        assert derive_facts(['not', 'a', 'mapping']) is None
+        facts = with_facts({'cluster': {}})['facts']
+        assert (facts.controlCount, facts.workerHosts, facts.primaryPrefix) == (0, [], 24)
+        assert isinstance(with_facts({'hosts': {}, 'facts': 'not ours'})['facts'], ClusterFacts)
+        context = with_facts({'hosts': {}})
+        assert with_facts(context) is context
+
+    def test_every_render_path_has_facts(self, tmp_path, cluster_data):
+        tpl = tmp_path / 'count.tpl'
+        tpl.write_text('{% include "part.tpl" %}')
+        (tmp_path / 'part.tpl').write_text('{{ facts.controlCount }}/{{ facts.workerCount }}')
+        assert process_template(cluster_data, str(tpl), None)[0] == '3/3'
+        assert process_template(cluster_data, str(tpl), None, trace=DataTrace())[0] == '3/3'
+        env = process.build_environment(str(tmp_path), str(tmp_path))
+        assert ''.join(env.get_template('count.tpl').generate(cluster_data)) == '3/3'
+
+    def test_batch_derives_facts_once(self, tmp_path, monkeypatch, cluster_data, tpl):
+        calls = []
+        derive = process.derive_facts
+        monkeypatch.setattr(process, 'derive_facts', lambda data: calls.append(1) or derive(data))
+        templates = [tpl('install-config.yaml.tpl'), tpl('agent-config.yaml.tpl')]
+        results = process.render_batch(cluster_data, templates, None, str(tmp_path))
+        assert [r[3] for r in results] == [None, None]
+        assert len(calls) == 1
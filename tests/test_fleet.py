@@ -0,0 +1,98 @@
+"""
+Tests for process.py fleet mode (many clusterfiles on a process pool).
+"""
+import json
+import os
+import subprocess
+import sys
+from multiprocessing.pool import ThreadPool
+
+import pytest
+import yaml
+
+from process import _imap_bounded, build_environment, preload_templates, render_fleet
+
+
+@pytest.fixture
+def fleet(tmp_path, cluster_data):
+    """A directory of three clusterfiles, site0..site2, plus one that does not parse."""
+    fleet = tmp_path / 'fleet'
+    fleet.mkdir()
+    cluster_data['cluster']['platform'] = 'none'
+    for i in range(3):
+        cluster_data['cluster']['name'] = f'site{i}'
+        (fleet / f'site{i}.clusterfile').write_text(yaml.safe_dump(cluster_data))
+    (fleet / 'broken.clusterfile').write_text('cluster: [unclosed')
+    return fleet
+
+
+class TestFleetRender:
+    """render_fleet and its worker setup."""
+
+    @pytest.mark.parametrize('jobs', [1, 2])
+    def test_renders_every_cluster_and_isolates_errors(self, tmp_path, fleet, tpl, jobs):
+        out = tmp_path / 'out'
+        results = {os.path.basename(c): (r, e)
+                   for c, r, e in render_fleet(str(fleet), [tpl('install-config.yaml.tpl')], str(out), jobs=jobs)}
+        assert sorted(results) == ['broken.clusterfile', 'site0.clusterfile', 'site1.clusterfile', 'site2.clusterfile']
+        assert results['broken.clusterfile'][1] is not None
+        for i in range(3):
+            rendered = yaml.safe_load((out / f'site{i}' / 'install-config.yaml').read_text())
+            assert rendered['metadata']['name'] == f'site{i}'
+
+    def test_glob_and_params(self, tmp_path, fleet, tpl):
+        out = tmp_path / 'out'
+        list(render_fleet(str(fleet / 'site*.clusterfile'), [tpl('install-config.yaml.tpl')], str(out),
+                          params=['network.domain=fleet.example.com'], jobs=1))
+        rendered = yaml.safe_load((out / 'site1' / 'install-config.yaml').read_text())
+        assert rendered['baseDomain'] == 'fleet.example.com'
+
+    def test_same_name_in_two_directories_is_refused(self, tmp_path, fleet, tpl):
+        (tmp_path / 'other').mkdir()
+        (tmp_path / 'other' / 'site0.yaml').write_text((fleet / 'site0.clusterfile').read_text())
+        out = tmp_path / 'out'
+        with pytest.raises(ValueError, match='would both write to .*site0/'):
+            list(render_fleet(str(tmp_path / '*' / 'site0.*'), [tpl('install-config.yaml.tpl')], str(out), jobs=1))
+        assert not out.exists()
+
+    def test_cli_with_one_template(self, tmp_path, fleet, tpl, repo):
+        (fleet / 'broken.clusterfile').unlink()
+        run = subprocess.run([sys.executable, os.path.join(repo, 'process.py'), '--fleet', str(fleet),
+                              tpl('install-config.yaml.tpl'), '-o', str(tmp_path / 'out'), '-j', '1', '--lint', 'off'],
+                             capture_output=True, text=True, cwd=str(tmp_path))
+        assert run.returncode == 0, run.stderr
+        assert 'Fleet: 3/3 clusters rendered' in run.stderr
+        assert (tmp_path / 'out' / 'site2' / 'install-config.yaml').exists()
+
+    def test_preload_follows_static_includes(self, repo):
+        env = build_environment(os.path.join(repo, 'templates'), repo)
+        loaded = preload_templates(env, ['acm-ztp.yaml.tpl'])
+        assert 'nmstate.config.yaml.tpl' in loaded or 'includes/nmstate.config.yaml.tpl' in loaded
+
+    @pytest.mark.parametrize('scope,failed', [('data', ['site1']), ('data+params', ['site0', 'site1'])])
+    def test_validate_scope(self, tmp_path, fleet, tpl, scope, failed):
+        (tmp_path / 'plugins').mkdir()
+        (tmp_path / 'schema').mkdir()
+        schema = tmp_path / 'schema' / 'clusterfile.schema.json'
+        schema.write_text(json.dumps({'type': 'object', 'properties': {'cluster': {
+            'type': 'object', 'properties': {'name': {'type': 'string', 'maxLength': 5}}}}}))
+        (fleet / 'site1.clusterfile').write_text((fleet / 'site1.clusterfile').read_text().replace('site1', 'too-long'))
+        params = ['cluster.name=longer-than-five']
+        errors = {os.path.basename(c): e for c, _, e in render_fleet(
+            str(fleet / 'site[01].clusterfile'), [tpl('install-config.yaml.tpl')], str(tmp_path / 'out'),
+            params=params, schema=str(schema), jobs=1, validate_scope=scope)}
+        assert sorted(name[:-12] for name, e in errors.items() if e) == failed
+        assert errors['site1.clusterfile'].startswith('schema validation failed (data file): ')
+
+    def test_paths_fed_in_bounded_batches(self):
+        taken = []
+
+        def paths():
+            for i in range(20):
+                taken.append(i)
+                yield i
+        with ThreadPool(2) as pool:
+            results = _imap_bounded(pool, lambda i: i * i, paths(), 4)
+            first = next(results)
+            assert len(taken) == 4
+            assert sorted([first] + list(results)) == [i * i for i in range(20)]
@@ -0,0 +1,63 @@
+"""
+Tests for {% cache %} fragments (lib/fragments) memoized across renders.
+"""
+import os
+
+from jinja2 import Environment, FileSystemLoader
+
+from lib.fragments import FRAGMENT_CACHE, FragmentCacheExtension
+from lib.render import LoggingUndefined, collect_missing
+from process import render_batch
+
+
+class TestFragmentCache:
+    """FragmentCacheExtension keys, warning replay and invalidation."""
+
+    def env(self, path):
+        env = Environment(loader=FileSystemLoader(str(path)), undefined=LoggingUndefined,
+                          extensions=[FragmentCacheExtension])
+        calls = []
+        env.globals['count'] = lambda: calls.append(1) or len(calls)
+        return env, calls
+
+    def test_body_renders_once_per_key(self, tmp_path):
+        (tmp_path / 'frag.tpl').write_text("{% cache host, 'tbrok' %}{{ host.name }}:{{ count() }}{% endcache %}")
+        env, calls = self.env(tmp_path)
+        tpl = env.get_template('frag.tpl')
+        assert tpl.render(host={'name': 'a'}) == 'a:1'
+        assert tpl.render(host={'name': 'a'}) == 'a:1'
+        assert tpl.render(host={'name': 'b'}) == 'b:2'
+        assert len(calls) == 2
+
+    def test_warnings_replayed_on_hit(self, tmp_path):
+        (tmp_path / 'frag.tpl').write_text("{% cache host, 'twroh' %}{{ host.bmc.address }}{% endcache %}")
+        env, _ = self.env(tmp_path)
+        for _ in range(2):
+            with collect_missing() as missing:
+                assert env.get_template('frag.tpl').render(host={'name': 'a'}) == 'CHANGEME'
+            assert set(missing) == {'bmc.address'}
+
+    def test_edited_include_invalidates(self, tmp_path):
+        (tmp_path / 'frag.tpl').write_text("{% cache 'teii' %}{% include 'part.tpl' %}{% endcache %}")
+        (tmp_path / 'part.tpl').write_text("one")
+        env, _ = self.env(tmp_path)
+        assert env.get_template('frag.tpl').render() == 'one'
+        (tmp_path / 'part.tpl').write_text("two")
+        os.utime(tmp_path / 'part.tpl', (1, 1))
+        assert env.get_template('frag.tpl').render() == 'two'
+
+    def test_batch_output_same_as_uncached(self, tmp_path, monkeypatch, ztp_data, tpl):
+        data = ztp_data
+        data['cluster']['platform'] = 'baremetal'
+        for host in data['hosts'].values():
+            host['bmc']['vendor'] = 'hpe'
+        templates = [tpl(name) for name in ('agent-config.yaml.tpl', 'nodes-config.yaml.tpl', 'acm-ztp.yaml.tpl',
+                                            'clusterfile2siteconfig.yaml.tpl')]
+        hits = FRAGMENT_CACHE.hits
+        cached = render_batch(data, templates, None, str(tmp_path / 'cached'))
+        assert FRAGMENT_CACHE.hits - hits >= 2 * len(data['hosts'])
+        monkeypatch.setenv('CLUSTERFILE_NO_CACHE', '1')
+        plain = render_batch(data, templates, None, str(tmp_path / 'plain'))
+        for a, b in zip(cached, plain):
+            assert a[3] is None and a[2] == b[2]
+            assert open(a[1]).read() == open(b[1]).read()
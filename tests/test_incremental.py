@@ -0,0 +1,116 @@
+"""
+Tests for the dependency graph and output cache behind --incremental (lib/incremental).
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+import yaml
+from jinja2 import Environment
+
+from lib.incremental import DependencyGraph, OutputCache, data_paths
+from process import FILE_CACHE, build_environment, render_batch, render_fleet
+
+
+@pytest.fixture
+def outputs(cache_dir):
+    return OutputCache(str(cache_dir / 'outputs'), read_file=FILE_CACHE.read)
+
+
+class TestIncrementalRender:
+    """DependencyGraph, OutputCache and --incremental batch, fleet and CLI runs."""
+
+    def test_data_paths_narrow_constant_access(self):
+        ast = Environment().parse(
+            "{{ cluster.network['primary'].vlan }}{{ cluster.get('name', fallback.x) }}"
+            "{% for h in hosts.items() %}{{ h }}{% endfor %}{{ plugins[key] }}")
+        assert data_paths(ast) >= {('cluster', 'network', 'primary', 'vlan'), ('cluster', 'name'),
+                                   ('fallback', 'x'), ('hosts',), ('plugins',), ('key',)}
+        assert ('h',) in data_paths(ast) and ('hosts', 'items') not in data_paths(ast)
+
+    def test_facts_depend_on_hosts_and_network(self, tmp_path, outputs, cluster_data):
+        assert data_paths(Environment().parse("{{ facts.workerCount }}{{ facts.bootNic(h) }}")) == \
+            {('hosts',), ('network',), ('h',)}
+        tpl = tmp_path / 'workers.tpl'
+        tpl.write_text('{{ facts.workerCount }}')
+        render_batch(cluster_data, [str(tpl)], None, str(tmp_path / 'out'), outputs=outputs)
+        cluster_data['hosts']['worker-9'] = {'role': 'worker'}
+        result = render_batch(cluster_data, [str(tpl)], None, str(tmp_path / 'out'), outputs=outputs)[0]
+        assert not result.skipped
+        assert open(result[1]).read() == '4\n'
+
+    def test_dynamic_include_expands_to_every_platform(self, repo):
+        graph = DependencyGraph(build_environment(os.path.join(repo, 'templates'), repo))
+        closure = graph.closure('install-config.yaml.tpl')
+        assert 'platforms/aws/platform.yaml.tpl' in closure
+        assert 'platforms/vsphere/controlPlane.yaml.tpl' in closure
+
+    def test_second_run_skips_and_changed_data_rebuilds(self, tmp_path, outputs, cluster_data, tpl):
+        data = cluster_data
+        data['cluster']['platform'] = 'none'
+        templates = [tpl('install-config.yaml.tpl'), tpl('creds.yaml.tpl')]
+        first = render_batch(data, templates, None, str(tmp_path / 'out'), outputs=outputs)
+        assert [r.skipped for r in first] == [False, False]
+        second = render_batch(data, templates, None, str(tmp_path / 'out'), outputs=outputs)
+        assert [r.skipped for r in second] == [True, True]
+        assert [r.messages for r in second] == [r.messages for r in first]
+        data['network']['domain'] = 'changed.example.com'
+        third = render_batch(data, templates, None, str(tmp_path / 'out'), outputs=outputs)
+        assert third[0].skipped is False
+        assert 'changed.example.com' in (tmp_path / 'out' / 'install-config.yaml').read_text()
+
+    def test_loaded_file_change_rebuilds(self, tmp_path, outputs, cluster_data, tpl):
+        secret = tmp_path / 'pull-secret.json'
+        secret.write_text('{"auths": {"a": {}}}')
+        data = cluster_data
+        data['cluster']['platform'] = 'none'
+        data['account'] = {'pullSecret': str(secret)}
+        template = [tpl('install-config.yaml.tpl')]
+        render_batch(data, template, None, str(tmp_path / 'out'), outputs=outputs)
+        assert render_batch(data, template, None, str(tmp_path / 'out'), outputs=outputs)[0].skipped
+        secret.write_text('{"auths": {"b": {}}}')
+        result = render_batch(data, template, None, str(tmp_path / 'out'), outputs=outputs)[0]
+        assert not result.skipped
+        assert '"b"' in (tmp_path / 'out' / 'install-config.yaml').read_text()
+
+    def test_template_change_rebuilds(self, tmp_path, outputs):
+        (tmp_path / 'part.tpl').write_text('one')
+        (tmp_path / 'main.tpl').write_text('{% include "part.tpl" %}')
+        template = [str(tmp_path / 'main.tpl')]
+        render_batch({}, template, None, str(tmp_path / 'out'), outputs=outputs)
+        (tmp_path / 'part.tpl').write_text('two')
+        result = render_batch({}, template, None, str(tmp_path / 'out'), outputs=outputs)[0]
+        assert not result.skipped
+        assert (tmp_path / 'out' / 'main').read_text() == 'two\n'
+
+    @pytest.mark.parametrize('jobs', [1, 2])
+    def test_fleet_reports_skipped(self, tmp_path, outputs, cluster_data, tpl, jobs):
+        fleet = tmp_path / 'fleet'
+        fleet.mkdir()
+        cluster_data['cluster']['platform'] = 'none'
+        for i in range(2):
+            cluster_data['cluster']['name'] = f'site{i}'
+            (fleet / f'site{i}.clusterfile').write_text(yaml.safe_dump(cluster_data))
+        template = [tpl('install-config.yaml.tpl')]
+
+        def run():
+            return {os.path.basename(c): r for c, r, _ in
+                    render_fleet(str(fleet), template, str(tmp_path / 'out'), jobs=jobs, outputs=outputs)}
+        assert not any(r[0].skipped for r in run().values())
+        (fleet / 'site1.clusterfile').write_text((fleet / 'site1.clusterfile').read_text().replace('site1', 'site9'))
+        results = run()
+        assert results['site0.clusterfile'][0].skipped and not results['site1.clusterfile'][0].skipped
+
+    def test_cli_reports_rebuilt_and_up_to_date(self, tmp_path, cache_dir, cluster_data, repo, tpl):
+        cluster_data['cluster']['platform'] = 'none'
+        args = [json.dumps(cluster_data), tpl('install-config.yaml.tpl'), tpl('creds.yaml.tpl'),
+                '-o', str(tmp_path / 'out'), '--incremental', '--lint', 'off']
+        first = subprocess.run([sys.executable, os.path.join(repo, 'process.py')] + args,
+                               capture_output=True, text=True, cwd=str(tmp_path))
+        assert 'Incremental: 2 rebuilt, 0 up to date' in first.stderr
+        second = subprocess.run([sys.executable, os.path.join(repo, 'process.py')] + args,
+                                capture_output=True, text=True, cwd=str(tmp_path))
+        assert 'Incremental: 0 rebuilt, 2 up to date' in second.stderr
+        assert 'install-config.yaml (up to date)' in second.stderr
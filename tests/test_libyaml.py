@@ -0,0 +1,59 @@
+"""
+Tests for the libyaml loader and dumper, which must produce exactly what the pure-Python path does.
+"""
+import glob
+import os
+
+import pytest
+import yaml
+
+import lib.render as render
+from lib.render import IndentDumper, dump_yaml, format_yaml_output
+from process import process_template
+
+
+class TestLibyamlFastPath:
+    """dump_yaml and load_yaml against the pure-Python IndentDumper and SafeLoader."""
+
+    DUMP_ARGS = dict(width=4096, explicit_start=True, indent=2, sort_keys=False,
+                     default_style=None, default_flow_style=None, allow_unicode=True)
+
+    def pure(self, obj, all_documents=False):
+        dump = yaml.dump_all if all_documents else yaml.dump
+        return dump(obj, Dumper=IndentDumper, **self.DUMP_ARGS)
+
+    def test_nested_sequences_match_indent_dumper(self):
+        obj = {'a': [1, {'b': [2, {'c': ['line1\nline2\n\nline4\n', 'x']}]}],
+               'empty': [], 'nested': [[1, [2, 3]], {'d': [None, True]}],
+               'flow': {'e': {}}, 'text': 'multi\nline'}
+        assert dump_yaml(obj, **self.DUMP_ARGS) == self.pure(obj)
+        docs = [obj, [{'k': [1]}], 'scalar']
+        assert dump_yaml(docs, all_documents=True, **self.DUMP_ARGS) == self.pure(docs, True)
+
+    @pytest.mark.parametrize('obj', [
+        {'k': ['a b']},
+        {'k' * 200: [1]},
+        {'line\nkey': [1]},
+        {'k': ['x' * 5000]},
+    ])
+    def test_unsafe_inputs_fall_back_to_pure_python(self, obj):
+        assert dump_yaml(obj, **self.DUMP_ARGS) == self.pure(obj)
+
+    def test_rendered_templates_are_byte_identical(self, monkeypatch, repo):
+        monkeypatch.chdir(os.path.join(repo, 'data'))
+        checked = 0
+        for clusterfile in ('start-full.clusterfile', 'acm.clusterfile', 'plugin-vsphere.clusterfile'):
+            data = render.load_yaml(open(clusterfile).read())
+            assert data == yaml.safe_load(open(clusterfile).read())
+            for template in sorted(glob.glob(os.path.join(repo, 'templates', '*.yaml.tpl'))):
+                try:
+                    rendered, _ = process_template(data, template, clusterfile)
+                    fast = format_yaml_output(rendered)
+                except Exception:
+                    continue  # template does not apply to this clusterfile
+                with monkeypatch.context() as m:
+                    m.setattr(render, 'CIndentDumper', None)
+                    m.setattr(render, 'FastSafeLoader', yaml.SafeLoader)
+                    assert format_yaml_output(rendered) == fast, template
+                checked += 1
+        assert checked > 20
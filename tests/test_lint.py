@@ -0,0 +1,47 @@
+"""
+Tests for lint levels, the output-hash lint cache and batch linting (lib/lint).
+"""
+import pytest
+
+import lib.lint
+from lib.lint import LINT_CACHE, lint_problems, lint_yaml
+from process import render_batch
+
+
+class TestLintLevels:
+    """lint_problems levels and LINT_CACHE."""
+
+    BAD = '---\nkey: value  \nlist: [a,\n'
+
+    def test_levels(self):
+        assert lint_problems(self.BAD, 'off') == []
+        fast = lint_problems(self.BAD, 'fast')
+        assert any('trailing-spaces' in p for p in fast)
+        assert any('syntax error' in p for p in fast)
+        full = lint_problems(self.BAD, 'full')
+        assert any('trailing-spaces' in p for p in full)
+        assert lint_problems('---\na: 1\n', 'fast') == lint_problems('---\na: 1\n', 'full') == []
+        with pytest.raises(ValueError):
+            lint_problems('a: 1\n', 'strict')
+
+    def test_results_cached_by_content(self):
+        LINT_CACHE.clear()
+        hits = LINT_CACHE.hits
+        first = lint_yaml(self.BAD, 'full')
+        assert lint_yaml(self.BAD, 'full') == first
+        assert LINT_CACHE.hits == hits + 1
+        lint_yaml(self.BAD, 'fast')  # level is part of the key
+        assert LINT_CACHE.hits == hits + 1
+
+    def test_batch_lint_level(self, tmp_path, monkeypatch, cluster_data):
+        LINT_CACHE.clear()
+        monkeypatch.setattr(lib.lint, 'lint_problems', lambda text, level: [f'{level}: problem'])
+        tpl = tmp_path / 'cluster.yaml.tpl'
+        tpl.write_text('---\nname: {{ cluster.name }}\n')
+        full = render_batch(cluster_data, [str(tpl)], None, str(tmp_path / 'full'), lint_level='full')
+        assert full[0][2] == ['full: problem']
+        fast = render_batch(cluster_data, [str(tpl)], None, str(tmp_path / 'fast'), lint_level='fast')
+        assert fast[0][2] == ['fast: problem']
+        off = render_batch(cluster_data, [str(tpl)], None, str(tmp_path / 'off'), lint_level='off')
+        assert off[0][2] == [] and off[0][3] is None
+        assert open(full[0][1]).read() == open(off[0][1]).read()
@@ -0,0 +1,52 @@
+"""
+Tests for undefined-variable tracking, which must be scoped to each render.
+"""
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from jinja2 import Environment
+
+from lib.render import LoggingUndefined, collect_missing
+
+
+class TestConcurrentMissingTracking:
+    """collect_missing under threads, asyncio and nesting."""
+
+    TEMPLATE = "{% for i in range(50) %}{{ shared }}{{ only_N }}{{ cluster.only_N.x }}{% endfor %}"
+
+    def render(self, n):
+        env = Environment(undefined=LoggingUndefined)
+        with collect_missing() as missing:
+            env.from_string(self.TEMPLATE.replace('N', str(n))).render(cluster={})
+        return n, missing
+
+    def expected(self, n):
+        return {'shared', f'only_{n}', f'only_{n}.x'}
+
+    def test_thread_pool_renders_do_not_share_warnings(self):
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # force thread switches mid-render
+        try:
+            with ThreadPoolExecutor(16) as pool:
+                results = list(pool.map(self.render, range(400)))
+        finally:
+            sys.setswitchinterval(interval)
+        for n, missing in results:
+            assert set(missing) == self.expected(n)
+
+    def test_asyncio_renders_do_not_share_warnings(self):
+        async def run():
+            return await asyncio.gather(*(asyncio.to_thread(self.render, n) for n in range(200)))
+
+        for n, missing in asyncio.run(run()):
+            assert set(missing) == self.expected(n)
+
+    def test_no_collector_records_nothing(self):
+        env = Environment(undefined=LoggingUndefined)
+        assert env.from_string("{{ name }}").render() == 'CHANGEME'
+        with collect_missing() as outer:
+            with collect_missing() as inner:
+                env.from_string("{{ inner_only }}").render()
+            env.from_string("{{ outer_only }}").render()
+        assert set(inner) == {'inner_only'} and set(outer) == {'outer_only'}
@@ -0,0 +1,67 @@
+"""
+Tests for grouped -p overrides, the JSONPath parse cache and --params-file.
+"""
+import json
+
+import pytest
+
+import process
+from lib.render import apply_overrides, compile_jsonpath, load_params_file
+
+
+class TestBulkOverrides:
+    """apply_overrides, compile_jsonpath and load_params_file."""
+
+    @staticmethod
+    def one_by_one(data, params):
+        for override in params:
+            apply_overrides(data, [override])
+        return data
+
+    def test_grouped_matches_one_by_one(self, cluster_data):
+        params = [f'hosts.node{i}.network.primary.address=10.0.0.{i}' for i in range(50)]
+        params += [f'hosts.node{i}.network.interfaces[0].macAddress=52:54:00:00:00:{i:02x}' for i in range(50)]
+        params += ['hosts.node3=replaced', 'hosts.node3.role=worker', 'cluster.name=a', 'cluster.name=b',
+                   'network.items[2]=x', 'network.items.key=y', '$.cluster.version=4.20',
+                   'hosts.*.role=control', 'cluster.sshKeys[*]=k', 'cluster.where=w', 'noequals']
+        data = cluster_data
+        data['cluster']['sshKeys'] = ['a', 'b']
+        expected = self.one_by_one(json.loads(json.dumps(data)), params)
+        assert apply_overrides(data, params) == expected
+        assert data['hosts']['node3'] == {'role': 'control'}
+        assert data['hosts']['node7']['network']['interfaces'] == [{'macAddress': '52:54:00:00:00:07'}]
+        assert data['cluster']['name'] == 'b'
+        assert data['network']['items'] == {'key': 'y'}
+
+    def test_typed_pairs_and_escapes(self):
+        data = apply_overrides({}, [('cluster.replicas', 3), 'cluster.motd=line1\\nline2'])
+        assert data == {'cluster': {'replicas': 3, 'motd': 'line1\nline2'}}
+
+    def test_jsonpath_parse_cache(self):
+        compile_jsonpath.cache_clear()
+        for _ in range(3):
+            apply_overrides({'hosts': {'a': {}, 'b': {}}}, ['hosts.*.role=worker'])
+        assert compile_jsonpath.cache_info().hits == 2
+
+    @pytest.mark.parametrize('name,content', [
+        ('params.yaml', 'cluster.name: from-file\ncluster.replicas: 3\nhosts.h1.role: worker\n'),
+        ('params.json', '{"cluster.name": "from-file", "cluster.replicas": 3, "hosts.h1.role": "worker"}'),
+        ('params.txt', '# generated\ncluster.name=from-file\n\ncluster.replicas=3\nhosts.h1.role=worker\n'),
+    ])
+    def test_params_file_formats(self, tmp_path, name, content):
+        path = tmp_path / name
+        path.write_text(content)
+        data = apply_overrides({}, load_params_file(str(path)))
+        assert data['cluster']['name'] == 'from-file'
+        assert data['cluster']['replicas'] in (3, '3')
+        assert data['hosts']['h1']['role'] == 'worker'
+
+    def test_cli_params_file_then_p(self, tmp_path):
+        (tmp_path / 'params.txt').write_text('cluster.name=from-file\ncluster.domain=example.org\n')
+        tpl = tmp_path / 'out.txt.tpl'
+        tpl.write_text('{{ cluster.name }}.{{ cluster.domain }}')
+        with pytest.raises(SystemExit) as exc:
+            process.main(['--params-file', str(tmp_path / 'params.txt'), '-p', 'cluster.name=from-cli',
+                          '--no-cache', '{}', str(tpl), '-o', str(tmp_path / 'out')])
+        assert exc.value.code == 0
+        assert (tmp_path / 'out' / 'out.txt').read_text() == 'from-cli.example.org\n'
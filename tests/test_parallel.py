@@ -0,0 +1,90 @@
+"""
+Tests for {% parallel %} host loops (lib/parallel) rendered in forked workers.
+"""
+import os
+import threading
+
+import pytest
+from jinja2 import Environment
+
+import lib.parallel
+from lib.parallel import ParallelLoopExtension, default_render_jobs
+from lib.profiler import TemplateProfiler
+from lib.render import LoggingUndefined, collect_missing
+from process import process_template
+
+OTHER_THREADS_RUNNING = lib.parallel._other_threads_running
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    monkeypatch.setattr(lib.parallel, 'MIN_ITEMS_PER_JOB', 1)
+    # Threads left by other tests (the editor's render pool, test clients) must not serialize these loops.
+    monkeypatch.setattr(lib.parallel, '_other_threads_running', lambda: False)
+    lib.parallel.set_render_jobs(3)
+    yield
+    lib.parallel.set_render_jobs(1)
+
+
+def render(source, **data):
+    env = Environment(undefined=LoggingUndefined, extensions=[ParallelLoopExtension])
+    with collect_missing() as missing:
+        output = env.from_string(source).render(**data)
+    return output, missing
+
+
+@pytest.mark.usefixtures('jobs')
+class TestParallelLoops:
+    """ParallelLoopExtension output, warnings and worker use."""
+
+    def test_same_output_and_warnings_as_for_loop(self):
+        hosts = {f'h{i}': {'role': 'control' if i < 3 else 'worker'} for i in range(20)}
+        hosts['h7']['bmc'] = {}
+        body = "{{ name }}={{ host.role }}{% if host.bmc is defined %}{{ host.bmc.address }}{% endif %};"
+        parallel = render("{% set x = 1 %}{% parallel name, host in hosts.items() %}" + body +
+                          "{% endparallel %}{{ x }}", hosts=hosts)
+        serial = render("{% set x = 1 %}{% for name, host in hosts.items() %}" + body +
+                        "{% endfor %}{{ x }}", hosts=hosts)
+        assert parallel == serial
+        assert set(parallel[1]) == {'address'}
+
+    def test_chunks_render_in_workers(self):
+        output, _ = render("{% parallel n in items %}{{ pid() }} {% endparallel %}", items=range(30), pid=os.getpid)
+        pids = output.split()
+        assert len(pids) == 30 and str(os.getpid()) not in pids
+
+    def test_serial_under_profiler(self):
+        with TemplateProfiler():
+            output, _ = render("{% parallel n in items %}{{ pid() }} {% endparallel %}", items=range(30), pid=os.getpid)
+        assert set(output.split()) == {str(os.getpid())}
+
+    def test_serial_while_other_threads_run(self, monkeypatch):
+        monkeypatch.setattr(lib.parallel, '_other_threads_running', OTHER_THREADS_RUNNING)
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait)
+        thread.start()
+        try:
+            output, _ = render("{% parallel n in items %}{{ pid() }} {% endparallel %}", items=range(30), pid=os.getpid)
+        finally:
+            stop.set()
+            thread.join()
+        assert set(output.split()) == {str(os.getpid())}
+
+    def test_serial_by_default(self, monkeypatch):
+        monkeypatch.delenv('CLUSTERFILE_RENDER_JOBS', raising=False)
+        assert default_render_jobs() == 1
+        monkeypatch.setenv('CLUSTERFILE_RENDER_JOBS', '4')
+        assert default_render_jobs() == 4
+
+    def test_single_target_and_short_loops(self):
+        assert render("{% parallel n in items %}{{ n }},{% endparallel %}", items=range(10))[0] == '0,1,2,3,4,5,6,7,8,9,'
+        assert render("{% parallel n in items %}{{ n }}{% endparallel %}", items=[])[0] == ''
+
+    @pytest.mark.parametrize('template', ['acm-ztp.yaml.tpl', 'acm-capi-m3.yaml.tpl'])
+    def test_templates_byte_identical(self, template, ztp_data, tpl):
+        data = ztp_data
+        data['cluster']['platform'] = 'baremetal'
+        data['hosts']['worker-0.test-cluster.example.com']['bmc'].pop('username')
+        parallel = process_template(data, tpl(template), None)
+        lib.parallel.set_render_jobs(1)
+        assert process_template(data, tpl(template), None) == parallel
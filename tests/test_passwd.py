@@ -0,0 +1,67 @@
+"""
+Tests for passwd_hash: secret-derived salts and PASSWD_HASH_CACHE.
+"""
+import pytest
+
+import lib.render as render
+import process
+from lib.render import PASSWD_HASH_CACHE, passwd_hash, passwd_salt
+from process import process_template
+
+
+@pytest.fixture
+def crypt_calls(monkeypatch):
+    calls = []
+    real = render._sha512_crypt
+    monkeypatch.setattr(render, '_sha512_crypt', lambda *a: calls.append(a) or real(*a))
+    PASSWD_HASH_CACHE.clear()
+    return calls
+
+
+class TestPasswdHash:
+    """passwd_hash salts, its memory and disk caches, and reproducible template output."""
+
+    def test_secret_salt_is_deterministic(self, crypt_calls):
+        first = passwd_hash('hunter2\n', 'cluster-a-secret')
+        PASSWD_HASH_CACHE.clear()
+        assert passwd_hash('hunter2', 'cluster-a-secret') == first
+        assert first.startswith('$6$') and '$rounds=' not in first
+        assert passwd_hash('hunter2', 'cluster-b-secret') != first
+        assert passwd_hash('hunter3', 'cluster-a-secret') != first
+        assert len(crypt_calls) == 4
+
+    def test_matches_crypt_backend(self):
+        crypt = pytest.importorskip('crypt')
+        PASSWD_HASH_CACHE.clear()
+        salt = passwd_salt('hunter2', 'cluster-a-secret')
+        assert passwd_hash('hunter2', 'cluster-a-secret') == crypt.crypt('hunter2', '$6$' + salt)
+
+    def test_hashed_once_per_process(self, crypt_calls):
+        random_salted = passwd_hash('hunter2')
+        assert passwd_hash('hunter2') == random_salted
+        assert passwd_hash('hunter2', '<file:salt>') == random_salted  # editor placeholder: no secret
+        passwd_hash('hunter2', 'cluster-a-secret')
+        passwd_hash('hunter2', 'cluster-a-secret')
+        assert len(crypt_calls) == 2
+        assert passwd_hash('<file:secrets/core>') == '<file:secrets/core>'
+
+    def test_disk_cache_only_for_secret_salts(self, crypt_calls, cache_dir, monkeypatch):
+        monkeypatch.setenv('CLUSTERFILE_PASSWD_CACHE', '1')
+        passwd_hash('hunter2')
+        assert not (cache_dir / 'passwd').exists()
+        first = passwd_hash('hunter2', 'cluster-a-secret')
+        files = list((cache_dir / 'passwd').iterdir())
+        assert len(files) == 1 and oct(files[0].stat().st_mode & 0o777) == '0o600'
+        PASSWD_HASH_CACHE.clear()
+        assert passwd_hash('hunter2', 'cluster-a-secret') == first
+        assert len(crypt_calls) == 2
+
+    def test_operators_output_reproducible(self, tmp_path, cluster_data, tpl):
+        (tmp_path / 'core').write_text('hunter2\n')
+        (tmp_path / 'salt').write_text('cluster-a-secret\n')
+        cluster_data['cluster']['corePassword'] = str(tmp_path / 'core')
+        cluster_data['cluster']['corePasswordSalt'] = str(tmp_path / 'salt')
+        first = process_template(cluster_data, tpl('operators.yaml.tpl'), None)
+        process.PASSWD_HASH_CACHE.clear()
+        assert process_template(cluster_data, tpl('operators.yaml.tpl'), None) == first
+        assert process.passwd_hash('hunter2', 'cluster-a-secret') in first[0]
@@ -0,0 +1,65 @@
+"""
+Tests for template line, include, macro and filter attribution in lib/profiler.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import yaml
+from jinja2 import DictLoader, Environment
+
+from lib.profiler import TemplateProfiler
+
+
+class TestRenderProfiler:
+    """TemplateProfiler attribution, its output formats and --profile."""
+
+    def profile(self, templates, data, name='main'):
+        env = Environment(loader=DictLoader(templates))
+        env.filters['slow'] = lambda value: time.sleep(0.002) or value
+        profiler = TemplateProfiler()
+        with profiler:
+            output = env.get_template(name).render(data)
+        return output, profiler
+
+    def test_attributes_includes_macros_and_filters(self):
+        output, profiler = self.profile({
+            'main': "{% import 'macros' as m %}\n"
+                    "{% for i in items %}{{ m.show(i) }}{% endfor %}\n"
+                    "{% include 'part' %}",
+            'macros': "{% macro show(x) %}\n{{ x | slow }}\n{% endmacro %}",
+            'part': "head\n{{ items[0] | slow }}",  # a constant would be folded at compile time
+        }, {'items': [1, 2, 3]})
+        assert output.split() == ['1', '2', '3', 'head', '1']
+        assert profiler.calls['macro show (macros)'] == 3
+        assert profiler.calls['filter slow'] == 4
+        assert profiler.calls['part'] == 1
+        inclusive = profiler.inclusive()
+        assert inclusive['filter slow'] >= 8e6
+        assert inclusive['macro show (macros)'] >= 6e6
+        # the filter's time is charged through the template line that called it
+        assert profiler.self_ns[('part', 2)] < inclusive['part']
+        assert any(stack[-1] == 'filter slow' and 'main:3' in stack and 'part:2' in stack for stack in profiler.stacks)
+
+    def test_collapsed_and_table_formats(self):
+        _, profiler = self.profile({'main': "a\n{{ x | slow }}\n"}, {'x': 1})
+        stacks = [line.rsplit(' ', 1) for line in profiler.collapsed().splitlines()]
+        assert any(frames == 'main;main:2;filter slow' and int(micros) >= 2000 for frames, micros in stacks)
+        assert all(micros.isdigit() for _, micros in stacks)
+        table = profiler.table(top=5, sources={'main': "a\n{{ x | slow }}\n"})
+        assert 'main:2  {{ x | slow }}' in table
+        assert 'filter slow' in table
+
+    def test_cli_profile_writes_stacks(self, tmp_path, cluster_data, repo, tpl):
+        cluster_data['cluster']['platform'] = 'none'
+        stacks = tmp_path / 'render.folded'
+        result = subprocess.run(
+            [sys.executable, os.path.join(repo, 'process.py'), json.dumps(cluster_data),
+             tpl('install-config.yaml.tpl'), '--profile', str(stacks), '--profile-top', '3', '--lint', 'off'],
+            capture_output=True, text=True, cwd=str(tmp_path))
+        assert result.returncode == 0, result.stderr
+        assert 'Top 3 template lines by self time' in result.stderr
+        assert yaml.safe_load_all(result.stdout)
+        assert any(line.startswith('install-config.yaml.tpl;') for line in stacks.read_text().splitlines())
@@ -0,0 +1,87 @@
+"""
+Tests for merged schema and compiled validator caching in lib/schema.
+"""
+import json
+import os
+
+import jsonschema
+import pytest
+import yaml
+
+from conftest import REPO
+from lib import schema as schema_lib
+from lib.schema import (
+    codegen_supported, get_validator, inputs_digest, load_schema, merge_plugin_schemas, parse_schema,
+    validate_against_schema,
+)
+
+SCHEMA = os.path.join(REPO, 'schema', 'clusterfile.schema.json')
+
+
+@pytest.fixture
+def schema_cache(cache_dir, monkeypatch):
+    """The on-disk schema cache directory, with the in-memory caches emptied."""
+    monkeypatch.setattr(schema_lib, '_SCHEMAS', {})
+    monkeypatch.setattr(schema_lib, '_VALIDATORS', {})
+    return cache_dir / 'schema'
+
+
+@pytest.mark.usefixtures('schema_cache')
+class TestSchemaValidatorCache:
+    """get_validator's memory and disk caches, and their invalidation."""
+
+    def jsonschema_messages(self, data):
+        schema = merge_plugin_schemas(parse_schema(SCHEMA), SCHEMA)
+        validator = jsonschema.validators.validator_for(schema)(schema, format_checker=jsonschema.FormatChecker())
+        errors = sorted(validator.iter_errors(data), key=lambda e: list(e.path))
+        return [f"{'.'.join(str(x) for x in e.path) if e.path else '<root>'}: {e.message}" for e in errors]
+
+    @pytest.mark.parametrize('clusterfile', ['plugin-aws.clusterfile', 'plugin-kubevirt.clusterfile',
+                                             'start-full.clusterfile'])
+    def test_same_errors_as_jsonschema(self, clusterfile):
+        data = yaml.safe_load(open(os.path.join(REPO, 'data', clusterfile)))
+        before = json.dumps(data, sort_keys=True, default=str)
+        assert validate_against_schema(data, SCHEMA) == self.jsonschema_messages(data)
+        assert json.dumps(data, sort_keys=True, default=str) == before  # no defaults filled in
+
+    def test_disk_cache_reused_by_new_process(self, schema_cache, monkeypatch):
+        first = schema_lib.get_validator(SCHEMA)
+        assert any(name.endswith('.json') for name in os.listdir(schema_cache))
+        if schema_lib.fastjsonschema is not None:
+            assert first.compiled
+            assert any(name.endswith('.validator') for name in os.listdir(schema_cache))
+        # a fresh process: nothing in memory, only the disk cache
+        monkeypatch.setattr(schema_lib, '_SCHEMAS', {})
+        monkeypatch.setattr(schema_lib, '_VALIDATORS', {})
+
+        def rebuilt(*args, **kwargs):
+            raise AssertionError('schema and validator should come from the disk cache')
+        monkeypatch.setattr(schema_lib, 'merge_plugin_schemas', rebuilt)
+        if schema_lib.fastjsonschema is not None:
+            monkeypatch.setattr(schema_lib.fastjsonschema, 'compile_to_code', rebuilt)
+        second = schema_lib.get_validator(SCHEMA)
+        assert second.schema == first.schema
+        assert second.compiled == first.compiled
+        assert schema_lib.get_validator(SCHEMA) is second
+
+    def test_editing_an_input_invalidates(self, tmp_path):
+        (tmp_path / 'schema').mkdir()
+        plugin = tmp_path / 'plugins' / 'operators' / 'demo'
+        plugin.mkdir(parents=True)
+        schema_path = tmp_path / 'schema' / 'clusterfile.schema.json'
+        schema_path.write_text(json.dumps({'type': 'object', 'properties': {'plugins': {'type': 'object'}}}))
+        (plugin / 'schema.json').write_text(json.dumps({'type': 'object'}))
+        digest = inputs_digest(str(schema_path))
+        data = {'plugins': {'operators': {'demo': {'enabled': 'yes'}}}}
+        assert get_validator(str(schema_path)).is_valid(data)
+        (plugin / 'schema.json').write_text(json.dumps(
+            {'type': 'object', 'properties': {'enabled': {'type': 'boolean'}}}))
+        assert inputs_digest(str(schema_path)) != digest
+        assert not get_validator(str(schema_path)).is_valid(data)
+
+    def test_codegen_only_for_draft07_compatible_schemas(self):
+        assert codegen_supported(load_schema(SCHEMA))
+        assert not codegen_supported({'prefixItems': [{'type': 'string'}]})
+        assert not codegen_supported({'$defs': {'a': {'type': 'object'}},
+                                      'properties': {'x': {'$ref': '#/$defs/a', 'required': ['y']}}})
+        assert not codegen_supported({'type': 'string', 'format': 'date'})
@@ -0,0 +1,51 @@
+"""
+Tests for --structured, which streams the render into the YAML parser with identical output.
+"""
+import os
+
+import pytest
+import yaml
+
+import process
+from lib.render import _ChunkReader, format_yaml_output, format_yaml_stream
+from process import parse_template_meta, process_template, process_template_structured
+
+
+class TestStructuredRender:
+    """process_template_structured, format_yaml_stream and the CLI flag."""
+
+    @pytest.mark.parametrize('template', ['acm-ztp.yaml.tpl', 'install-config.yaml.tpl', 'agent-config.yaml.tpl'])
+    def test_matches_text_pipeline(self, template, monkeypatch, repo, tpl):
+        monkeypatch.chdir(os.path.join(repo, 'data'))
+        template_file = tpl(template)
+        data = yaml.safe_load(open('acm.clusterfile'))
+        meta = parse_template_meta(template_file)
+        text, text_missing = process_template(data, template_file, 'acm.clusterfile')
+        output, missing = process_template_structured(data, template_file, 'acm.clusterfile', meta)
+        assert output == format_yaml_output(text, meta)
+        assert missing == text_missing
+
+    def test_wrapper_semantics(self):
+        chunks = ['---\na: 1\n', '---\n', 'b: [2', ', 3]\n']
+        assert yaml.safe_load(format_yaml_stream(iter(chunks)))['kind'] == 'List'
+        raw = format_yaml_stream(iter(chunks), {'yamlWrapper': 'raw'})
+        assert list(yaml.safe_load_all(raw)) == [{'a': 1}, {'b': [2, 3]}]
+        assert format_yaml_stream(iter(['---\n', '# empty\n'])) == ''
+
+    def test_chunk_reader_respects_size(self):
+        reader = _ChunkReader(iter(['abc', 'defgh', '', 'ij']))
+        assert reader.read(4) == 'abcd'
+        assert reader.read(2) == 'ef'
+        assert reader.read() == 'ghij'
+        assert reader.read(10) == ''
+
+    def test_cli_flag(self, tmp_path, monkeypatch, repo, tpl):
+        monkeypatch.chdir(os.path.join(repo, 'data'))
+        outputs = []
+        for flags in ([], ['--structured']):
+            with pytest.raises(SystemExit) as exc:
+                process.main(flags + ['--no-cache', 'acm.clusterfile', tpl('acm-ztp.yaml.tpl'),
+                                      '-o', str(tmp_path / str(len(flags)))])
+            assert exc.value.code == 0
+            outputs.append((tmp_path / str(len(flags)) / 'acm-ztp.yaml').read_text())
+        assert outputs[0] == outputs[1]
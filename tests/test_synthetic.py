@@ -0,0 +1,78 @@
+"""
+Tests for scaled clusterfiles from lib/synthetic.
+"""
+import hashlib
+import ipaddress
+import json
+import os
+
+import pytest
+import yaml
+
+from conftest import REPO
+from lib.render import format_yaml_output
+from lib.schema import validate_against_schema
+from lib.synthetic import AddressPool, generate_clusterfile, generate_fleet, int_to_mac, mac_to_int
+from process import process_template
+
+SCHEMA = os.path.join(REPO, 'schema', 'clusterfile.schema.json')
+
+
+def base(name):
+    return yaml.safe_load(open(os.path.join(REPO, 'data', name)))
+
+
+class TestSyntheticClusterfile:
+    """generate_clusterfile, generate_fleet and MAC assignment."""
+
+    @pytest.mark.parametrize('clusterfile', ['start-full.clusterfile', 'acm.clusterfile',
+                                             'plugin-baremetal.clusterfile', 'plugin-vsphere.clusterfile',
+                                             'plugin-aws.clusterfile'])
+    def test_scaled_clusterfile_validates(self, clusterfile):
+        data = generate_clusterfile(base(clusterfile), 300, interfaces=3, bond='802.3ad', vlan=120)
+        assert validate_against_schema(data, SCHEMA) == []
+        assert len(data['hosts']) == 300
+        assert [h['role'] for h in data['hosts'].values()].count('control') == 3
+        assert '<' not in json.dumps({k: v for k, v in data.items() if k != 'hosts'})
+
+    def test_addresses_unique_and_inside_subnet(self):
+        data = generate_clusterfile(base('plugin-baremetal.clusterfile'), 2000, interfaces=4)
+        subnet = ipaddress.ip_network(data['network']['primary']['subnet'])
+        hosts = data['hosts'].values()
+        macs = [nic['macAddress'] for h in hosts for nic in h['network']['interfaces']]
+        macs += [h['bmc']['macAddress'] for h in hosts]
+        ips = [h['network']['primary']['address'] for h in hosts] + [h['bmc']['address'] for h in hosts]
+        ips += [data['network']['primary']['gateway'], *data['network']['primary']['vips'].values()]
+        assert len(macs) == len(set(macs)) == 2000 * 5
+        assert len(ips) == len(set(ips))
+        assert all(ipaddress.ip_address(h['network']['primary']['address']) in subnet for h in hosts)
+        assert all(len(h['network']['interfaces']) == 4 and h['network']['primary']['ports'] == ['eth0', 'eth1']
+                   for h in hosts)  # the base clusterfile bonds the primary network
+
+    def test_deterministic_and_fleet_wide_unique_macs(self):
+        acm = base('acm.clusterfile')
+        assert generate_clusterfile(acm, 50, interfaces=2) == generate_clusterfile(acm, 50, interfaces=2)
+        fleet = list(generate_fleet(acm, 20, 3, name='site'))
+        assert [name for name, _ in fleet][:2] == ['site-0001', 'site-0002']
+        macs = [nic['macAddress'] for _, data in fleet for h in data['hosts'].values()
+                for nic in h['network']['interfaces']]
+        assert len(macs) == len(set(macs)) == 60
+
+    def test_mac_assignment_matches_generate_mac_in_range(self):
+        # same identity, hash and probing as generate-mac-in-range.sh
+        start, end = mac_to_int('00:1A:2B:00:00:01'), mac_to_int('00:1A:2B:00:00:FF')
+        identity = 'cluster|base.domain|control01.base.domain|eth0'
+        expected = start + int.from_bytes(hashlib.sha256(identity.encode()).digest(), 'big') % (end - start + 1)
+        pool = AddressPool(start, end)
+        assert pool.assign(identity) == expected
+        assert pool.assign(identity) == (start if expected == end else expected + 1)
+        assert int_to_mac(expected).startswith('00:1A:2B:00:00:')
+
+    def test_generated_clusterfile_renders(self, tpl):
+        data = generate_clusterfile(base('start-full.clusterfile'), 12, interfaces=2, bond='active-backup')
+        output, _ = process_template(data, tpl('agent-config.yaml.tpl'),
+                                     os.path.join(REPO, 'data', 'start-full.clusterfile'))
+        config = yaml.safe_load(format_yaml_output(output))
+        assert len(config['hosts']) == 12
+        assert {i['macAddress'] for h in config['hosts'] for i in h['interfaces']} == {
+            nic['macAddress'] for h in data['hosts'].values() for nic in h['network']['interfaces']}
@@ -16,8 +16,11 @@ import shutil
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from jinja2 import Environment, FileSystemLoader
-from lib.render import format_yaml_output
+from lib.fragments import FragmentCacheExtension
+from lib.parallel import ParallelLoopExtension
+from lib.render import FactsTemplate, format_yaml_output
 from process import parse_template_meta, process_template
+from conftest import base_cluster_data, ztp_host_data
 
 
 # --- Test fixtures and helpers ---
@@ -30,7 +33,9 @@ def template_env():
     plugins_tpl  = os.path.join(template_dir, 'plugins')
     plugins_root = os.path.join(os.path.dirname(template_dir), 'plugins')
 
-    env = Environment(loader=FileSystemLoader([template_dir, includes_dir, plugins_tpl, plugins_root]))
+    env = Environment(loader=FileSystemLoader([template_dir, includes_dir, plugins_tpl, plugins_root]),
+                      extensions=[FragmentCacheExtension, ParallelLoopExtension])
+    env.template_class = FactsTemplate
 
     # Mock load_file to return test data
     def load_file(path):
@@ -105,45 +110,6 @@ def temp_secrets_dir():
 
 # --- Base cluster data for each platform ---
 
-def base_cluster_data():
-    """Return base cluster configuration common to all platforms."""
-    return {
-        'account': {
-            'pullSecret': 'secrets/pull-secret.json'
-        },
-        'cluster': {
-            'name': 'test-cluster',
-            'version': '4.18.0',
-            'arch': 'x86_64',
-            'location': 'us-east-1',
-            'sshKeys': ['secrets/id_rsa.pub']
-        },
-        'network': {
-            'domain': 'example.com',
-            'primary': {
-                'subnet': '10.0.0.0/16',
-                'type': 'OVNKubernetes'
-            },
-            'cluster': {
-                'subnet': '10.128.0.0/14',
-                'hostPrefix': 23
-            },
-            'service': {
-                'subnet': '172.30.0.0/16'
-            }
-        },
-        'hosts': {
-            'control-0.test-cluster.example.com': {'role': 'control'},
-            'control-1.test-cluster.example.com': {'role': 'control'},
-            'control-2.test-cluster.example.com': {'role': 'control'},
-            'worker-0.test-cluster.example.com': {'role': 'worker'},
-            'worker-1.test-cluster.example.com': {'role': 'worker'},
-            'worker-2.test-cluster.example.com': {'role': 'worker'}
-        },
-        'plugins': {}
-    }
-
-
 def decode_ignition_override(annotation_value):
     """Decode ignition override JSON from an annotation string."""
     return json.loads(annotation_value)
@@ -352,16 +318,6 @@ def operator_test_data(operator_name, config=None):
     return data
 
 
-def ztp_host_data(data):
-    """Enrich all hosts in data with BMC/network/storage for ZTP template rendering."""
-    data.setdefault('network', {}).setdefault('primary', {}).setdefault('vips', {'api': '10.0.0.2', 'apps': '10.0.0.3'})
-    for host in data['hosts'].values():
-        host['bmc'] = {'vendor': 'dell', 'version': 9, 'address': '10.0.1.1', 'macAddress': 'aa:bb:cc:dd:ee:ff', 'username': 'root', 'password': 'pw'}
-        host['network'] = {'interfaces': [{'name': 'eth0', 'macAddress': 'aa:bb:cc:dd:ee:01'}], 'primary': {'address': '10.0.0.10', 'ports': ['eth0']}}
-        host['storage'] = {'os': {'deviceName': '/dev/sda'}}
-    return data
-
-
 # --- Test classes ---
 
 class TestInstallConfigTemplate:
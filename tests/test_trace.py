@@ -0,0 +1,64 @@
+"""
+Tests for data-access tracing proxies and --trace reports (lib/trace).
+"""
+import json
+
+import pytest
+from jinja2 import Environment
+
+from lib.trace import DataTrace, TracingContext, tracing
+from process import render_batch, render_file
+
+
+class TestDataTrace:
+    """DataTrace paths, patterns and misses, and the reports batch mode writes."""
+
+    def render(self, source, data):
+        env = Environment()
+        env.context_class = TracingContext
+        trace = DataTrace()
+        with tracing(trace):
+            output = env.from_string(source).render(trace.wrap(data))
+        return output, trace.report()
+
+    def test_counts_paths_and_patterns(self):
+        data = {'hosts': {'a.example.com': {'role': 'control', 'nics': [{'name': 'eth0'}]},
+                          'b.example.com': {'role': 'worker', 'nics': [{'name': 'eth1'}]}}}
+        output, report = self.render(
+            "{% for n, h in hosts.items() %}{{ h.role }}{{ h.role }}{{ h.nics[0].name }}{% endfor %}", data)
+        assert output == 'controlcontroleth0workerworkereth1'
+        assert report['patterns']['hosts.*.role'] == 4
+        assert report['patterns']['hosts.*.nics[*].name'] == 2
+        assert report['paths']["hosts['a.example.com'].role"] == 2
+        assert report['paths']['hosts'] == 1
+
+    def test_misses_are_reported(self):
+        output, report = self.render("{{ cluster.get('arch', 'x86_64') }}{% if cluster.tpm %}t{% endif %}",
+                                     {'cluster': {'name': 'c'}})
+        assert output == 'x86_64'
+        assert report['missing'] == {'cluster.arch': 1, 'cluster.tpm': 1}
+
+    def test_filters_see_plain_data(self):
+        data = {'cluster': {'b': [1, 2], 'a': {'x': True}}}
+        plain = Environment().from_string("{{ cluster | tojson }}|{{ cluster }}|{{ cluster.b | sum }}").render(data)
+        assert self.render("{{ cluster | tojson }}|{{ cluster }}|{{ cluster.b | sum }}", data)[0] == plain
+
+    @pytest.mark.parametrize('structured', [False, True])
+    def test_traced_render_matches_plain_render(self, structured, cluster_data, tpl):
+        template = tpl('install-config.yaml.tpl')
+        plain = render_file(cluster_data, template, None, [], lint_level='off', structured=structured)
+        trace = DataTrace()
+        assert render_file(cluster_data, template, None, [], lint_level='off', structured=structured,
+                           trace=trace) == plain
+        report = trace.report()
+        assert report['paths']['cluster.name'] >= 1 and report['reads'] > 0
+
+    def test_batch_writes_report_per_template(self, tmp_path, cluster_data, tpl):
+        cluster_data['cluster']['platform'] = 'none'
+        templates = [tpl('install-config.yaml.tpl'), tpl('creds.yaml.tpl')]
+        render_batch(cluster_data, templates, None, str(tmp_path / 'out'), lint_level='off',
+                     trace_dir=str(tmp_path / 'trace'))
+        report = json.loads((tmp_path / 'trace' / 'install-config.yaml.trace.json').read_text())
+        assert report['template'] == templates[0]
+        assert 'network.domain' in report['paths']
+        assert (tmp_path / 'trace' / 'creds.yaml.trace.json').is_file()